@@ -0,0 +1,225 @@
+"""Optimising staff-to-task assignment for the timesheet scheduler.
+
+The greedy scheduler hands tasks out hour by hour in a shuffled order, so an
+early hour can use up the only person who could have covered a later one.
+This module treats the assignment hours as one problem: every (hour, task)
+slot takes at most one person, every person does at most one task an hour,
+and each rotating task (SM, R) goes to a given person at most once a day.
+
+Each hour on its own is a minimum-cost assignment of tasks to staff, solved
+exactly with the Hungarian algorithm. The solver re-solves one hour at a
+time with the others held fixed until a full sweep changes nothing, then
+restarts from a shuffled hour order a fixed number of times, keeping the
+best day. The restart count, not the clock, decides how much work is done,
+so the same seed gives the same day on any machine. An optional time limit
+is a hard cap on top: when it cuts the search short the stats say so, and
+the result is no longer reproducible. Everything here is plain Python; the scheduler
+supplies the task values, so this module knows nothing about rosters or
+TASK_CONFIG.
+"""
+import heapq
+import time
+
+# Cost of a pair that may not be used. Finite so the potentials stay numeric;
+# every row also has zero-cost "unassigned" columns, so it is never chosen.
+FORBIDDEN = 1e12
+# Per-person, per-hour tie-break noise, far below any real task value.
+JITTER = 1e-3
+
+
+def solve_assignment(cost):
+    """Minimum-cost assignment of every row of `cost` to a distinct column.
+
+    `cost` is a list of n rows, each with m >= n numbers. Returns the column
+    index chosen for each row. Hungarian algorithm with potentials, O(n^2 m).
+    """
+    n = len(cost)
+    if n == 0:
+        return []
+    m = len(cost[0])
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    owner = [0] * (m + 1)  # owner[j]: row (1-based) holding column j, 0 if free
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_to = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            row = cost[i0 - 1]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                cur = row[j - 1] - u[i0] - v[j]
+                if cur < min_to[j]:
+                    min_to[j] = cur
+                    way[j] = j0
+                if min_to[j] < delta:
+                    delta = min_to[j]
+                    j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_to[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    result = [0] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            result[owner[j] - 1] = j - 1
+    return result
+
+
+class AssignmentProblem:
+    """One day's hours, the tasks to fill each hour and what each pairing is worth.
+
+    `on_shift` maps each hour to the names available then; `allowed` maps a
+    name to the tasks they may take; `value(name, hour, task)` scores a
+    pairing (pairs worth <= 0 are left unfilled). Names in `varied` lose
+    `repeat_penalty` for each task they repeat, against `history` and the
+    rest of the day.
+    """
+
+    def __init__(self, hours, tasks, on_shift, allowed, value, rotating=(),
+                 varied=(), history=None, repeat_penalty=0.0):
+        self.hours = list(hours)
+        self.tasks = list(tasks)
+        self.on_shift = on_shift
+        self.allowed = allowed
+        self.value = value
+        self.rotating = set(rotating)
+        self.varied = set(varied)
+        self.history = history or {}
+        self.repeat_penalty = repeat_penalty
+
+    def score(self, assignment, jitter=None):
+        """Total value of a day's assignment {hour: {task: name}}."""
+        total = 0.0
+        seen = {}
+        for hour in self.hours:
+            for task, name in assignment[hour].items():
+                total += self.value(name, hour, task)
+                if jitter is not None:
+                    total += jitter[hour].get(name, 0.0)
+                if name in self.varied:
+                    key = (name, task)
+                    if key in seen or task in self.history.get(name, ()):
+                        total -= self.repeat_penalty
+                    seen[key] = True
+        return total
+
+    def solve_hour(self, hour, assignment, jitter):
+        """Best {task: name} for `hour` with every other hour held fixed."""
+        others = [assignment[h] for h in self.hours if h != hour]
+        rotated = {task: {a[task] for a in others if task in a}
+                   for task in self.rotating}
+        done_today = {}
+        for a in others:
+            for task, name in a.items():
+                if name in self.varied:
+                    done_today.setdefault(name, set()).add(task)
+
+        k = len(self.tasks)
+        top = [[] for _ in range(k)]
+        hour_jitter = jitter[hour]
+        for name in self.on_shift.get(hour, ()):
+            allowed = self.allowed.get(name, ())
+            for t_idx, task in enumerate(self.tasks):
+                if task not in allowed or name in rotated.get(task, ()):
+                    continue
+                gain = self.value(name, hour, task)
+                if name in self.varied and (task in done_today.get(name, ())
+                                            or task in self.history.get(name, ())):
+                    gain -= self.repeat_penalty
+                if gain <= 0:
+                    continue
+                gain += hour_jitter.get(name, 0.0)
+                # Only a task's k best candidates can appear in an optimal matching.
+                entry = (gain, name)
+                if len(top[t_idx]) < k:
+                    heapq.heappush(top[t_idx], entry)
+                elif entry > top[t_idx][0]:
+                    heapq.heapreplace(top[t_idx], entry)
+
+        columns = sorted({name for entries in top for _, name in entries})
+        if not columns:
+            return {}
+        col_index = {name: j for j, name in enumerate(columns)}
+        cost = []
+        for t_idx in range(k):
+            row = [FORBIDDEN] * len(columns) + [0.0] * k
+            for gain, name in top[t_idx]:
+                row[col_index[name]] = -gain
+            cost.append(row)
+        result = {}
+        for t_idx, j in enumerate(solve_assignment(cost)):
+            if j < len(columns) and cost[t_idx][j] < 0:
+                result[self.tasks[t_idx]] = columns[j]
+        return result
+
+    def solve(self, rng, restarts=12, initial=None, time_limit=None):
+        """Returns (assignment, stats) for the best day found over `restarts` restarts.
+
+        The first restart improves on `initial` (a feasible {hour: {task:
+        name}}, e.g. the greedy day) when given, so the result is never
+        worse than it. Later restarts start empty from a shuffled hour
+        order. Each restart sweeps until nothing improves, which always
+        ends because every accepted change raises the score; with the same
+        seed the result is reproducible.
+
+        `time_limit` (seconds, None for none) stops the search early with
+        the best day so far and sets stats["truncated"]. It is checked
+        before each sweep but the first, so the first sweep always
+        completes and a search that ends in time is never flagged.
+        """
+        started = time.perf_counter()
+        deadline = None if time_limit is None else started + time_limit
+        jitter = {hour: {name: rng.random() * JITTER for name in self.on_shift.get(hour, ())}
+                  for hour in self.hours}
+        order = list(self.hours)
+        best, best_score = None, float("-inf")
+        sweeps = 0
+        truncated = False
+        for restart in range(max(1, restarts)):
+            if restart:
+                rng.shuffle(order)
+            if restart == 0 and initial is not None:
+                assignment = {hour: dict(initial.get(hour, {})) for hour in self.hours}
+            else:
+                assignment = {hour: {} for hour in self.hours}
+            score = self.score(assignment, jitter)
+            improved = True
+            while improved:
+                if deadline is not None and sweeps and time.perf_counter() >= deadline:
+                    truncated = True
+                    break
+                improved = False
+                for hour in order:
+                    trial = dict(assignment)
+                    trial[hour] = self.solve_hour(hour, assignment, jitter)
+                    trial_score = self.score(trial, jitter)
+                    if trial_score > score + 1e-9:
+                        assignment, score = trial, trial_score
+                        improved = True
+                sweeps += 1
+            if score > best_score:
+                best, best_score = assignment, score
+            if truncated:
+                break
+        stats = {"restarts": restart + 1, "sweeps": sweeps, "truncated": truncated,
+                 "score": round(self.score(best), 4),
+                 "seconds": round(time.perf_counter() - started, 4)}
+        return best, stats
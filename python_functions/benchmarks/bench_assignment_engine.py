@@ -0,0 +1,94 @@
+"""Compares the greedy and optimal assignment engines on coverage and runtime.
+
+Usage (from python_functions/):
+    python benchmarks/bench_assignment_engine.py --sizes 6 10 20 50 200 --seeds 20
+
+For every roster size and seed, both engines assign the same synthetic
+roster. Coverage counts the quarter-hours of each (hour, task) slot that
+are staffed, out of those asked for, for mandatory tasks (SM, R, C, C+) and
+the rest (1st, Res) separately; a 13:00 task loses the quarter its holder
+spends on a break. Repeats counts volunteers given the same task twice.
+--mix scale3 draws mostly Scale 3 staff on staggered shifts, where the SM
+and R rotation makes the hour-by-hour greedy order matter most.
+"""
+import argparse
+import copy
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import library_excel  # noqa: E402
+from synthetic_roster import ROLE_WEIGHTS, synthetic_roster  # noqa: E402
+
+ROLE_MIXES = {"default": ROLE_WEIGHTS,
+              "scale3": {"Duty Manager": 1, "Scale 3": 8, "Volunteer": 1}}
+
+
+def assign(engine, roster, seed, restarts, time_limit=0):
+    staff_data = copy.deepcopy(roster)
+    rng = random.Random(seed)
+    library_excel.auto_assign_tea_slots(staff_data, rng)
+    pivot = {s["name"]: {} for s in staff_data}
+    _, on_shift = library_excel.build_staff_index(
+        staff_data, library_excel.ASSIGNMENT_HOUR_KEYS)
+    kwargs = {"restarts": restarts, "time_limit": time_limit} if engine == "optimal" else {}
+    start = time.perf_counter()
+    library_excel.ASSIGNMENT_ENGINES[engine](pivot, on_shift, {}, rng, **kwargs)
+    return staff_data, pivot, time.perf_counter() - start
+
+
+def coverage(staff_data, pivot):
+    """Returns (mandatory coverage, optional coverage, volunteer repeats)."""
+    mandatory = set(library_excel.DEFAULT_TEMPLATE.mandatory_tasks)
+    optional = set(library_excel.DEFAULT_TEMPLATE.random_tasks)
+    hours = len(library_excel.ASSIGNMENT_HOUR_KEYS)
+    quarters = {"mandatory": 0, "optional": 0}
+    repeats = 0
+    for person in staff_data:
+        tasks = [(hour, task) for hour, task in pivot[person["name"]].items()
+                 if hour in library_excel.ASSIGNMENT_HOUR_KEYS]
+        on_break = len(library_excel.break_minutes(person))
+        for hour, task in tasks:
+            covered = 4 - on_break if hour == "13:00" else 4
+            quarters["mandatory" if task in mandatory else "optional"] += covered
+        if person.get("role") == "Volunteer":
+            repeats += len(tasks) - len({task for _, task in tasks})
+    return (quarters["mandatory"] / (4 * len(mandatory) * hours),
+            quarters["optional"] / (4 * len(optional) * hours), repeats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[6, 10, 20, 50, 200])
+    parser.add_argument('--seeds', type=int, default=20)
+    parser.add_argument('--mix', choices=sorted(ROLE_MIXES), default='default')
+    parser.add_argument('--restarts', type=int, default=library_excel.SCHEDULER_RESTARTS)
+    parser.add_argument('--time-limit', type=float, default=0,
+                        help='seconds before the optimal search stops early (0: none)')
+    args = parser.parse_args()
+
+    print(f"{'staff':>6} {'engine':>8} {'mandatory':>10} {'optional':>9} "
+          f"{'repeats':>8} {'median ms':>10} {'max ms':>8}")
+    for size in args.sizes:
+        for engine in ("greedy", "optimal"):
+            mandatory, optional, repeats, times = [], [], [], []
+            for seed in range(args.seeds):
+                roster = synthetic_roster(size, seed, ROLE_MIXES[args.mix])
+                staff_data, pivot, elapsed = assign(
+                    engine, roster, seed, args.restarts, args.time_limit)
+                m, o, r = coverage(staff_data, pivot)
+                mandatory.append(m)
+                optional.append(o)
+                repeats.append(r)
+                times.append(elapsed * 1000)
+            print(f"{size:>6} {engine:>8} {statistics.mean(mandatory):>10.1%} "
+                  f"{statistics.mean(optional):>9.1%} {sum(repeats):>8} "
+                  f"{statistics.median(times):>10.2f} {max(times):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compares serial and process-pool rendering of a batch export.
+
+Usage (from python_functions/):
+    python benchmarks/bench_batch_render.py --days 7 --staff 200 --workers 1 2 4
+
+Each run schedules the same roster over `--days` days and renders every day
+to xlsx bytes, first in-process and then through a pool of each size given.
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import library_excel  # noqa: E402
+
+
+def scaled_roster(size):
+    """Repeats the sample roster under fresh names until it has `size` people."""
+    sample_path = os.path.join(os.path.dirname(
+        library_excel.__file__), 'schedule.json')
+    with open(sample_path) as f:
+        sample = json.load(f)['schedule']
+    roster = []
+    while len(roster) < size:
+        for person in sample:
+            if len(roster) == size:
+                break
+            entry = dict(person)
+            entry['name'] = f"{person['name']} {len(roster)}"
+            entry.pop('tea_slot', None)
+            roster.append(entry)
+    return roster
+
+
+def run_once(roster, days):
+    batch = [(f"2026-10-{12 + i:02d}", copy.deepcopy(roster)) for i in range(days)]
+    start = time.perf_counter()
+    workbooks = library_excel.render_day_workbooks(batch, {})
+    elapsed = time.perf_counter() - start
+    assert len(workbooks) == days
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--staff', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    roster = scaled_roster(args.staff)
+    results = []
+    for workers in [0] + args.workers:
+        library_excel.close_render_pool()
+        library_excel.RENDER_POOL_SIZE = workers
+        # Warm-up run so pool start-up is not counted.
+        run_once(roster, min(args.days, max(workers, 2)))
+        best = min(run_once(roster, args.days) for _ in range(args.repeat))
+        results.append((workers, best))
+    library_excel.close_render_pool()
+
+    serial = results[0][1]
+    print(f"{args.days} days x {args.staff} staff, best of {args.repeat} (cpus: {os.cpu_count()})")
+    for workers, best in results:
+        label = "serial" if workers < 2 else f"{workers} workers"
+        print(f"  {label:>10}: {best:7.3f}s  speed-up {serial / best:4.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Measures cold-start cost: module import and first-request latency.
+
+Usage (from python_functions/):
+    python benchmarks/bench_cold_start.py --runs 5 --append cold_start.jsonl
+
+Every run starts a fresh interpreter, imports library_excel and sends one
+request through the Flask test client, so each number is a true cold start.
+With --append the summary is added as one JSON line, for tracking over time.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import library_excel
+imported = time.perf_counter()
+client = library_excel.app.test_client()
+with open("schedule.json") as f:
+    roster = json.load(f)["schedule"]
+if sys.argv[1] == "staff":
+    response = client.get("/staff")
+else:
+    response = client.post("/generate-timesheet",
+                           json={"schedule": roster, "date": "2026-10-18"})
+done = time.perf_counter()
+heavy = [m for m in ("pandas", "openpyxl", "psycopg", "serverless_wsgi") if m in sys.modules]
+print(json.dumps({"status": response.status_code,
+                  "import_seconds": imported - started,
+                  "first_request_seconds": done - imported,
+                  "heavy_modules": heavy}))
+'''
+
+SCENARIOS = ("staff", "timesheet")
+
+
+def cold_run(scenario):
+    result = subprocess.run([sys.executable, "-c", CHILD, scenario], cwd=HERE,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--append', metavar='FILE',
+                        help='append the summary as one JSON line to FILE')
+    args = parser.parse_args()
+
+    summary = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": sys.version.split()[0], "runs": args.runs}
+    for scenario in SCENARIOS:
+        runs = [cold_run(scenario) for _ in range(args.runs)]
+        assert all(r["status"] in (200, 201) for r in runs), runs
+        summary[scenario] = {
+            "import_seconds": round(statistics.median(r["import_seconds"] for r in runs), 4),
+            "first_request_seconds": round(
+                statistics.median(r["first_request_seconds"] for r in runs), 4),
+            "heavy_modules": runs[-1]["heavy_modules"],
+        }
+
+    print(json.dumps(summary, indent=2))
+    if args.append:
+        with open(args.append, 'a') as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+if __name__ == '__main__':
+    main()
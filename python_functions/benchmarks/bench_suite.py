@@ -0,0 +1,206 @@
+"""Times the scheduler, renderer and DB endpoints over synthetic rosters.
+
+Usage (from python_functions/):
+    python benchmarks/bench_suite.py --sizes 10 100 1000 10000 --output bench.json
+    python benchmarks/bench_suite.py --baseline bench.json --output bench-new.json
+
+Cases, each timed at every roster size:
+    tea         auto_assign_tea_slots
+    schedule    generate_schedule_data (breaks, assignment and grid rows)
+    styling     apply_excel_styling on an already written sheet
+    render      render_workbook_bytes with the openpyxl renderer
+    endpoint    POST /generate-timesheet through Flask's test client
+    profiles_*  /profiles create, list and delete against a scratch SQLite file
+
+Rosters come from synthetic_roster (mixed roles, statuses, shifts and 20%
+preset tea slots) with a fixed seed. The roster and timesheet caches are
+off so every run does the work. Results are the median, min and max of
+--repeat runs in milliseconds, written as JSON with the environment they
+ran in. With --baseline, each case's median is compared with the same
+case in an earlier results file; the script exits with status 1 when any
+is more than --threshold times slower (and slower by over --noise-ms).
+"""
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+# Measure the work itself, against a database nobody else uses.
+os.environ["ROSTER_CACHE_BACKEND"] = "off"
+os.environ["TIMESHEET_CACHE_BACKEND"] = "off"
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+import library_excel  # noqa: E402
+from synthetic_roster import synthetic_roster  # noqa: E402
+
+DATE = "2026-10-18"
+SEED = 1
+# Single-row /profiles calls are timed on at most this many people per run.
+CRUD_SAMPLE = 200
+
+
+def timed(run, repeat, setup=None):
+    """Calls setup() (untimed) then run(*setup()) `repeat` times; returns a summary in ms."""
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3),
+            "max_ms": round(max(times), 3), "runs": repeat}
+
+
+def scheduled(roster):
+    staff_data = copy.deepcopy(roster)
+    grid = library_excel.generate_schedule_data(staff_data, DATE, rng=random.Random(SEED))
+    return grid, staff_data
+
+
+def written_sheet(roster):
+    """A sheet with cells and header rows written but not yet styled."""
+    grid, staff_data = scheduled(roster)
+    workbook = library_excel.new_timesheet_workbook()
+    worksheet = workbook.create_sheet("Timesheet")
+    for r_idx, row in enumerate(grid.rows):
+        for c_idx, value in enumerate(row, 1):
+            worksheet.cell(row=library_excel.DATA_START_ROW_EXCEL + r_idx,
+                           column=c_idx, value=value)
+    duty_managers = " & ".join(
+        s["name"] for s in staff_data if s.get("role") == "Duty Manager")
+    library_excel.add_template_header_rows(
+        worksheet, library_excel.parse_date_from_payload(DATE), duty_managers, grid.template)
+    return worksheet, grid, staff_data
+
+
+def check(response, *codes):
+    assert response.status_code in codes, (response.status_code, response.data[:200])
+
+
+def profile_cases(client, roster, repeat):
+    sample = roster[:CRUD_SAMPLE]
+    names = [person["name"] for person in roster]
+
+    def clear():
+        check(client.delete("/profiles", json={"names": names}), 200)
+        return ()
+
+    def create_each():
+        for person in sample:
+            check(client.post("/profiles", json=person), 201)
+
+    def delete_each():
+        for person in sample:
+            check(client.delete(f"/profiles/{quote(person['name'])}"), 200)
+
+    def fill():
+        clear()
+        check(client.put("/profiles", json=roster), 200)
+        return ()
+
+    return {
+        "profiles_create": timed(create_each, repeat, clear),
+        "profiles_bulk_upsert": timed(
+            lambda: check(client.put("/profiles", json=roster), 200), repeat, clear),
+        "profiles_list": timed(lambda: check(client.get("/profiles"), 200), repeat, fill),
+        "profiles_delete": timed(delete_each, repeat, fill),
+        "profiles_bulk_delete": timed(
+            lambda: check(client.delete("/profiles", json={"names": names}), 200), repeat, fill),
+    }
+
+
+def run_suite(sizes, repeat):
+    client = library_excel.app.test_client()
+    results = {}
+    for size in sizes:
+        roster = synthetic_roster(size, SEED, tea_presets=0.2)
+        cases = {
+            "tea": timed(lambda staff: library_excel.auto_assign_tea_slots(
+                staff, random.Random(SEED)), repeat, lambda: (copy.deepcopy(roster),)),
+            "schedule": timed(lambda staff: library_excel.generate_schedule_data(
+                staff, DATE, rng=random.Random(SEED)), repeat, lambda: (copy.deepcopy(roster),)),
+            "styling": timed(library_excel.apply_excel_styling, repeat,
+                             lambda: written_sheet(roster)),
+            "render": timed(lambda grid, staff: library_excel.render_workbook_bytes(
+                grid, staff, DATE), repeat, lambda: scheduled(roster)),
+            "endpoint": timed(lambda: check(client.post("/generate-timesheet", json={
+                "schedule": copy.deepcopy(roster), "date": DATE, "seed": SEED}), 200), repeat),
+        }
+        cases.update(profile_cases(client, roster, repeat))
+        for case, summary in cases.items():
+            results[f"{case}/{size}"] = summary
+            print(f"{case:>22} {size:>6} staff: {summary['median_ms']:>10.2f} ms median")
+    return results
+
+
+def compare(results, baseline, threshold, noise_ms):
+    """Per-case median ratios against `baseline`; returns (rows, regressed case names)."""
+    rows, regressions = [], []
+    for case, summary in results.items():
+        before = baseline.get("results", {}).get(case)
+        if before is None:
+            continue
+        ratio = summary["median_ms"] / before["median_ms"] if before["median_ms"] else None
+        regressed = (ratio is not None and ratio > threshold
+                     and summary["median_ms"] - before["median_ms"] > noise_ms)
+        rows.append({"case": case, "baseline_ms": before["median_ms"],
+                     "median_ms": summary["median_ms"],
+                     "ratio": None if ratio is None else round(ratio, 3),
+                     "regressed": regressed})
+        if regressed:
+            regressions.append(case)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='an earlier --output file to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio that counts as a regression (default 1.25)')
+    parser.add_argument('--noise-ms', type=float, default=2.0,
+                        help='ignore slowdowns smaller than this many ms (default 2)')
+    args = parser.parse_args()
+
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": sys.version.split()[0], "platform": platform.platform(),
+              "cpus": os.cpu_count(), "sizes": args.sizes, "repeat": args.repeat,
+              "results": run_suite(args.sizes, args.repeat)}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"], regressions = compare(
+            report["results"], baseline, args.threshold, args.noise_ms)
+        print(f"\nAgainst {args.baseline} ({baseline.get('timestamp')}):")
+        for row in report["comparison"]:
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(f"{row['case']:>30}: {row['baseline_ms']:>10.2f} -> "
+                  f"{row['median_ms']:>10.2f} ms  x{row['ratio']}{flag}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than x{args.threshold}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Synthetic rosters for the benchmarks.
+
+Shifts, roles, statuses and preset tea slots are drawn from a seeded
+generator, so the same arguments always give the same roster.
+"""
+import random
+
+ROLE_WEIGHTS = {"Duty Manager": 1, "Scale 3": 3, "Volunteer": 2}
+STATUS_WEIGHTS = {"Available": 8, "Sick": 1, "Annual Leave": 1, "Training": 1}
+SHIFT_STARTS = [10, 11, 11.5, 12, 13, 14]
+SHIFT_LENGTHS = [2, 3, 4, 5, 6]
+TEA_SLOTS = ["13:00", "13:15", "13:30", "13:45"]
+
+
+def synthetic_roster(size, seed=0, role_weights=None, tea_presets=0.0):
+    """Returns `size` roster entries shaped like the /generate-timesheet payload.
+
+    `tea_presets` is the share of staff who arrive with a tea_slot already set.
+    """
+    rng = random.Random(seed)
+    role_weights = role_weights or ROLE_WEIGHTS
+    roles = rng.choices(list(role_weights), weights=list(role_weights.values()), k=size)
+    statuses = rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()), k=size)
+    roster = []
+    for i in range(size):
+        start = rng.choice(SHIFT_STARTS)
+        person = {"name": f"Staff {i:05d}", "role": roles[i], "status": statuses[i],
+                  "start_hour": start,
+                  "end_hour": min(17, start + rng.choice(SHIFT_LENGTHS))}
+        if statuses[i] == "Training":
+            person["status_detail"] = "Course"
+        if tea_presets and rng.random() < tea_presets:
+            person["tea_slot"] = rng.choice(TEA_SLOTS)
+        roster.append(person)
+    return roster
@@ -0,0 +1,184 @@
+"""Break-slot allocation for the timesheet scheduler.
+
+A break period is a window of the day (e.g. tea, 13:00-14:00) cut into
+fixed-length slots, each taking at most `capacity` people. Staff whose role
+the period covers and who are available and on shift when it starts get one
+slot each: a pinned preference when its slot has room, else any preset slot
+already on their roster entry, else the least-loaded slot left. That comes
+from a min-heap of (load, slot order), so n staff and s slots cost
+O(n + n log s).
+The chosen slot is written back to the person's roster entry under the
+period's `field` ("tea_slot" for tea), as "HH:MM".
+"""
+import heapq
+import json
+import os
+
+
+def parse_clock(value):
+    """Hours after midnight from 13, 13.5 or "13:30"; raises ValueError."""
+    if isinstance(value, str):
+        hours, _, minutes = value.partition(":")
+        return int(hours) + int(minutes or 0) / 60
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    raise ValueError(f"Expected a time like 13 or '13:30', got {value!r}.")
+
+
+def clock_label(hours):
+    """ "HH:MM" for hours after midnight (13.25 -> "13:15")."""
+    minutes = int(round(hours * 60))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class BreakPeriod:
+    """One break window: slots of `slot_minutes` from `start` to `end` (hours)."""
+
+    def __init__(self, name, start, end, slot_minutes=15, capacity=2, roles=None, field=None):
+        self.name = name
+        self.start = parse_clock(start)
+        self.end = parse_clock(end)
+        self.slot_minutes = int(slot_minutes)
+        self.capacity = int(capacity)
+        self.roles = None if roles is None else frozenset(roles)
+        self.field = field or f"{name}_slot"
+        if self.end <= self.start or self.slot_minutes <= 0 or self.capacity < 1:
+            raise ValueError(f"Break period {name!r} needs end > start, "
+                             "slot_minutes > 0 and capacity >= 1.")
+        count = int(round((self.end - self.start) * 60)) // self.slot_minutes
+        self.slots = [clock_label(self.start + i * self.slot_minutes / 60) for i in range(count)]
+        self._slot_starts = {label: self.start + i * self.slot_minutes / 60
+                             for i, label in enumerate(self.slots)}
+
+    @classmethod
+    def from_dict(cls, spec):
+        if not isinstance(spec, dict) or not {"name", "start", "end"} <= set(spec):
+            raise ValueError("Each break period needs at least 'name', 'start' and 'end'.")
+        unknown = set(spec) - {"name", "start", "end", "slot_minutes", "capacity", "roles", "field"}
+        if unknown:
+            raise ValueError(f"Unknown break period keys: {', '.join(sorted(unknown))}.")
+        return cls(**spec)
+
+    def to_dict(self):
+        return {"name": self.name, "start": clock_label(self.start),
+                "end": clock_label(self.end), "slot_minutes": self.slot_minutes,
+                "capacity": self.capacity, "field": self.field,
+                "roles": None if self.roles is None else sorted(self.roles)}
+
+    def slot_span(self, label):
+        """(start, end) hours of one of this period's slots, or None."""
+        start = self._slot_starts.get(label)
+        if start is None:
+            return None
+        return start, start + self.slot_minutes / 60
+
+    def takes(self, staff):
+        return self.roles is None or staff.get("role") in self.roles
+
+
+# The 1-2pm tea break the timesheet has always had: quarter-hours, two at a time.
+DEFAULT_BREAK_PERIODS = (
+    BreakPeriod("tea", "13:00", "14:00", 15, 2, ("Scale 3", "Duty Manager"), "tea_slot"),
+)
+
+
+def allocate_period(period, staff_data, on_shift, rng, preferences=None):
+    """Fills `period.field` for everyone eligible who has no slot yet.
+
+    `on_shift` lists, in staff_data order, whether each person is on shift
+    when the period starts. `preferences` maps a name to the slot they
+    should get when it has room, even over a preset slot; the first roster
+    entry with that name is used, whatever their role.
+    """
+    field = period.field
+    load = {label: 0 for label in period.slots}
+    for staff in staff_data:
+        preset = staff.get(field)
+        if preset in load:
+            load[preset] += 1
+
+    for name, label in (preferences or {}).items():
+        if label not in load:
+            continue
+        for staff, present in zip(staff_data, on_shift):
+            if staff.get("name") != name:
+                continue
+            if (present and staff.get("status", "Available") == "Available"
+                    and load[label] < period.capacity):
+                # A pinned preference outranks a preset slot.
+                if staff.get(field) in load:
+                    load[staff[field]] -= 1
+                staff[field] = label
+                load[label] += 1
+            break
+
+    eligible = [staff for staff, present in zip(staff_data, on_shift)
+                if present and period.takes(staff)
+                and staff.get("status", "Available") == "Available"
+                and not staff.get(field)]
+    rng.shuffle(eligible)
+
+    # Least-loaded slot first, earliest on ties; full slots drop out.
+    heap = [(count, order, label) for order, (label, count) in enumerate(load.items())
+            if count < period.capacity]
+    heapq.heapify(heap)
+    for staff in eligible:
+        if not heap:
+            break
+        count, order, label = heap[0]
+        staff[field] = label
+        if count + 1 < period.capacity:
+            heapq.heapreplace(heap, (count + 1, order, label))
+        else:
+            heapq.heappop(heap)
+
+
+def allocate_breaks(staff_data, periods, rng, on_shift_at, preferences=None):
+    """Allocates every period in turn.
+
+    `on_shift_at(hour)` returns one boolean per staff_data entry.
+    `preferences` maps a name to a slot label, or to a list of labels for
+    several periods; each label applies to the period it belongs to.
+    """
+    for period in periods:
+        wanted = {}
+        for name, labels in (preferences or {}).items():
+            for label in [labels] if isinstance(labels, str) else labels:
+                if period.slot_span(label) is not None:
+                    wanted[name] = label
+        allocate_period(period, staff_data, on_shift_at(period.start), rng, wanted)
+
+
+def break_spans(staff, periods):
+    """(start, end) hours of every break slot on a person's roster entry."""
+    spans = []
+    for period in periods:
+        span = period.slot_span(staff.get(period.field))
+        if span is not None:
+            spans.append(span)
+    return spans
+
+
+def periods_from_json(raw):
+    """BreakPeriods from a JSON list of period objects; raises ValueError."""
+    try:
+        specs = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Break periods are not valid JSON: {e}")
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("Break periods must be a non-empty JSON list.")
+    periods = tuple(BreakPeriod.from_dict(spec) for spec in specs)
+    fields = [p.field for p in periods]
+    if len(set(fields)) != len(fields):
+        raise ValueError("Each break period needs its own roster field.")
+    return periods
+
+
+def breaks_from_env():
+    """(periods, preferences) from the BREAK_PERIODS and BREAK_PREFERENCES variables."""
+    raw_periods = os.environ.get("BREAK_PERIODS")
+    periods = periods_from_json(raw_periods) if raw_periods else DEFAULT_BREAK_PERIODS
+    preferences = json.loads(os.environ.get("BREAK_PREFERENCES") or "{}")
+    if not isinstance(preferences, dict):
+        raise ValueError("BREAK_PREFERENCES must be a JSON object of name: slot.")
+    return periods, preferences
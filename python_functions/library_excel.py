@@ -1,35 +1,264 @@
+import time
+IMPORT_STARTED_AT = time.perf_counter()
+
 import traceback
 import os
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
+import atexit
+import threading
+from contextlib import contextmanager
+import functools
+from types import SimpleNamespace
 import io
+import copy
+import zipfile
+import json
+import csv
+import hashlib
+import zlib
 import sqlite3
-import psycopg
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import random
-import pandas as pd
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify
 from flask_cors import CORS
-import serverless_wsgi
+from roster_cache import cache_from_env
+from timesheet_cache import timesheet_cache_from_env
+from break_allocator import allocate_breaks, break_spans, breaks_from_env
+from timesheet_templates import TemplateCache, compile_template, load_template_dir
+from timesheet_jobs import JobQueueFull, job_queue_from_env
+from metrics import metrics_from_env, server_timing_header
+from request_profiler import HEADER as PROFILE_HEADER, profiler_from_env
+from schema_migrations import migrate
+
+# Heavy libraries (openpyxl, psycopg, serverless_wsgi, pandas) are imported
+# inside the functions that need them, so a cold start only pays for what
+# the first request uses.
 
 # --- 1. APPLICATION SETUP ---
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-After", "ETag", "X-Timesheet-Cache",
+                          "X-Schedule-Seed", "X-Rescheduled-Hours", "Location",
+                          "Retry-After", "Server-Timing", "X-Profile-Id",
+                          "X-Schedule-Id", "X-Schedule-Truncated"])
+metrics = metrics_from_env()
+request_profiler = profiler_from_env(os.path.abspath(os.path.dirname(__file__)))
+
+# Cold-start timings for this process: module import, then the first request.
+STARTUP_STATS = {"import_seconds": None, "first_request_seconds": None,
+                 "first_request_path": None}
+_first_request_lock = threading.Lock()
+_first_request_started_at = None
+
+
+@app.before_request
+def mark_first_request():
+    global _first_request_started_at
+    if _first_request_started_at is None:
+        with _first_request_lock:
+            if _first_request_started_at is None:
+                _first_request_started_at = time.perf_counter()
+
+
+@app.before_request
+def start_request_timing():
+    if not metrics.enabled:
+        return
+    request.metrics_started_at = time.perf_counter()
+    metrics.begin_request()
+    if request.is_json:
+        # Parsed here so the handler's request.json reuses it.
+        with metrics.stage("parse"):
+            request.get_json(silent=True)
+
+
+@app.before_request
+def start_request_profile():
+    if request_profiler.wanted(request.headers.get(PROFILE_HEADER)):
+        request.active_profile = request_profiler.start()
+
+
+@app.after_request
+def record_first_request(response):
+    if STARTUP_STATS["first_request_seconds"] is None:
+        with _first_request_lock:
+            if STARTUP_STATS["first_request_seconds"] is None:
+                STARTUP_STATS["first_request_seconds"] = round(
+                    time.perf_counter() - _first_request_started_at, 4)
+                STARTUP_STATS["first_request_path"] = request.path
+                print(f"Cold start: import {STARTUP_STATS['import_seconds']}s, "
+                      f"first request {request.method} {request.path} "
+                      f"{STARTUP_STATS['first_request_seconds']}s")
+    return response
+
+
+def payload_roster_size(data):
+    """How many staff a request carries: one roster, a batch's days or a bulk list."""
+    if isinstance(data, list):
+        return len(data)
+    if not isinstance(data, dict):
+        return None
+    if isinstance(data.get('days'), list):
+        return sum(len(day.get('schedule') or []) for day in data['days'] if isinstance(day, dict))
+    for key in ('schedule', 'records', 'names'):
+        if isinstance(data.get(key), list):
+            return len(data[key])
+    return None
+
+
+def finish_request_profile(status):
+    active = getattr(request, "active_profile", None)
+    if active is None:
+        return None
+    request.active_profile = None
+    request_profiler.finish(active, {
+        "method": request.method, "path": request.path, "status": status,
+        "roster_size": payload_roster_size(request.get_json(silent=True)),
+        "stage_ms": {name: round(seconds * 1000, 3) for name, seconds
+                     in getattr(request, "stage_timings", {}).items()}})
+    return active.id
+
+
+# after_request hooks run in reverse order, so this one sees the stage
+# timings record_request_timing (below) has just collected.
+@app.after_request
+def save_request_profile(response):
+    profile_id = finish_request_profile(response.status_code)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+@app.teardown_request
+def release_request_profile(error=None):
+    # Only still running when the handler raised past Flask's error handling.
+    finish_request_profile(500)
+
+
+@app.after_request
+def record_request_timing(response):
+    started_at = getattr(request, "metrics_started_at", None)
+    if started_at is None:
+        return response
+    total = time.perf_counter() - started_at
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.inc("timesheet_requests_total", (("method", request.method),
+                ("endpoint", endpoint), ("status", str(response.status_code))))
+    metrics.observe("timesheet_request_seconds", total, (("endpoint", endpoint),))
+    request.stage_timings = metrics.end_request()
+    response.headers["Server-Timing"] = server_timing_header(request.stage_timings, total)
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
 
 # --- 2. DATABASE CONFIGURATION ---
 # Check if we are running on Render (DATABASE_URL exists) or Locally
 DATABASE_URL = os.environ.get('DATABASE_URL')
+# Local file-based DB, used when DATABASE_URL is not set.
+SQLITE_PATH = os.environ.get('SQLITE_PATH') or os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), 'staff.db')
+
+
+# Pool sizing for Postgres. SQLite keeps one reused connection per worker thread.
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+_sqlite_local = threading.local()
+
+
+def get_pg_pool():
+    """Opens the shared Postgres pool on first use and returns it."""
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                from psycopg_pool import ConnectionPool
+                _pg_pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    timeout=DB_POOL_TIMEOUT,
+                    check=ConnectionPool.check_connection,
+                    open=True,
+                )
+    return _pg_pool
+
+
+def close_db_pool():
+    """Closes the Postgres pool, if one was opened."""
+    global _pg_pool
+    if _pg_pool is not None:
+        _pg_pool.close()
+        _pg_pool = None
+
+
+atexit.register(close_db_pool)
+
+
+def get_sqlite_connection():
+    """Returns this thread's SQLite connection, reopening it if it no longer responds."""
+    conn = getattr(_sqlite_local, 'conn', None)
+    if conn is not None:
+        try:
+            conn.execute("SELECT 1")
+        except sqlite3.Error:
+            conn = None
+    if conn is None:
+        conn = sqlite3.connect(SQLITE_PATH)
+        # SQLite leaves foreign keys unenforced unless asked, per connection.
+        conn.execute("PRAGMA foreign_keys = ON")
+        _sqlite_local.conn = conn
+    return conn
+
+
+def integrity_errors():
+    """Exception types raised for UNIQUE violations by the active backend."""
+    if DATABASE_URL:
+        import psycopg
+        return (sqlite3.IntegrityError, psycopg.IntegrityError)
+    return (sqlite3.IntegrityError,)
 
 
-def get_db_connection():
-    """Connects to Postgres if URL is set, otherwise falls back to local SQLite."""
+@contextmanager
+def borrow_connection():
+    """Borrows a connection: pooled Postgres if URL is set, otherwise the thread's SQLite one.
+
+    Any transaction left open (e.g. by an error branch) is rolled back, and the
+    connection always goes back to the pool.
+    """
     if DATABASE_URL:
-        return psycopg.connect(DATABASE_URL)
+        import psycopg
+        with metrics.stage("db_connect"):
+            pool = get_pg_pool()
+            conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            try:
+                conn.rollback()
+            except psycopg.Error:
+                pass
+            pool.putconn(conn)
     else:
-        # Local file-based DB
-        db_path = os.path.join(os.path.abspath(
-            os.path.dirname(__file__)), 'staff.db')
-        return sqlite3.connect(db_path)
+        with metrics.stage("db_connect"):
+            conn = get_sqlite_connection()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+
+@contextmanager
+def get_db_connection():
+    """Like borrow_connection(), but makes sure the schema exists first.
+
+    The time spent inside the block is the request's "db_query" stage.
+    """
+    ensure_schema()
+    with borrow_connection() as conn, metrics.stage("db_query"):
+        yield conn
 
 
 def get_placeholder():
@@ -38,44 +267,32 @@ def get_placeholder():
 
 
 def init_db():
-    """Initializes tables for either Postgres or SQLite."""
+    """Applies any pending schema migrations for Postgres or SQLite. Returns True on success."""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-
-        # Postgres uses SERIAL, SQLite uses INTEGER PRIMARY KEY for auto-increment
-        id_type = "SERIAL PRIMARY KEY" if DATABASE_URL else "INTEGER PRIMARY KEY"
-
-        c.execute(f'''
-            CREATE TABLE IF NOT EXISTS staff (
-                id {id_type},
-                name TEXT UNIQUE NOT NULL,
-                role TEXT NOT NULL
-            )
-        ''')
-        c.execute(f'''
-            CREATE TABLE IF NOT EXISTS profiles (
-                id {id_type},
-                name TEXT UNIQUE NOT NULL,
-                role TEXT NOT NULL,
-                status TEXT,
-                status_detail TEXT,
-                start_hour REAL,
-                end_hour REAL,
-                tea_slot TEXT
-            )
-        ''')
-        conn.commit()
-        c.close()
-        conn.close()
+        # Checkout is already timed as "db_connect"; only the migrations go here.
+        with borrow_connection() as conn, metrics.stage("db_schema"):
+            applied = migrate(conn, bool(DATABASE_URL))
         print(
-            f"Database initialized. Using: {'PostgreSQL' if DATABASE_URL else 'SQLite'}")
+            f"Database initialized. Using: {'PostgreSQL' if DATABASE_URL else 'SQLite'}"
+            + (f", applied migrations {applied}" if applied else ""))
+        return True
     except Exception as e:
         print(f"Error initializing database: {e}")
+        return False
+
 
+_schema_ready = False
+_schema_lock = threading.Lock()
 
-# Initialize on startup
-init_db()
+
+def ensure_schema():
+    """Runs init_db() once per process, on the first request that touches the database."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            _schema_ready = init_db()
 
 # --- 3. CONFIGURATION DATA ---
 ROLE_PRIORITY = {"Duty Manager": 1, "Scale 3": 2, "Volunteer": 3}
@@ -91,67 +308,393 @@ TASK_CONFIG = {
     "T":          {"roles": ["Scale 3", "Duty Manager", "Volunteer"], "mandatory": 0, "full_name": "T"},
 }
 MANDATORY_C_COVERAGE = 2
+TIMESHEET_TITLE = "Canada Water Library Sunday week 3"
+COLUMN_WIDTHS = {"A": 24, "B": 10, "C": 10, "D": 10, "E": 3.2, "F": 3.2,
+                 "G": 3.2, "H": 3.2, "I": 10, "J": 10, "K": 31.5}
+# The settings above as the built-in template. Other branches and day types
+# are JSON specs in TIMESHEET_TEMPLATE_DIR or the timesheet_templates table
+# (see timesheet_templates), picked per request with "template": "<id>".
+DEFAULT_TEMPLATE = compile_template(
+    {"id": "default", "title": TIMESHEET_TITLE, "tasks": TASK_CONFIG,
+     "role_priority": ROLE_PRIORITY, "mandatory_c_coverage": MANDATORY_C_COVERAGE},
+    COLUMN_WIDTHS)
+TIMESHEET_TEMPLATE_DIR = os.environ.get("TIMESHEET_TEMPLATE_DIR") or os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), "templates")
+# Template used when a request names none.
+TIMESHEET_TEMPLATE = os.environ.get("TIMESHEET_TEMPLATE", DEFAULT_TEMPLATE.id)
+
+HEADER_FONT_SIZE = 10
+# Per-person colours for volunteer and special-status rows. A person always
+# gets the same colour, and a workbook never holds more fills than this.
+PERSON_PALETTE = ["F4B183", "A9D08E", "FFD966", "9BC2E6", "D5A6BD", "F8CBAD",
+                  "B4A7D6", "8EA9DB", "E2C275", "C6E0B4", "E6B8B7", "B1A0C7",
+                  "FABF8F", "95B3D7", "C4D79B", "D9D2E9"]
+
+
+@functools.lru_cache(maxsize=None)
+def get_styles():
+    """Shared openpyxl style objects, built once per process on the first render."""
+    from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
+    return SimpleNamespace(
+        green_fill=PatternFill(start_color="92D050",
+                               end_color="92D050", fill_type="solid"),
+        blackout_fill=PatternFill(
+            start_color="000000", end_color="000000", fill_type="solid"),
+        tea_fill=PatternFill(start_color="B7DEE8",
+                             end_color="B7DEE8", fill_type="solid"),
+        thin_border=Border(left=Side(style="thin"), right=Side(
+            style="thin"), top=Side(style="thin"), bottom=Side(style="thin")),
+        center=Alignment(horizontal="center", vertical="center"),
+        arial=Font(name="Arial"),
+        arial_bold=Font(name="Arial", bold=True),
+        header=Font(name="Arial", size=HEADER_FONT_SIZE),
+        header_bold=Font(name="Arial", bold=True, size=HEADER_FONT_SIZE),
+        person_fills=[PatternFill(start_color=color, end_color=color, fill_type="solid")
+                      for color in PERSON_PALETTE],
+    )
+
+
+def person_fill(name):
+    """Returns the palette fill for `name`, stable across requests and processes."""
+    fills = get_styles().person_fills
+    return fills[zlib.crc32(str(name).encode("utf-8")) % len(fills)]
 
-GREEN_FILL = PatternFill(start_color="92D050",
-                         end_color="92D050", fill_type="solid")
-BLACKOUT_FILL = PatternFill(
-    start_color="000000", end_color="000000", fill_type="solid")
-TEA_FILL = PatternFill(start_color="B7DEE8",
-                       end_color="B7DEE8", fill_type="solid")
 
 DATA_START_ROW_EXCEL = 6
 
+# Grid layout shared by every sheet; built once per process.
+DISPLAY_TIME_HEADERS = ["11.30-12", "12-1",
+                        "00", "15", "30", "45", "2-3", "3-4"]
+INTERNAL_TO_DISPLAY_MAP = {
+    "11:30": "11.30-12", "12:00": "12-1", "13:00": "1-2", "14:00": "2-3", "15:00": "3-4"
+}
+FINAL_COLUMN_NAMES = ["Staff Name", "Shift", "11.30-12",
+                      "12-1", "00", "15", "30", "45", "2-3", "3-4", "Comments"]
+TIME_COLUMN_HOURS = {"11.30-12": 11.5, "12-1": 12, "00": 13,
+                     "15": 13, "30": 13, "45": 13, "2-3": 14, "3-4": 15}
+MAX_BATCH_DAYS = 31
+# 'openpyxl' styles a fully built sheet; 'streaming' writes each styled row once.
+TIMESHEET_RENDERER = os.environ.get("TIMESHEET_RENDERER", "openpyxl")
+# Worker processes for rendering zip batch exports; below 2 renders in-process.
+RENDER_POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", 0))
+# Default window for POST /schedule/coverage: the assignment hours. The
+# minimum headcounts come from the template.
+COVERAGE_REPORT_HOURS = (12, 16)
+# Hourly task assignment: 'greedy' (shuffled, first come) or 'optimal' (see assignment_engine).
+SCHEDULER_ENGINE = os.environ.get("SCHEDULER_ENGINE", "greedy")
+# Searches the optimal engine runs per day; a count, not a time limit, so
+# a seed gives the same day however busy the machine is.
+SCHEDULER_RESTARTS = int(os.environ.get("SCHEDULER_RESTARTS", 12))
+# Hard cap, in seconds, on one day's optimal search (0 for none). A capped
+# day is not reproducible, so it is neither cached nor given a seed header.
+SCHEDULER_TIME_LIMIT = float(os.environ.get("SCHEDULER_TIME_LIMIT", 2.0))
+# Break windows, slot lengths and capacities (BREAK_PERIODS, default 1-2pm
+# tea) and slots pinned to named staff (BREAK_PREFERENCES); see break_allocator.
+BREAK_PERIODS, BREAK_PREFERENCES = breaks_from_env()
+MINUTE_COLUMNS = ("00", "15", "30", "45")
+
+STAFF_COLUMNS = ("name", "role")
+PROFILE_COLUMNS = ("name", "role", "status", "status_detail",
+                   "start_hour", "end_hour", "tea_slot")
+MAX_PAGE_SIZE = 1000
+# How long a worker trusts its cached table revision before re-reading it.
+REVISION_CACHE_TTL = float(os.environ.get("REVISION_CACHE_TTL", 1.0))
+STREAM_FETCH_SIZE = 500
+
 # --- 4. API ENDPOINTS ---
 
 
+_revision_cache = {}
+_revision_cache_lock = threading.Lock()
+
+# Decoded result sets for GET /staff and GET /profiles; see ROSTER_CACHE_* in the README.
+roster_cache = cache_from_env(os.path.abspath(os.path.dirname(__file__)))
+timesheet_cache = timesheet_cache_from_env(
+    os.path.abspath(os.path.dirname(__file__)))
+# Compiled timesheet_templates rows, rebuilt when the table's revision moves.
+template_cache = TemplateCache(COLUMN_WIDTHS)
+# Background /jobs/timesheet work; see TIMESHEET_JOB_* in the README.
+job_queue = job_queue_from_env(os.path.abspath(os.path.dirname(__file__)))
+
+
+def bump_revision(c, table):
+    """Marks `table` as changed inside the caller's transaction.
+
+    Last-Modified has whole seconds, so updated_at moves on to at least the
+    next second: a client that read earlier in the same second must not get
+    a 304 for If-Modified-Since.
+    """
+    ph = get_placeholder()
+    c.execute(f"SELECT updated_at FROM table_revisions WHERE table_name = {ph}", (table,))
+    row = c.fetchone()
+    updated_at = time.time()
+    if row is not None:
+        updated_at = max(updated_at, int(row[0]) + 1)
+    c.execute(
+        f"UPDATE table_revisions SET revision = revision + 1, updated_at = {ph} WHERE table_name = {ph}",
+        (updated_at, table))
+
+
+def link_profiles_to_staff(c):
+    """Points unlinked profiles at the staff row with the same name, inside the caller's transaction."""
+    c.execute("UPDATE profiles SET staff_id = "
+              "(SELECT staff.id FROM staff WHERE staff.name = profiles.name) "
+              "WHERE staff_id IS NULL")
+
+
+def roster_changed(table):
+    """Drops cached revision and result sets once a write to `table` has committed."""
+    with _revision_cache_lock:
+        _revision_cache.pop(table, None)
+    roster_cache.invalidate(table)
+
+
+def get_table_revision(table):
+    """Returns (revision, updated_at) for `table`, served from a short-lived per-process cache."""
+    now = time.monotonic()
+    with _revision_cache_lock:
+        cached = _revision_cache.get(table)
+    if cached and now - cached[2] < REVISION_CACHE_TTL:
+        return cached[0], cached[1]
+
+    ph = get_placeholder()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            f"SELECT revision, updated_at FROM table_revisions WHERE table_name = {ph}", (table,))
+        row = c.fetchone()
+        c.close()
+    revision, updated_at = row if row else (0, 0.0)
+    with _revision_cache_lock:
+        _revision_cache[table] = (revision, updated_at, now)
+    return revision, updated_at
+
+
+def roster_etag(table, revision):
+    # Filters, pages and output format all share a revision but differ in body.
+    variant = request.query_string + request.accept_mimetypes.to_header().encode()
+    digest = hashlib.sha1(variant).hexdigest()[:12]
+    return f"{table}-{revision}-{digest}"
+
+
+def is_not_modified(etag, updated_at):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    if since:
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return int(updated_at) <= since.timestamp()
+    return False
+
+
+def shift_arg(args, name):
+    """Reads an hour such as 13 or 13.5 from the query string; raises ValueError if malformed."""
+    raw = args.get(name)
+    if raw is None or raw == "":
+        return None
+    try:
+        hour = float(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number of hours.")
+    if not 0 <= hour <= 24:
+        raise ValueError(f"{name} must be between 0 and 24.")
+    return hour
+
+
+def build_roster_query(table, columns, args):
+    """Builds a filtered, optionally keyset-paginated SELECT from query-string args.
+
+    Supported args: role and status (repeatable), shift_from/shift_to (rows whose
+    shift overlaps the window), after (last name of the previous page) and limit.
+    Returns (sql, params, limit); limit is None when the caller did not paginate.
+    Raises ValueError for malformed args.
+    """
+    ph = get_placeholder()
+    where = []
+    params = []
+
+    filter_columns = ["role"]
+    if "status" in columns:
+        filter_columns.append("status")
+    for col in filter_columns:
+        values = [v for v in args.getlist(col) if v]
+        if values:
+            where.append(f"{col} IN ({', '.join([ph] * len(values))})")
+            params.extend(values)
+
+    if "start_hour" in columns:
+        shift_from = shift_arg(args, "shift_from")
+        shift_to = shift_arg(args, "shift_to")
+        if shift_to is not None:
+            where.append(f"start_hour < {ph}")
+            params.append(shift_to)
+        if shift_from is not None:
+            where.append(f"end_hour > {ph}")
+            params.append(shift_from)
+
+    after = args.get("after")
+    raw_limit = args.get("limit")
+    limit = None
+    if raw_limit is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise ValueError("limit must be an integer.")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    if after:
+        where.append(f"name > {ph}")
+        params.append(after)
+
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if after or limit is not None:
+        # Keyset pagination walks the UNIQUE index on name.
+        sql += " ORDER BY name"
+        if limit is not None:
+            # One extra row tells us whether there is a next page.
+            sql += f" LIMIT {limit + 1}"
+    return sql, params, limit
+
+
+def wants_ndjson():
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+
+def stream_roster_rows(sql, params, columns):
+    """Yields NDJSON lines from a server-side cursor without loading the full result."""
+    with get_db_connection() as conn:
+        if DATABASE_URL:
+            c = conn.cursor(name="roster_stream")
+            c.itersize = STREAM_FETCH_SIZE
+        else:
+            c = conn.cursor()
+        try:
+            c.execute(sql, params)
+            while True:
+                rows = c.fetchmany(STREAM_FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.dumps(dict(zip(columns, row))) + "\n"
+        finally:
+            c.close()
+
+
+def read_roster(table, columns):
+    """Shared GET handler for /staff and /profiles."""
+    try:
+        sql, params, limit = build_roster_query(table, columns, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    revision, updated_at = get_table_revision(table)
+    etag = roster_etag(table, revision)
+    last_modified = datetime.fromtimestamp(int(updated_at), tz=timezone.utc)
+    if is_not_modified(etag, updated_at):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+    ndjson = wants_ndjson()
+    if ndjson and limit is None:
+        response = Response(stream_roster_rows(sql, params, columns),
+                            mimetype="application/x-ndjson")
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+    def load_page():
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(sql, params)
+            rows = c.fetchall()
+            c.close()
+
+        next_after = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1][0]
+        return {"rows": [dict(zip(columns, row)) for row in rows], "next_after": next_after}
+
+    # Keyed by the revision read above, so a write committed by another worker
+    # is never served from this worker's cache under the new ETag, and a load
+    # racing an invalidation can only refill a key no later read asks for.
+    page = roster_cache.get_or_load(table, json.dumps([revision, sql, params]), load_page)
+
+    if ndjson:
+        # A page is at most MAX_PAGE_SIZE rows, and X-Next-After has to be
+        # known before the body starts, so pages are not streamed.
+        response = Response("".join(json.dumps(row) + "\n" for row in page["rows"]),
+                            mimetype="application/x-ndjson")
+    else:
+        response = jsonify(page["rows"])
+    if page["next_after"] is not None:
+        response.headers["X-Next-After"] = page["next_after"]
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Let browsers keep the body but always revalidate with the ETag.
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"roster": roster_cache.stats(),
+                    "timesheet": timesheet_cache.stats(),
+                    "templates": template_cache.stats()})
+
+
 @app.route('/staff', methods=['GET', 'POST'])
 def manage_staff():
-    conn = get_db_connection()
-    c = conn.cursor()
+    if request.method == 'GET':
+        return read_roster("staff", STAFF_COLUMNS)
+
     ph = get_placeholder()  # Get ? or %s
 
-    if request.method == 'POST':
+    with get_db_connection() as conn:
+        c = conn.cursor()
+
         data = request.json
         name = data.get('name')
         role = data.get('role')
         if not name or not role:
             c.close()
-            conn.close()
             return jsonify({"error": "Name and Role are required."}), 400
 
         try:
             c.execute(
                 f"INSERT INTO staff (name, role) VALUES ({ph}, {ph})", (name, role))
+            link_profiles_to_staff(c)
+            bump_revision(c, "staff")
             conn.commit()
-            c.close()
-            conn.close()
+            roster_changed("staff")
             return jsonify({"message": f"Staff member {name} added as {role}."}), 201
-        except (sqlite3.IntegrityError, psycopg.IntegrityError):
-            if DATABASE_URL:
-                conn.rollback()
-            c.close()
-            conn.close()
+        except integrity_errors():
+            conn.rollback()
             return jsonify({"error": f"Staff member {name} already exists."}), 409
         except Exception as e:
-            if DATABASE_URL:
-                conn.rollback()
+            conn.rollback()
             return jsonify({"error": str(e)}), 500
-
-    c.execute("SELECT name, role FROM staff")
-    staff_list = c.fetchall()
-    c.close()
-    conn.close()
-
-    return jsonify([{"name": s[0], "role": s[1]} for s in staff_list])
+        finally:
+            c.close()
 
 
 @app.route('/profiles', methods=['GET', 'POST'])
 def manage_profiles():
-    conn = get_db_connection()
-    c = conn.cursor()
+    if request.method == 'GET':
+        return read_roster("profiles", PROFILE_COLUMNS)
+
     ph = get_placeholder()
 
-    if request.method == 'POST':
+    with get_db_connection() as conn:
+        c = conn.cursor()
+
         data = request.json or {}
         name = data.get('name')
         role = data.get('role')
@@ -163,7 +706,6 @@ def manage_profiles():
 
         if not name or not role:
             c.close()
-            conn.close()
             return jsonify({"error": "Name and Role are required."}), 400
 
         try:
@@ -175,57 +717,39 @@ def manage_profiles():
                 (name, role, status, status_detail,
                  start_hour, end_hour, tea_slot),
             )
+            link_profiles_to_staff(c)
+            bump_revision(c, "profiles")
             conn.commit()
-            c.close()
-            conn.close()
+            roster_changed("profiles")
             return jsonify({"message": f"Profile {name} saved."}), 201
-        except (sqlite3.IntegrityError, psycopg.IntegrityError):
-            if DATABASE_URL:
-                conn.rollback()
-            c.close()
-            conn.close()
+        except integrity_errors():
+            conn.rollback()
             return jsonify({"error": f"Profile {name} already exists."}), 409
         except Exception as e:
-            if DATABASE_URL:
-                conn.rollback()
+            conn.rollback()
             return jsonify({"error": str(e)}), 500
-
-    c.execute(
-        "SELECT name, role, status, status_detail, start_hour, end_hour, tea_slot FROM profiles")
-    profiles = c.fetchall()
-    c.close()
-    conn.close()
-
-    result = []
-    for p in profiles:
-        result.append({
-            "name": p[0],
-            "role": p[1],
-            "status": p[2],
-            "status_detail": p[3],
-            "start_hour": p[4],
-            "end_hour": p[5],
-            "tea_slot": p[6],
-        })
-    return jsonify(result)
+        finally:
+            c.close()
 
 
 @app.route('/profiles/<name>', methods=['DELETE'])
 def delete_profile(name):
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
         ph = get_placeholder()
         from urllib.parse import unquote
         decoded_name = unquote(name)
 
-        c.execute(f"DELETE FROM profiles WHERE name = {ph}", (decoded_name,))
-        conn.commit()
-        deleted = c.rowcount
-        c.close()
-        conn.close()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(f"DELETE FROM profiles WHERE name = {ph}", (decoded_name,))
+            deleted = c.rowcount
+            if deleted:
+                bump_revision(c, "profiles")
+            conn.commit()
+            c.close()
         if deleted == 0:
             return jsonify({"error": f"Profile {decoded_name} not found."}), 404
+        roster_changed("profiles")
         return jsonify({"message": f"Profile {decoded_name} removed."})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -234,72 +758,224 @@ def delete_profile(name):
 @app.route('/staff/<name>', methods=['DELETE'])
 def delete_staff(name):
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
         ph = get_placeholder()
         from urllib.parse import unquote
         decoded_name = unquote(name)
 
-        c.execute(f"DELETE FROM staff WHERE name = {ph}", (decoded_name,))
-        conn.commit()
-        deleted = c.rowcount
-        c.close()
-        conn.close()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(f"DELETE FROM staff WHERE name = {ph}", (decoded_name,))
+            deleted = c.rowcount
+            if deleted:
+                bump_revision(c, "staff")
+            conn.commit()
+            c.close()
 
         if deleted == 0:
             return jsonify({"error": f"Staff member {decoded_name} not found."}), 404
+        roster_changed("staff")
         return jsonify({"message": f"Staff member {decoded_name} removed."})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-# --- 5. CORE SCHEDULING LOGIC (Unchanged) ---
+BULK_CHUNK_SIZE = 500
 
-def auto_assign_tea_slots(staff_data):
-    tea_times = ["13:00", "13:15", "13:30", "13:45"]
-    used_slots = {t: 0 for t in tea_times}
 
-    for staff in staff_data:
-        preset = staff.get("tea_slot")
-        if isinstance(preset, str) and preset.startswith("13:"):
-            if preset in used_slots:
-                used_slots[preset] += 1
-            else:
-                used_slots[preset] = 1
-
-    for staff in staff_data:
-        if staff.get("name") == "Kyle" and staff.get("status", "Available") == "Available":
-            start = staff.get("start_hour", 0)
-            end = staff.get("end_hour", 0)
-            if start <= 13 < end:
-                if used_slots.get("13:45", 0) < 2:
-                    staff["tea_slot"] = "13:45"
-                    used_slots["13:45"] = used_slots.get("13:45", 0) + 1
-            break
+def chunked(items, size=BULK_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
-    eligible = []
-    for staff in staff_data:
-        if staff.get("role") not in ["Scale 3", "Duty Manager"]:
-            continue
-        if staff.get("status", "Available") != "Available":
+
+def fetch_existing_names(c, table, names):
+    """Returns which of `names` already exist in `table`, querying in chunks."""
+    ph = get_placeholder()
+    existing = set()
+    for chunk in chunked(names):
+        marks = ", ".join([ph] * len(chunk))
+        c.execute(f"SELECT name FROM {table} WHERE name IN ({marks})", chunk)
+        existing.update(row[0] for row in c.fetchall())
+    return existing
+
+
+def bulk_upsert(table, columns, records, on_conflict="update"):
+    """Writes all valid records in one transaction and returns a result per input row.
+
+    on_conflict="update" overwrites existing rows with the same name,
+    on_conflict="ignore" leaves them untouched and reports them as skipped.
+    """
+    results = [None] * len(records)
+    rows_by_name = {}
+    for idx, record in enumerate(records):
+        if not isinstance(record, dict) or not record.get("name") or not record.get("role"):
+            name = record.get("name") if isinstance(record, dict) else None
+            results[idx] = {"name": name, "status": "error",
+                            "error": "Name and Role are required."}
             continue
-        if staff.get("tea_slot"):
+        if not isinstance(record["name"], str) or not isinstance(record["role"], str):
+            results[idx] = {"name": record["name"], "status": "error",
+                            "error": "Name and Role must be text."}
             continue
-        start = staff.get("start_hour", 0)
-        end = staff.get("end_hour", 0)
-        if start <= 13 < end:
-            eligible.append(staff)
-
-    random.shuffle(eligible)
-    for staff in eligible:
-        slot = None
-        for t in sorted(tea_times, key=lambda x: used_slots.get(x, 0)):
-            if used_slots.get(t, 0) < 2:
-                slot = t
-                break
-        if slot:
-            staff["tea_slot"] = slot
-            used_slots[slot] = used_slots.get(slot, 0) + 1
+        name = record["name"]
+        if name in rows_by_name:
+            # Last occurrence in the batch wins.
+            prev_idx = rows_by_name[name][0]
+            results[prev_idx] = {"name": name, "status": "skipped",
+                                 "error": "Duplicate name later in batch."}
+        rows_by_name[name] = (idx, tuple(record.get(col) for col in columns))
+
+    if not rows_by_name:
+        return results
+
+    ph = get_placeholder()
+    col_list = ", ".join(columns)
+    marks = ", ".join([ph] * len(columns))
+    if on_conflict == "ignore":
+        conflict_sql = "DO NOTHING"
+    else:
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns[1:])
+        conflict_sql = f"DO UPDATE SET {updates}"
+    sql = f"INSERT INTO {table} ({col_list}) VALUES ({marks}) ON CONFLICT (name) {conflict_sql}"
+
+    names = list(rows_by_name)
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            existing = fetch_existing_names(c, table, names)
+            # psycopg pipelines executemany, so Postgres gets one round trip per batch.
+            c.executemany(sql, [row for _, row in rows_by_name.values()])
+            link_profiles_to_staff(c)
+            bump_revision(c, table)
+            conn.commit()
+        finally:
+            c.close()
+    roster_changed(table)
+
+    for name, (idx, _) in rows_by_name.items():
+        if name not in existing:
+            status = "created"
+        elif on_conflict == "ignore":
+            status = "skipped"
+        else:
+            status = "updated"
+        results[idx] = {"name": name, "status": status}
+    return results
+
+
+def bulk_delete(table, names):
+    """Deletes every listed name in one transaction and reports each as deleted or not_found.
+
+    Repeated names are reported once; anything that is not a non-empty
+    string is reported as an error after them.
+    """
+    ph = get_placeholder()
+    unique_names = list(dict.fromkeys(n for n in names if isinstance(n, str) and n))
+    invalid = [{"name": n, "status": "error", "error": "Names must be non-empty text."}
+               for n in names if not isinstance(n, str) or not n]
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            existing = fetch_existing_names(c, table, unique_names)
+            for chunk in chunked(unique_names):
+                marks = ", ".join([ph] * len(chunk))
+                c.execute(f"DELETE FROM {table} WHERE name IN ({marks})", chunk)
+            if existing:
+                bump_revision(c, table)
+            conn.commit()
+        finally:
+            c.close()
+    roster_changed(table)
+    return [{"name": n, "status": "deleted" if n in existing else "not_found"}
+            for n in unique_names] + invalid
+
+
+def summarize_results(results):
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return summary
+
+
+def bulk_upsert_response(table, columns):
+    data = request.json
+    on_conflict = request.args.get("on_conflict", "update")
+    if isinstance(data, dict):
+        on_conflict = data.get("on_conflict", on_conflict)
+        data = data.get("records")
+    if not isinstance(data, list):
+        return jsonify({"error": "Expected a JSON array of records."}), 400
+    if on_conflict not in ("update", "ignore"):
+        return jsonify({"error": "on_conflict must be 'update' or 'ignore'."}), 400
+
+    try:
+        results = bulk_upsert(table, columns, data, on_conflict)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"results": results, "summary": summarize_results(results)})
+
+
+def bulk_delete_response(table):
+    data = request.json
+    names = data.get("names") if isinstance(data, dict) else data
+    if not isinstance(names, list):
+        return jsonify({"error": "Expected a JSON list of names."}), 400
+
+    try:
+        results = bulk_delete(table, names)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"results": results, "summary": summarize_results(results)})
+
+
+@app.route('/staff', methods=['PUT'])
+def bulk_upsert_staff():
+    return bulk_upsert_response("staff", STAFF_COLUMNS)
+
+
+@app.route('/staff', methods=['DELETE'])
+def bulk_delete_staff():
+    return bulk_delete_response("staff")
+
+
+@app.route('/profiles', methods=['PUT'])
+def bulk_upsert_profiles():
+    return bulk_upsert_response("profiles", PROFILE_COLUMNS)
+
+
+@app.route('/profiles', methods=['DELETE'])
+def bulk_delete_profiles():
+    return bulk_delete_response("profiles")
+
+
+# --- 5. CORE SCHEDULING LOGIC ---
+
+def auto_assign_tea_slots(staff_data, rng=random, coverage=None):
+    """Gives break slots for every BREAK_PERIODS entry; `coverage` rows must follow staff_data."""
+    if coverage is None:
+        from shift_coverage import ShiftCoverage
+        coverage = ShiftCoverage(staff_data)
+    allocate_breaks(staff_data, BREAK_PERIODS, rng, coverage.column, BREAK_PREFERENCES)
+
+
+def break_minutes(staff):
+    """The 1-2pm minute columns a person spends on a break."""
+    minutes = set()
+    for start, end in break_spans(staff, BREAK_PERIODS):
+        for minute in MINUTE_COLUMNS:
+            quarter = 13 + int(minute) / 60
+            if start < quarter + 0.25 and quarter < end:
+                minutes.add(minute)
+    return minutes
+
+
+def break_notes(staff):
+    """Comments for breaks outside the 1-2pm minute columns, e.g. "Break 15:30"."""
+    notes = []
+    for period in BREAK_PERIODS:
+        span = period.slot_span(staff.get(period.field))
+        if span is not None and (span[1] <= 13 or span[0] >= 14):
+            notes.append(f"{period.name.capitalize()} {staff[period.field]}")
+    return notes
 
 
 def format_decimal_time(value):
@@ -327,368 +1003,665 @@ def build_shift_label(staff):
     return start_str or end_str
 
 
-def generate_schedule_data(staff_data, date_str):
-    auto_assign_tea_slots(staff_data)
+class ScheduleGrid:
+    """The scheduled day: one list of cell values per person, in FINAL_COLUMN_NAMES order.
 
-    duty_managers_at_one = [
-        s["name"] for s in staff_data
-        if s.get("role") == "Duty Manager"
-        and s.get("status", "Available") == "Available"
-        and s.get("start_hour", 0) <= 13 < s.get("end_hour", 0)
-    ]
+    `coverage` is the ShiftCoverage the scheduler built and `template` the
+    TimesheetTemplate it followed, both kept for the renderers. `truncated`
+    is True when the assignment engine stopped at its time limit.
+    """
+    __slots__ = ("rows", "coverage", "template", "truncated")
+    columns = FINAL_COLUMN_NAMES
 
-    scale3_tea_minutes = set()
-    for s in staff_data:
-        if s.get("role") != "Scale 3":
-            continue
-        tea_slot = s.get("tea_slot")
-        if isinstance(tea_slot, str) and ":" in tea_slot:
-            scale3_tea_minutes.add(tea_slot.split(":")[1])
+    def __init__(self, rows, coverage=None, template=None, truncated=False):
+        self.rows = rows
+        self.coverage = coverage
+        self.template = template or DEFAULT_TEMPLATE
+        self.truncated = truncated
 
-    def sort_key(s):
-        availability_priority = 1 if s.get(
-            "status", "Available") == "Available" else 2
-        role_p = ROLE_PRIORITY.get(s.get("role", ""), 99)
-        return (availability_priority, role_p, s.get("name", ""))
+    def __len__(self):
+        return len(self.rows)
 
-    staff_data.sort(key=sort_key)
-    pivot_schedule = {s["name"]: {} for s in staff_data if "name" in s}
+    def __iter__(self):
+        return iter(self.rows)
 
-    sm_assigned_staff = set()
-    r_assigned_staff = set()
-    volunteer_task_history = {}
+    def to_records(self):
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def to_csv(self):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(self.columns)
+        writer.writerows(self.rows)
+        return output.getvalue()
+
+    def to_dataframe(self):
+        """Returns the grid as a pandas DataFrame; pandas is only imported here."""
+        import pandas as pd
+        return pd.DataFrame(self.rows, columns=self.columns)
+
+
+ASSIGNMENT_HOUR_KEYS = ["12:00", "13:00", "14:00", "15:00"]
+SETUP_SLOT_KEY = "11:30"
 
-    setup_slot_key = "11:30"
 
-    for staff in staff_data:
-        if staff.get("status", "Available") != "Available":
+def hour_of_key(key):
+    hours, minutes = key.split(":")
+    return int(hours) + int(minutes) / 60
+
+
+def build_staff_index(staff_data, hour_keys, coverage=None):
+    """Buckets available staff by role and by the assignment hours their shift covers.
+
+    `coverage` is a ShiftCoverage whose rows follow staff_data; each bucket
+    keeps roster order so the hourly shuffles see the same input as a full
+    rescan would.
+    """
+    if coverage is None:
+        from shift_coverage import ShiftCoverage
+        coverage = ShiftCoverage(staff_data)
+    by_role = {}
+    for s in staff_data:
+        if s.get("status", "Available") == "Available":
+            by_role.setdefault(s.get("role", ""), []).append(s)
+    on_shift = {key: coverage.on_shift(hour_of_key(key)) for key in hour_keys}
+    return by_role, on_shift
+
+
+def first_free(candidates, taken, excluded_names=()):
+    for s in candidates:
+        if id(s) not in taken and s["name"] not in excluded_names:
+            return s
+    return None
+
+
+def greedy_fill_hour(pivot_schedule, time_str, on_shift, taken, sm_assigned_staff,
+                     r_assigned_staff, volunteer_task_history, rng, template=DEFAULT_TEMPLATE,
+                     keep=None):
+    """Fills one assignment hour: the template's mandatory tasks to the first
+    free Scale 3 in a shuffled order, then one random task per remaining person.
+
+    `taken` maps tasks already held this hour to their holders; those people
+    and tasks are left alone. `keep` maps optional tasks to people who held
+    them before: the mandatory tasks may still take them (after everyone
+    free), and whoever is left keeps their task. Writes into pivot_schedule
+    and the SM/R sets.
+    """
+    keep = keep or {}
+    busy = set(taken.values())
+    available_staff_for_hour = [s for s in on_shift if s["name"] not in busy]
+    rng.shuffle(available_staff_for_hour)
+    tasks_assigned_in_hour = set(busy)
+    tasks_taken_in_hour = set(taken)
+
+    kept_names = set(keep.values())
+    scale3_staff = [
+        s for s in available_staff_for_hour if s.get("role") == "Scale 3"]
+    # Stable, so the shuffled order holds within the free and the kept staff.
+    scale3_staff.sort(key=lambda s: s["name"] in kept_names)
+    scale3_taken = set()
+
+    for task in template.mandatory_tasks:
+        if task in tasks_taken_in_hour:
             continue
-        start = staff.get("start_hour", 0)
-        end = staff.get("end_hour", 0)
-        role = staff.get("role", "")
+        if task == "SM":
+            staff_to_assign = first_free(
+                scale3_staff, scale3_taken, sm_assigned_staff)
+        elif task == "R":
+            staff_to_assign = first_free(
+                scale3_staff, scale3_taken, r_assigned_staff)
+        else:
+            staff_to_assign = first_free(scale3_staff, scale3_taken)
+        if staff_to_assign is None:
+            continue
+        name = staff_to_assign["name"]
+        if task == "SM":
+            sm_assigned_staff.add(name)
+        elif task == "R":
+            r_assigned_staff.add(name)
+        scale3_taken.add(id(staff_to_assign))
+        tasks_taken_in_hour.add(task)
+        pivot_schedule[name][time_str] = task
+        tasks_assigned_in_hour.add(name)
+
+    for task, name in keep.items():
+        if name not in tasks_assigned_in_hour and task not in tasks_taken_in_hour:
+            pivot_schedule[name][time_str] = task
+            tasks_assigned_in_hour.add(name)
+            tasks_taken_in_hour.add(task)
+
+    for staff in available_staff_for_hour:
+        if tasks_taken_in_hour.issuperset(template.random_tasks):
+            # Nothing left to hand out this hour.
+            break
         name = staff.get("name", "")
+        if name in tasks_assigned_in_hour:
+            continue
+        role = staff.get("role", "")
+        assignable_tasks = [
+            t for t in template.random_tasks_by_role.get(role, ()) if t not in tasks_taken_in_hour]
+
+        if role == "Volunteer":
+            used = volunteer_task_history.get(name, set())
+            unused_variants = [
+                t for t in assignable_tasks if t not in used]
+            if unused_variants:
+                assignable_tasks = unused_variants
+
+        if assignable_tasks:
+            assigned_task = rng.choice(assignable_tasks)
+            pivot_schedule[name][time_str] = assigned_task
+            tasks_assigned_in_hour.add(name)
+            tasks_taken_in_hour.add(assigned_task)
+            if role == "Volunteer":
+                volunteer_task_history.setdefault(
+                    name, set()).add(assigned_task)
 
-        if role == "Duty Manager" and (start <= 11.5 < end):
-            pivot_schedule[name][setup_slot_key] = "Set Up"
 
-    assignment_hour_keys = ["12:00", "13:00", "14:00", "15:00"]
+def greedy_assign_hours(pivot_schedule, on_shift_by_hour, volunteer_task_history, rng,
+                        template=DEFAULT_TEMPLATE, stats=None):
+    """Fills each assignment hour in turn with greedy_fill_hour.
 
-    for time_str in assignment_hour_keys:
-        hour = int(time_str.split(':')[0])
-        available_staff_for_hour = []
-        for s in staff_data:
-            if s.get("status", "Available") != "Available":
-                continue
-            start = s.get("start_hour", 0)
-            end = s.get("end_hour", 0)
-            is_on_shift = start <= hour < end
-            if is_on_shift:
-                available_staff_for_hour.append(s)
-
-        random.shuffle(available_staff_for_hour)
-        tasks_assigned_in_hour = []
-        tasks_taken_in_hour = set()
-        mandatory_tasks_to_assign = []
-
-        if TASK_CONFIG["SM"]["mandatory"] > 0:
-            mandatory_tasks_to_assign.append("SM")
-        if TASK_CONFIG["R"]["mandatory"] > 0:
-            mandatory_tasks_to_assign.append("R")
-        mandatory_tasks_to_assign.extend(["C", "C+"][:MANDATORY_C_COVERAGE])
-
-        scale3_staff = [
-            s for s in available_staff_for_hour if s.get("role") == "Scale 3"]
-
-        for task in mandatory_tasks_to_assign:
+    Writes into pivot_schedule and returns the names given R. Never
+    truncated, so `stats` is left as it is.
+    """
+    sm_assigned_staff = set()
+    r_assigned_staff = set()
+    for time_str in ASSIGNMENT_HOUR_KEYS:
+        greedy_fill_hour(pivot_schedule, time_str, on_shift_by_hour[time_str], {},
+                         sm_assigned_staff, r_assigned_staff, volunteer_task_history, rng,
+                         template)
+    return r_assigned_staff
+
+
+# Relative worth of filling one task for one hour in the optimal engine.
+MANDATORY_TASK_VALUE = 100.0
+OPTIONAL_TASK_VALUE = 10.0
+# Lost when a volunteer repeats a task; less than OPTIONAL_TASK_VALUE, so a
+# repeat still beats leaving the task empty, as in the greedy engine.
+VOLUNTEER_REPEAT_PENALTY = 5.0
+
+
+def optimal_assign_hours(pivot_schedule, on_shift_by_hour, volunteer_task_history, rng,
+                         template=DEFAULT_TEMPLATE, restarts=None, time_limit=None, stats=None):
+    """Assigns all hours at once with assignment_engine, maximising covered task-hours.
+
+    Mandatory tasks outrank the rest (SM first, as in the greedy order), a
+    13:00 task is worth a quarter less for someone taking tea in that hour,
+    SM and R go to a different person each hour, and volunteers are steered
+    away from tasks they have already done. Writes into pivot_schedule and
+    returns the names given R.
+
+    The search runs `restarts` restarts (default SCHEDULER_RESTARTS) unless
+    `time_limit` seconds (default SCHEDULER_TIME_LIMIT, 0 for none) run out
+    first. `stats`, when given, is updated with the solver's stats,
+    including "truncated".
+    """
+    from assignment_engine import AssignmentProblem
+
+    mandatory = list(template.mandatory_tasks)
+    tasks = mandatory + list(template.random_tasks)
+    staff_by_name = {}
+    on_shift = {}
+    for hour in ASSIGNMENT_HOUR_KEYS:
+        on_shift[hour] = [s["name"] for s in on_shift_by_hour[hour]]
+        for s in on_shift_by_hour[hour]:
+            staff_by_name[s["name"]] = s
+    allowed = {name: {t for t in tasks if s.get("role", "") in template.task_config[t]["roles"]}
+               for name, s in staff_by_name.items()}
+    task_values = {t: MANDATORY_TASK_VALUE + len(mandatory) - i
+                   for i, t in enumerate(mandatory)}
+    task_values.update({t: OPTIONAL_TASK_VALUE for t in template.random_tasks})
+
+    def value(name, hour, task):
+        worth = task_values[task]
+        if hour == "13:00":
+            worth *= 1 - len(on_break[name]) / len(MINUTE_COLUMNS)
+        return worth
+
+    on_break = {name: break_minutes(s) for name, s in staff_by_name.items()}
+    volunteers = {name for name, s in staff_by_name.items()
+                  if s.get("role") == "Volunteer"}
+    problem = AssignmentProblem(
+        ASSIGNMENT_HOUR_KEYS, tasks, on_shift, allowed, value,
+        rotating=[t for t in ("SM", "R") if t in mandatory], varied=volunteers,
+        history=volunteer_task_history, repeat_penalty=VOLUNTEER_REPEAT_PENALTY)
+    # Start from the greedy day so the search can only improve on it.
+    greedy_pivot = {name: {} for name in pivot_schedule}
+    greedy_assign_hours(greedy_pivot, on_shift_by_hour,
+                        copy.deepcopy(volunteer_task_history), rng, template)
+    initial = {hour: {} for hour in ASSIGNMENT_HOUR_KEYS}
+    for name, slots in greedy_pivot.items():
+        for hour, task in slots.items():
+            initial[hour][task] = name
+    if time_limit is None:
+        time_limit = SCHEDULER_TIME_LIMIT
+    assignment, solve_stats = problem.solve(
+        rng, restarts=SCHEDULER_RESTARTS if restarts is None else restarts, initial=initial,
+        time_limit=time_limit if time_limit > 0 else None)
+    if stats is not None:
+        stats.update(solve_stats)
+
+    r_assigned_staff = set()
+    for hour in ASSIGNMENT_HOUR_KEYS:
+        for task, name in assignment[hour].items():
+            pivot_schedule[name][hour] = task
+            if task == "R":
+                r_assigned_staff.add(name)
+            if name in volunteers:
+                volunteer_task_history.setdefault(name, set()).add(task)
+    return r_assigned_staff
+
+
+ASSIGNMENT_ENGINES = {"greedy": greedy_assign_hours,
+                      "optimal": optimal_assign_hours}
+
+
+# Bonus on top of MANDATORY_TASK_VALUE in refill_mandatory_tasks, by what the
+# person held that hour before: keeping a task beats every move, and taking
+# someone free beats taking them off an optional, then a mandatory, task.
+REFILL_KEEP_BONUS = {"same": 3.0, "free": 2.0, "optional": 1.0, "mandatory": 0.0}
+# Searches refill_mandatory_tasks runs; the day is small, so a few suffice.
+REFILL_RESTARTS = 4
+
+
+def refill_mandatory_tasks(pivot_schedule, hours, on_shift_by_hour, rng, template=DEFAULT_TEMPLATE):
+    """Re-covers the mandatory tasks of `hours` after the roster changed.
+
+    Solved across those hours at once with assignment_engine, over each
+    hour's Scale 3 staff, so a free task can take someone off an optional
+    task, or off another mandatory task that someone else then covers, and
+    SM and R can move between hours to keep rotating. Current holders stay
+    put where they can, and nobody gets SM or R they already have in an
+    hour that is not being refilled. Writes into pivot_schedule; people
+    moved off an optional task lose it.
+    """
+    from assignment_engine import AssignmentProblem
+
+    tasks = list(template.mandatory_tasks)
+    held = {hour: {name: slots[hour] for name, slots in pivot_schedule.items() if hour in slots}
+            for hour in hours}
+    fixed = {task: {name for name, slots in pivot_schedule.items()
+                    for hour, t in slots.items() if t == task and hour not in hours}
+             for task in ("SM", "R")}
+    on_shift = {hour: [s["name"] for s in on_shift_by_hour[hour] if s.get("role") == "Scale 3"]
+                for hour in hours}
+
+    def value(name, hour, task):
+        if name in fixed.get(task, ()):
+            return 0.0
+        before = held[hour].get(name)
+        if before == task:
+            kind = "same"
+        elif before is None:
+            kind = "free"
+        else:
+            kind = "mandatory" if before in template.mandatory_tasks else "optional"
+        return MANDATORY_TASK_VALUE + REFILL_KEEP_BONUS[kind]
+
+    names = {name for staff in on_shift.values() for name in staff}
+    problem = AssignmentProblem(hours, tasks, on_shift, {name: set(tasks) for name in names},
+                                value, rotating=[t for t in ("SM", "R") if t in tasks])
+    initial = {hour: {task: name for name, task in held[hour].items()
+                      if task in template.mandatory_tasks and name in on_shift[hour]
+                      and value(name, hour, task) > 0}
+               for hour in hours}
+    assignment, _ = problem.solve(rng, restarts=REFILL_RESTARTS, initial=initial)
+    for hour in hours:
+        for name, slots in pivot_schedule.items():
+            if slots.get(hour) in template.mandatory_tasks:
+                del slots[hour]
+        for task, name in assignment[hour].items():
+            pivot_schedule[name][hour] = task
+
+
+def incremental_assign_hours(pivot_schedule, on_shift_by_hour, volunteer_task_history, rng,
+                             template=DEFAULT_TEMPLATE, previous=None, rescheduled_hours=(),
+                             stats=None):
+    """Keeps a previous day's assignments and refills only `rescheduled_hours`.
+
+    `previous` is {name: {hour: task}} (see parse_previous_grid). Each task is
+    kept while its holder is still on shift that hour. Across the hours
+    named in `rescheduled_hours`, refill_mandatory_tasks then covers the
+    mandatory tasks with as few moves as it can, and greedy_fill_hour hands
+    each hour's optional tasks out again, leaving people on the one they
+    had. Bind the extra arguments with functools.partial to use it as a
+    generate_schedule_data engine. Returns the names given R; `stats` is
+    left as it is.
+    """
+    on_shift_names = {hour: {s["name"] for s in staff}
+                      for hour, staff in on_shift_by_hour.items()}
+    for name, slots in (previous or {}).items():
+        if name not in pivot_schedule:
+            continue
+        for hour, task in slots.items():
+            if name in on_shift_names.get(hour, ()):
+                pivot_schedule[name][hour] = task
+
+    hours = [hour for hour in ASSIGNMENT_HOUR_KEYS if hour in rescheduled_hours]
+    if hours:
+        refill_mandatory_tasks(pivot_schedule, hours, on_shift_by_hour, rng, template)
+    sm_assigned_staff = set()
+    r_assigned_staff = set()
+    for name, slots in pivot_schedule.items():
+        for task in slots.values():
             if task == "SM":
-                candidates = [s for s in scale3_staff if s["name"]
-                              not in sm_assigned_staff]
-                if not candidates:
-                    continue
-                staff_to_assign = candidates[0]
-                name = staff_to_assign["name"]
                 sm_assigned_staff.add(name)
-                if staff_to_assign in scale3_staff:
-                    scale3_staff.remove(staff_to_assign)
-                tasks_taken_in_hour.add(task)
             elif task == "R":
-                candidates = [s for s in scale3_staff if s["name"]
-                              not in r_assigned_staff]
-                if not candidates:
-                    continue
-                staff_to_assign = candidates[0]
-                name = staff_to_assign["name"]
                 r_assigned_staff.add(name)
-                if staff_to_assign in scale3_staff:
-                    scale3_staff.remove(staff_to_assign)
-                tasks_taken_in_hour.add(task)
-            else:
-                if not scale3_staff:
-                    continue
-                staff_to_assign = scale3_staff.pop(0)
-                name = staff_to_assign["name"]
-                tasks_taken_in_hour.add(task)
 
-            pivot_schedule[name][time_str] = task
-            tasks_assigned_in_hour.append(name)
+    for time_str in hours:
+        taken, keep = {}, {}
+        for name, slots in pivot_schedule.items():
+            task = slots.get(time_str)
+            if task in template.mandatory_tasks:
+                taken[task] = name
+            elif task is not None:
+                keep[task] = name
+                del slots[time_str]
+        greedy_fill_hour(pivot_schedule, time_str, on_shift_by_hour[time_str], taken,
+                         sm_assigned_staff, r_assigned_staff, volunteer_task_history, rng,
+                         template, keep)
+    return r_assigned_staff
+
+
+def generate_schedule_data(staff_data, date_str, volunteer_task_history=None, rng=None, engine=None,
+                           template=None):
+    """Builds the grid for one day.
+
+    Pass the same volunteer_task_history dict across calls to keep volunteers
+    rotating through tasks over several days. Every random choice is drawn
+    from `rng` (a random.Random); pass a seeded one for a reproducible grid.
+    `engine` names an ASSIGNMENT_ENGINES entry (default SCHEDULER_ENGINE)
+    or is an engine function itself. `template` is a compiled
+    TimesheetTemplate (default DEFAULT_TEMPLATE); the grid keeps it for the
+    renderers. The grid's `truncated` is set when the engine hit its time
+    limit, in which case the seed does not reproduce it.
+    """
+    from shift_coverage import ShiftCoverage
+    if rng is None:
+        rng = random.Random()
+    if template is None:
+        template = DEFAULT_TEMPLATE
+    role_priority = template.role_priority
+    coverage = ShiftCoverage(staff_data)
+    with metrics.stage("tea"):
+        auto_assign_tea_slots(staff_data, rng, coverage)
+
+    minutes_on_break = {id(s): break_minutes(s) for s in staff_data}
+    scale3_tea_minutes = set()
+    for s in staff_data:
+        if s.get("role") == "Scale 3":
+            scale3_tea_minutes |= minutes_on_break[id(s)]
+
+    def sort_key(s):
+        availability_priority = 1 if s.get(
+            "status", "Available") == "Available" else 2
+        role_p = role_priority.get(s.get("role", ""), 99)
+        return (availability_priority, role_p, s.get("name", ""))
+
+    # Sort by index (stable, like list.sort) so the coverage rows can follow.
+    order = sorted(range(len(staff_data)), key=lambda i: sort_key(staff_data[i]))
+    staff_data[:] = [staff_data[i] for i in order]
+    coverage = coverage.reordered(order)
+    pivot_schedule = {s["name"]: {} for s in staff_data if "name" in s}
+    staff_by_role, on_shift_by_hour = build_staff_index(
+        staff_data, ASSIGNMENT_HOUR_KEYS, coverage)
+
+    duty_managers_at_one = {
+        s["name"] for s in on_shift_by_hour["13:00"] if s.get("role") == "Duty Manager"}
 
-        remaining_staff = [
-            s for s in available_staff_for_hour if s["name"] not in tasks_assigned_in_hour]
-        random_tasks = [t for t in TASK_CONFIG if TASK_CONFIG[t]["mandatory"]
-                        == 0 and t not in ["Set Up", "T", "C", "C+", "R", "SM"]]
+    if volunteer_task_history is None:
+        volunteer_task_history = {}
 
-        for staff in remaining_staff:
+    for staff in staff_by_role.get("Duty Manager", []):
+        if coverage.covers(staff, 11.5):
+            pivot_schedule[staff.get("name", "")][SETUP_SLOT_KEY] = "Set Up"
+
+    if callable(engine):
+        assign_hours = engine
+    else:
+        assign_hours = ASSIGNMENT_ENGINES[engine or SCHEDULER_ENGINE]
+    engine_stats = {}
+    with metrics.stage("assign"):
+        r_assigned_staff = assign_hours(
+            pivot_schedule, on_shift_by_hour, volunteer_task_history, rng, template=template,
+            stats=engine_stats)
+
+    display_time_headers = DISPLAY_TIME_HEADERS
+    internal_to_display_map = INTERNAL_TO_DISPLAY_MAP
+
+    with metrics.stage("rows"):
+        pivot_rows = []
+        task_code_map = template.task_code_map
+        minute_task_taken = {"00": set(), "15": set(), "30": set(), "45": set()}
+
+        for staff in staff_data:
+            name = staff.get("name", "")
             role = staff.get("role", "")
+            base_task_code = pivot_schedule.get(name, {}).get("13:00", "")
+            if not base_task_code:
+                continue
+            on_break = minutes_on_break[id(staff)]
+            for minute in MINUTE_COLUMNS:
+                if minute in on_break:
+                    continue
+                display_task = task_code_map.get(base_task_code, base_task_code)
+                if role == "Duty Manager" and base_task_code not in ["Set Up", "T"]:
+                    continue
+                minute_task_taken[minute].add(display_task)
+
+        for staff in staff_data:
             name = staff.get("name", "")
-            assignable_tasks = [
-                t for t in random_tasks if role in TASK_CONFIG[t]["roles"] and t not in tasks_taken_in_hour]
+            role = staff.get("role", "")
+            shift_label = build_shift_label(staff)
+            row = {"Staff Name": name, "Shift": shift_label}
+            for header in display_time_headers:
+                row[header] = ""
+            row["Comments"] = ""
+
+            status = staff.get("status", "Available")
+            status_detail = staff.get("status_detail", "")
+
+            if status != "Available":
+                if status == "Annual Leave":
+                    for header in display_time_headers:
+                        row[header] = "A/L"
+                    row["Comments"] = "A/L"
+            else:
+                for internal_key, display_key in internal_to_display_map.items():
+                    if internal_key == "11:30":
+                        task_code = pivot_schedule.get(
+                            name, {}).get(internal_key, "")
+                        if task_code:
+                            display_task = task_code_map.get(task_code, task_code)
+                            row["11.30-12"] = display_task
+                        continue
 
-            if role == "Volunteer":
-                used = volunteer_task_history.get(name, set())
-                unused_variants = [
-                    t for t in assignable_tasks if t not in used]
-                if unused_variants:
-                    assignable_tasks = unused_variants
-
-            if assignable_tasks:
-                assigned_task = random.choice(assignable_tasks)
-                pivot_schedule[name][time_str] = assigned_task
-                tasks_assigned_in_hour.append(name)
-                tasks_taken_in_hour.add(assigned_task)
-                if role == "Volunteer":
-                    volunteer_task_history.setdefault(
-                        name, set()).add(assigned_task)
-
-    display_time_headers = ["11.30-12", "12-1",
-                            "00", "15", "30", "45", "2-3", "3-4"]
-    internal_to_display_map = {
-        "11:30": "11.30-12", "12:00": "12-1", "13:00": "1-2", "14:00": "2-3", "15:00": "3-4"
-    }
-
-    pivot_df_data = []
-    task_code_map = {k: v["full_name"] for k, v in TASK_CONFIG.items()}
-    minute_task_taken = {"00": set(), "15": set(), "30": set(), "45": set()}
-
-    for staff in staff_data:
-        name = staff.get("name", "")
-        role = staff.get("role", "")
-        base_task_code = pivot_schedule.get(name, {}).get("13:00", "")
-        if not base_task_code:
-            continue
-        tea_slot = staff.get("tea_slot")
-        for minute in ["00", "15", "30", "45"]:
-            if isinstance(tea_slot, str) and tea_slot == f"13:{minute}":
-                continue
-            display_task = task_code_map.get(base_task_code, base_task_code)
-            if role == "Duty Manager" and base_task_code not in ["Set Up", "T"]:
-                continue
-            minute_task_taken[minute].add(display_task)
+                    if internal_key == "13:00":
+                        base_task_code = pivot_schedule.get(
+                            name, {}).get(internal_key, "")
+                        on_break = minutes_on_break[id(staff)]
+                        is_dm_at_one = role == "Duty Manager" and name in duty_managers_at_one
+
+                        for minute, col_name in [("00", "00"), ("15", "15"), ("30", "30"), ("45", "45")]:
+                            if minute in on_break:
+                                row[col_name] = task_code_map["T"]
+                            else:
+                                if base_task_code:
+                                    display_task = task_code_map.get(
+                                        base_task_code, base_task_code)
+                                    if not (role == "Duty Manager" and base_task_code not in ["Set Up", "T"]):
+                                        row[col_name] = display_task
+                                        minute_task_taken[minute].add(display_task)
+
+                            if is_dm_at_one and minute in scale3_tea_minutes:
+                                if row[col_name] == task_code_map["T"]:
+                                    continue
+                                for cover_task in ["R", "C"]:
+                                    display_cover_task = task_code_map.get(
+                                        cover_task, cover_task)
+                                    if display_cover_task in minute_task_taken[minute]:
+                                        continue
+                                    if cover_task == "R" and name in r_assigned_staff:
+                                        continue
+                                    row[col_name] = display_cover_task
+                                    minute_task_taken[minute].add(
+                                        display_cover_task)
+                                    if cover_task == "R":
+                                        r_assigned_staff.add(name)
+                                    break
+                        continue
 
-    for staff in staff_data:
-        name = staff.get("name", "")
-        role = staff.get("role", "")
-        shift_label = build_shift_label(staff)
-        row = {"Staff Name": name, "Shift": shift_label}
-        for header in display_time_headers:
-            row[header] = ""
-        row["Comments"] = ""
-
-        status = staff.get("status", "Available")
-        status_detail = staff.get("status_detail", "")
-
-        if status != "Available":
-            if status == "Annual Leave":
-                for header in display_time_headers:
-                    row[header] = "A/L"
-                row["Comments"] = "A/L"
-        else:
-            for internal_key, display_key in internal_to_display_map.items():
-                if internal_key == "11:30":
-                    task_code = pivot_schedule.get(
-                        name, {}).get(internal_key, "")
+                    task_code = pivot_schedule.get(name, {}).get(internal_key, "")
                     if task_code:
                         display_task = task_code_map.get(task_code, task_code)
-                        row["11.30-12"] = display_task
-                    continue
+                        if role == "Duty Manager" and task_code not in ["Set Up", "T"]:
+                            continue
+                        if internal_key == "12:00":
+                            row["12-1"] = display_task
+                        elif internal_key == "14:00":
+                            row["2-3"] = display_task
+                        elif internal_key == "15:00":
+                            row["3-4"] = display_task
 
-                if internal_key == "13:00":
-                    base_task_code = pivot_schedule.get(
-                        name, {}).get(internal_key, "")
-                    tea_slot = staff.get("tea_slot")
-                    dm_idx = None
-                    if role == "Duty Manager" and name in duty_managers_at_one:
-                        dm_idx = duty_managers_at_one.index(name)
-
-                    for minute, col_name in [("00", "00"), ("15", "15"), ("30", "30"), ("45", "45")]:
-                        if isinstance(tea_slot, str) and tea_slot == f"13:{minute}":
-                            row[col_name] = task_code_map["T"]
-                        else:
-                            if base_task_code:
-                                display_task = task_code_map.get(
-                                    base_task_code, base_task_code)
-                                if not (role == "Duty Manager" and base_task_code not in ["Set Up", "T"]):
-                                    row[col_name] = display_task
-                                    minute_task_taken[minute].add(display_task)
-
-                        if role == "Duty Manager" and minute in scale3_tea_minutes and dm_idx is not None:
-                            if row[col_name] == task_code_map["T"]:
-                                continue
-                            for cover_task in ["R", "C"]:
-                                display_cover_task = task_code_map.get(
-                                    cover_task, cover_task)
-                                if display_cover_task in minute_task_taken[minute]:
-                                    continue
-                                if cover_task == "R" and name in r_assigned_staff:
-                                    continue
-                                row[col_name] = display_cover_task
-                                minute_task_taken[minute].add(
-                                    display_cover_task)
-                                if cover_task == "R":
-                                    r_assigned_staff.add(name)
-                                break
-                    continue
+            if role == "Volunteer" and not row["Comments"]:
+                row["Comments"] = role
+            if status == "Available":
+                notes = break_notes(staff)
+                if notes:
+                    row["Comments"] = "; ".join(([row["Comments"]] if row["Comments"] else []) + notes)
+
+            pivot_rows.append([row[col] for col in FINAL_COLUMN_NAMES])
+
+    return ScheduleGrid(pivot_rows, coverage, template,
+                        truncated=engine_stats.get("truncated", False))
+
+
+def add_template_header_rows(worksheet, date_obj, duty_manager_names, template=DEFAULT_TEMPLATE):
+    styles = get_styles()
+    thin_border = styles.thin_border
+
+    for letter, width in template.column_widths.items():
+        worksheet.column_dimensions[letter].width = width
 
-                task_code = pivot_schedule.get(name, {}).get(internal_key, "")
-                if task_code:
-                    display_task = task_code_map.get(task_code, task_code)
-                    if role == "Duty Manager" and task_code not in ["Set Up", "T"]:
-                        continue
-                    if internal_key == "12:00":
-                        row["12-1"] = display_task
-                    elif internal_key == "14:00":
-                        row["2-3"] = display_task
-                    elif internal_key == "15:00":
-                        row["3-4"] = display_task
-
-        if role == "Volunteer" and not row["Comments"]:
-            row["Comments"] = role
-
-        pivot_df_data.append(row)
-
-    df = pd.DataFrame(pivot_df_data)
-    final_columns_names = ["Staff Name", "Shift", "11.30-12",
-                           "12-1", "00", "15", "30", "45", "2-3", "3-4", "Comments"]
-    df = df[final_columns_names]
-    return df
-
-
-def add_template_header_rows(worksheet, date_obj, duty_manager_names):
-    thin_border = Border(left=Side(style="thin"), right=Side(
-        style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
-
-    worksheet.column_dimensions["A"].width = 24
-    worksheet.column_dimensions["B"].width = 10
-    worksheet.column_dimensions["C"].width = 10
-    worksheet.column_dimensions["D"].width = 10
-    for col in ["E", "F", "G", "H"]:
-        worksheet.column_dimensions[col].width = 3.2
-    worksheet.column_dimensions["I"].width = 10
-    worksheet.column_dimensions["J"].width = 10
-    worksheet.column_dimensions["K"].width = 31.5
-
-    SIZE = 10
     worksheet.merge_cells("A1:K1")
     cell = worksheet["A1"]
-    cell.value = "Canada Water Library Sunday week 3"
-    cell.font = Font(name="Arial", bold=True)
+    cell.value = template.title
+    cell.font = styles.arial_bold
 
     worksheet.merge_cells("A2:K2")
-    worksheet["A2"].font = Font(name="Arial")
+    worksheet["A2"].font = styles.arial
 
     worksheet.merge_cells("B3:C3")
     short_date = date_obj.strftime("%d/%m/%y")
     worksheet["A3"] = short_date
-    worksheet["A3"].font = Font(name="Arial", size=SIZE)
+    worksheet["A3"].font = styles.header
     worksheet["B3"] = ""
 
     worksheet.merge_cells("D3:H3")
     worksheet["D3"] = "Duty Manager(s)"
-    worksheet["D3"].font = Font(name="Arial", bold=True, size=SIZE)
+    worksheet["D3"].font = styles.header_bold
 
     worksheet.merge_cells("I3:K3")
     worksheet["I3"] = duty_manager_names
-    worksheet["I3"].font = Font(name="Arial", bold=True, size=SIZE)
-    worksheet["I3"].alignment = Alignment(
-        horizontal="center", vertical="center")
+    worksheet["I3"].font = styles.header_bold
+    worksheet["I3"].alignment = styles.center
 
     headers_row4 = [("A4", "Name"), ("B4", "Shift"), ("C4", "11.30-12"),
                     ("D4", "12-1"), ("I4", "2-3"), ("J4", "3-4"), ("K4", "Comments")]
     for cell_ref, text in headers_row4:
         c = worksheet[cell_ref]
         c.value = text
-        c.font = Font(name="Arial", bold=True, size=SIZE)
-        c.alignment = Alignment(horizontal="center", vertical="center")
+        c.font = styles.header_bold
+        c.alignment = styles.center
 
     worksheet.merge_cells("E4:H4")
     worksheet["E4"] = "1-2"
-    worksheet["E4"].font = Font(name="Arial", bold=True, size=SIZE)
-    worksheet["E4"].alignment = Alignment(
-        horizontal="center", vertical="center")
+    worksheet["E4"].font = styles.header_bold
+    worksheet["E4"].alignment = styles.center
 
     sub_headers = [("E5", "00"), ("F5", "15"), ("G5", "30"), ("H5", "45")]
     for cell_ref, text in sub_headers:
         cell = worksheet[cell_ref]
         cell.value = text
-        cell.font = Font(name="Arial", bold=True, size=SIZE)
+        cell.font = styles.header_bold
         cell.border = thin_border
-        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cell.alignment = styles.center
 
-    alignment_center = Alignment(horizontal="center", vertical="center")
+    alignment_center = styles.center
     for col_letter in ["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K"]:
         cell = worksheet[f"{col_letter}4"]
         cell.alignment = alignment_center
 
 
-def apply_excel_styling(writer, df, staff_data):
-    workbook = writer.book
-    worksheet = writer.sheets['Timesheet']
+def time_column_coverage(grid, staff_data):
+    """Per-person booleans over DISPLAY_TIME_HEADERS for the styling passes.
+
+    Returns (on_shift, status_span), both keyed by id() of the roster dict:
+    on_shift drives the blackout fill, status_span the Sick/status merge.
+    Reuses the scheduler's coverage when it was built from these dicts.
+    """
+    from shift_coverage import ShiftCoverage, SHADING_DEFAULTS, STATUS_SPAN_DEFAULTS
+    coverage = grid.coverage
+    if coverage is None or not all(coverage.has(s) for s in staff_data):
+        coverage = ShiftCoverage(staff_data)
+    hours = [TIME_COLUMN_HOURS[col] for col in DISPLAY_TIME_HEADERS]
+    on_shift = coverage.columns(hours, SHADING_DEFAULTS).tolist()
+    status_span = coverage.columns(hours, STATUS_SPAN_DEFAULTS).tolist()
+    keys = [id(s) for s in coverage.staff]
+    return dict(zip(keys, on_shift)), dict(zip(keys, status_span))
+
+
+def apply_excel_styling(worksheet, grid, staff_data):
+    styles = get_styles()
+    workbook = worksheet.parent
 
     for row in worksheet.iter_rows():
         for cell in row:
-            cell.font = Font(name="Arial")
+            cell.font = styles.arial
 
-    sm_display_name = TASK_CONFIG["SM"]["full_name"]
+    task_code_map = grid.template.task_code_map
+    sm_display_name = task_code_map["SM"]
     staff_by_name = {s["name"]: s for s in staff_data if "name" in s}
+    on_shift_by_staff, status_span_by_staff = time_column_coverage(
+        grid, staff_data)
 
-    time_columns = {"11.30-12": 11.5, "12-1": 12, "00": 13,
-                    "15": 13, "30": 13, "45": 13, "2-3": 14, "3-4": 15}
-    time_col_order = ["11.30-12", "12-1", "00", "15", "30", "45", "2-3", "3-4"]
-    col_indices = {col: idx for idx, col in enumerate(df.columns)}
+    time_col_order = DISPLAY_TIME_HEADERS
+    col_indices = {col: idx for idx, col in enumerate(grid.columns)}
     first_time_col_idx = col_indices["11.30-12"]
     comments_col_idx = col_indices["Comments"]
 
-    for r_idx, row in df.iterrows():
+    for r_idx, row in enumerate(grid.rows):
         excel_row = DATA_START_ROW_EXCEL + r_idx
         name_cell = worksheet.cell(row=excel_row, column=1)
-        name_cell.font = Font(name="Arial", bold=True)
+        name_cell.font = styles.arial_bold
 
         for c_idx in range(first_time_col_idx, comments_col_idx + 1):
-            cell_value = row.iloc[c_idx]
+            cell_value = row[c_idx]
             excel_col = c_idx + 1
             cell = worksheet.cell(row=excel_row, column=excel_col)
             if cell_value:
-                cell.font = Font(name="Arial", bold=True)
+                cell.font = styles.arial_bold
             if cell_value == sm_display_name:
-                cell.fill = GREEN_FILL
-            if cell_value == TASK_CONFIG["T"]["full_name"]:
-                cell.fill = TEA_FILL
+                cell.fill = styles.green_fill
+            if cell_value == task_code_map["T"]:
+                cell.fill = styles.tea_fill
 
-    for r_idx, row in df.iterrows():
-        name = row["Staff Name"]
+    for r_idx, row in enumerate(grid.rows):
+        name = row[0]
         staff_info = staff_by_name.get(name)
         if not staff_info:
             continue
-        start_hour = staff_info.get("start_hour", 0)
-        end_hour = staff_info.get("end_hour", 24)
         excel_row = DATA_START_ROW_EXCEL + r_idx
-        for col_name, hour_value in time_columns.items():
+        for col_name, on_shift in zip(time_col_order, on_shift_by_staff[id(staff_info)]):
             c_idx = col_indices[col_name]
             cell = worksheet.cell(row=excel_row, column=c_idx + 1)
-            if hour_value < start_hour or hour_value >= end_hour:
-                cell.fill = BLACKOUT_FILL
+            if not on_shift:
+                cell.fill = styles.blackout_fill
 
-    for r_idx, row in df.iterrows():
-        name = row["Staff Name"]
+    for r_idx, row in enumerate(grid.rows):
+        name = row[0]
         staff_info = staff_by_name.get(name)
         if not staff_info:
             continue
@@ -705,14 +1678,9 @@ def apply_excel_styling(writer, df, staff_data):
 
         if not is_special:
             continue
-        start_hour = staff_info.get("start_hour", 12)
-        end_hour = staff_info.get("end_hour", 16)
         excel_row = DATA_START_ROW_EXCEL + r_idx
-        cols_to_merge = []
-        for col_name in time_col_order:
-            hour_value = time_columns[col_name]
-            if start_hour <= hour_value < end_hour:
-                cols_to_merge.append(col_name)
+        cols_to_merge = [col_name for col_name, in_span in zip(
+            time_col_order, status_span_by_staff[id(staff_info)]) if in_span]
         if not cols_to_merge:
             continue
         first_col_name = cols_to_merge[0]
@@ -721,21 +1689,16 @@ def apply_excel_styling(writer, df, staff_data):
         last_col_idx = col_indices[last_col_name] + 1
         worksheet.merge_cells(start_row=excel_row, start_column=first_col_idx,
                               end_row=excel_row, end_column=last_col_idx)
-        rand_color = "{:02X}{:02X}{:02X}".format(random.randint(
-            80, 240), random.randint(80, 240), random.randint(80, 240))
-        fill = PatternFill(start_color=rand_color,
-                           end_color=rand_color, fill_type="solid")
         merged_cell = worksheet.cell(row=excel_row, column=first_col_idx)
         merged_cell.value = label
-        merged_cell.fill = fill
-        merged_cell.font = Font(name="Arial", bold=True)
-        merged_cell.alignment = Alignment(
-            horizontal="center", vertical="center")
+        merged_cell.fill = person_fill(name)
+        merged_cell.font = styles.arial_bold
+        merged_cell.alignment = styles.center
 
-    tea_display = TASK_CONFIG["T"]["full_name"]
+    tea_display = task_code_map["T"]
     sub_slot_cols = ["00", "15", "30", "45"]
-    for r_idx, row in df.iterrows():
-        name = row["Staff Name"]
+    for r_idx, row in enumerate(grid.rows):
+        name = row[0]
         staff_info = staff_by_name.get(name)
         if not staff_info:
             continue
@@ -744,7 +1707,7 @@ def apply_excel_styling(writer, df, staff_data):
         if staff_info.get("role") == "Duty Manager":
             continue
         excel_row = DATA_START_ROW_EXCEL + r_idx
-        slot_values = [row[col] for col in sub_slot_cols]
+        slot_values = [row[col_indices[col]] for col in sub_slot_cols]
         slot_cols = [col_indices[col] + 1 for col in sub_slot_cols]
         i = 0
         while i < len(slot_values):
@@ -764,38 +1727,33 @@ def apply_excel_styling(writer, df, staff_data):
             else:
                 target_cell = worksheet.cell(
                     row=excel_row, column=slot_cols[i])
-            target_cell.alignment = Alignment(
-                horizontal="center", vertical="center")
+            target_cell.alignment = styles.center
             i = j
 
-    for r_idx, row in df.iterrows():
-        name = row["Staff Name"]
+    for r_idx, row in enumerate(grid.rows):
+        name = row[0]
         staff_info = staff_by_name.get(name)
         if not staff_info or staff_info.get("role") != "Volunteer":
             continue
-        rand_color = "{:02X}{:02X}{:02X}".format(random.randint(
-            80, 240), random.randint(80, 240), random.randint(80, 240))
-        fill = PatternFill(start_color=rand_color,
-                           end_color=rand_color, fill_type="solid")
+        fill = person_fill(name)
         excel_row = DATA_START_ROW_EXCEL + r_idx
         for col_name in time_col_order:
-            val = row[col_name]
+            val = row[col_indices[col_name]]
             if not val or val == tea_display:
                 continue
             excel_col = col_indices[col_name] + 1
             cell = worksheet.cell(row=excel_row, column=excel_col)
             cell.fill = fill
 
-    thin_border = Border(left=Side(style="thin"), right=Side(
-        style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
-    max_row = DATA_START_ROW_EXCEL + len(df) - 1
+    thin_border = styles.thin_border
+    max_row = DATA_START_ROW_EXCEL + len(grid) - 1
     for r in range(1, max_row + 1):
-        for c in range(1, len(df.columns) + 1):
+        for c in range(1, len(grid.columns) + 1):
             cell = worksheet.cell(row=r, column=c)
             cell.border = thin_border
 
-    alignment_center = Alignment(horizontal="center", vertical="center")
-    for r_idx in range(DATA_START_ROW_EXCEL, DATA_START_ROW_EXCEL + len(df)):
+    alignment_center = styles.center
+    for r_idx in range(DATA_START_ROW_EXCEL, DATA_START_ROW_EXCEL + len(grid)):
         for col_letter in ["D", "E", "F", "G", "H", "I", "J"]:
             cell = worksheet[f"{col_letter}{r_idx}"]
             cell.alignment = alignment_center
@@ -803,6 +1761,186 @@ def apply_excel_styling(writer, df, staff_data):
     return workbook
 
 
+HEADER_MERGES = ["A1:K1", "A2:K2", "B3:C3", "D3:H3", "I3:K3", "E4:H4"]
+SUB_SLOT_COL_IDX = [4, 5, 6, 7]  # the 00/15/30/45 columns, zero-based
+
+
+class _CellSpec:
+    """Final state of one cell, worked out before the row is written."""
+    __slots__ = ("value", "font", "fill", "alignment", "merged")
+
+    def __init__(self, value=None):
+        self.value = value
+        self.font = get_styles().arial
+        self.fill = None
+        self.alignment = None
+        self.merged = False
+
+    def merge_into_range(self):
+        # A covered cell of a merged range keeps no value and default styling.
+        self.value = None
+        self.font = None
+        self.fill = None
+        self.alignment = None
+        self.merged = True
+
+
+def _header_specs(date_obj, duty_manager_names, template=DEFAULT_TEMPLATE):
+    styles = get_styles()
+    rows = [[_CellSpec() for _ in range(11)] for _ in range(5)]
+    values = {(1, 1): template.title,
+              (3, 1): date_obj.strftime("%d/%m/%y"), (3, 2): "",
+              (3, 4): "Duty Manager(s)", (3, 9): duty_manager_names,
+              (4, 1): "Name", (4, 2): "Shift", (4, 3): "11.30-12", (4, 4): "12-1",
+              (4, 5): "1-2", (4, 9): "2-3", (4, 10): "3-4", (4, 11): "Comments",
+              (5, 5): "00", (5, 6): "15", (5, 7): "30", (5, 8): "45"}
+    for (r, c), value in values.items():
+        rows[r - 1][c - 1].value = value
+    centered = [(3, 9)] + [(4, c) for c in range(1, 12)] + [(5, c) for c in range(5, 9)]
+    for r, c in centered:
+        rows[r - 1][c - 1].alignment = styles.center
+    return rows
+
+
+def _special_status_label(staff_info):
+    status = staff_info.get("status", "Available")
+    status_detail = staff_info.get("status_detail", "")
+    if status == "Sick":
+        return "SICK"
+    if status not in ["Available", "Annual Leave"] and status_detail:
+        return status_detail
+    return None
+
+
+def _data_row_specs(values, staff_info, merges, excel_row, on_shift=None, status_span=None,
+                    template=DEFAULT_TEMPLATE):
+    """Applies the apply_excel_styling passes to one row, in the same order.
+
+    on_shift and status_span are the row's time_column_coverage entries.
+    """
+    styles = get_styles()
+    sm_display_name = template.task_code_map["SM"]
+    tea_display = template.task_code_map["T"]
+    cells = [_CellSpec(v) for v in values]
+    cells[0].font = styles.arial_bold
+    for idx in range(2, 11):
+        v = values[idx]
+        if v:
+            cells[idx].font = styles.arial_bold
+        if v == sm_display_name:
+            cells[idx].fill = styles.green_fill
+        if v == tea_display:
+            cells[idx].fill = styles.tea_fill
+    if not staff_info:
+        return cells
+
+    time_cols = [(idx + 2, TIME_COLUMN_HOURS[col])
+                 for idx, col in enumerate(DISPLAY_TIME_HEADERS)]
+    for (idx, _), covered in zip(time_cols, on_shift):
+        if not covered:
+            cells[idx].fill = styles.blackout_fill
+
+    label = _special_status_label(staff_info)
+    if label is not None:
+        span = [idx for (idx, _), in_span in zip(time_cols, status_span) if in_span]
+        if span:
+            first, last = span[0], span[-1]
+            for idx in range(first + 1, last + 1):
+                cells[idx].merge_into_range()
+            merges.append((excel_row, first + 1, last + 1))
+            anchor = cells[first]
+            anchor.value = label
+            anchor.fill = person_fill(values[0])
+            anchor.font = styles.arial_bold
+            anchor.alignment = styles.center
+
+    if staff_info.get("status", "Available") == "Available" and staff_info.get("role") != "Duty Manager":
+        slot_values = [values[idx] for idx in SUB_SLOT_COL_IDX]
+        i = 0
+        while i < len(slot_values):
+            val = slot_values[i]
+            if not val or val == tea_display:
+                i += 1
+                continue
+            j = i + 1
+            while j < len(slot_values) and slot_values[j] == val and slot_values[j] != tea_display:
+                j += 1
+            anchor = cells[SUB_SLOT_COL_IDX[i]]
+            if j - i > 1:
+                for k in range(i + 1, j):
+                    cells[SUB_SLOT_COL_IDX[k]].merge_into_range()
+                merges.append((excel_row, SUB_SLOT_COL_IDX[i] + 1, SUB_SLOT_COL_IDX[j - 1] + 1))
+                anchor.value = val
+            anchor.alignment = styles.center
+            i = j
+
+    if staff_info.get("role") == "Volunteer":
+        volunteer_fill = person_fill(values[0])
+        for idx, _ in time_cols:
+            val = values[idx]
+            if val and val != tea_display:
+                cells[idx].fill = volunteer_fill
+    return cells
+
+
+def _write_only_cell(worksheet, spec, centered):
+    from openpyxl.cell import WriteOnlyCell
+    styles = get_styles()
+    cell = WriteOnlyCell(worksheet, value=spec.value)
+    if spec.font is not None:
+        cell.font = spec.font
+    if spec.fill is not None:
+        cell.fill = spec.fill
+    cell.border = styles.thin_border
+    if centered:
+        cell.alignment = styles.center
+    elif spec.alignment is not None:
+        cell.alignment = spec.alignment
+    return cell
+
+
+def write_streaming_sheet(workbook, grid, staff_data, raw_date, sheet_name='Timesheet'):
+    """Write-only counterpart of render_timesheet_sheet.
+
+    Works out each cell's final value, font, fill, border and merges up
+    front and appends every row exactly once, producing the same cells as
+    add_template_header_rows followed by apply_excel_styling.
+    """
+    duty_managers = [s["name"]
+                     for s in staff_data if s.get("role") == "Duty Manager"]
+    from openpyxl.worksheet.cell_range import CellRange
+    date_obj = parse_date_from_payload(raw_date)
+    worksheet = workbook.create_sheet(sheet_name)
+    template = grid.template
+    for letter, width in template.column_widths.items():
+        worksheet.column_dimensions[letter].width = width
+
+    staff_by_name = {s["name"]: s for s in staff_data if "name" in s}
+    on_shift_by_staff, status_span_by_staff = time_column_coverage(
+        grid, staff_data)
+    rows = grid.rows
+
+    for ref in HEADER_MERGES:
+        worksheet.merged_cells.add(CellRange(ref))
+    for spec_row in _header_specs(date_obj, " & ".join(duty_managers), template):
+        worksheet.append([_write_only_cell(worksheet, spec, False)
+                          for spec in spec_row])
+
+    merges = []
+    for r_idx, values in enumerate(rows):
+        excel_row = DATA_START_ROW_EXCEL + r_idx
+        staff_info = staff_by_name.get(values[0])
+        specs = _data_row_specs(values, staff_info, merges, excel_row,
+                                on_shift_by_staff.get(id(staff_info)),
+                                status_span_by_staff.get(id(staff_info)), template)
+        worksheet.append([_write_only_cell(worksheet, spec, 3 <= idx <= 9)
+                          for idx, spec in enumerate(specs)])
+    for row, first_col, last_col in merges:
+        worksheet.merged_cells.add(CellRange(
+            min_col=first_col, min_row=row, max_col=last_col, max_row=row))
+    return date_obj
+
+
 def parse_date_from_payload(raw_date: str | None) -> datetime:
     if not raw_date:
         return datetime.now()
@@ -814,34 +1952,436 @@ def parse_date_from_payload(raw_date: str | None) -> datetime:
     return datetime.strptime(cleaned, "%Y-%m-%d")
 
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def new_timesheet_workbook():
+    from openpyxl import Workbook
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    return workbook
+
+
+def render_timesheet_sheet(workbook, grid, staff_data, raw_date, sheet_name='Timesheet'):
+    """Renders an already scheduled day into a new `sheet_name` sheet of `workbook`."""
+    duty_managers = [s["name"]
+                     for s in staff_data if s.get("role") == "Duty Manager"]
+    duty_manager_names = " & ".join(duty_managers)
+    date_obj = parse_date_from_payload(raw_date)
+
+    worksheet = workbook.create_sheet(sheet_name)
+    with metrics.stage("cells"):
+        for r_idx, row in enumerate(grid.rows):
+            for c_idx, value in enumerate(row, 1):
+                worksheet.cell(row=DATA_START_ROW_EXCEL + r_idx,
+                               column=c_idx, value=value)
+    with metrics.stage("header"):
+        add_template_header_rows(worksheet, date_obj, duty_manager_names, grid.template)
+    with metrics.stage("styling"):
+        apply_excel_styling(worksheet, grid, staff_data)
+    return date_obj
+
+
+def write_timesheet_sheet(workbook, staff_data, raw_date, sheet_name='Timesheet', volunteer_task_history=None, rng=None, engine=None, template=None):
+    """Schedules one day and renders it into a new `sheet_name` sheet of `workbook`."""
+    grid = generate_schedule_data(
+        staff_data, raw_date, volunteer_task_history, rng, engine, template)
+    return render_timesheet_sheet(workbook, grid, staff_data, raw_date, sheet_name)
+
+
+def render_workbook_bytes(grid, staff_data, raw_date, renderer='openpyxl'):
+    """Renders one scheduled day as a standalone workbook.
+
+    Module-level so it can run inside a RENDER_POOL_SIZE worker process.
+    Returns (filename, xlsx bytes).
+    """
+    from openpyxl import Workbook
+    output = io.BytesIO()
+    if renderer == 'streaming':
+        workbook = Workbook(write_only=True)
+        with metrics.stage("stream"):
+            date_obj = write_streaming_sheet(workbook, grid, staff_data, raw_date)
+    else:
+        workbook = new_timesheet_workbook()
+        date_obj = render_timesheet_sheet(workbook, grid, staff_data, raw_date)
+    with metrics.stage("save"):
+        workbook.save(output)
+    return timesheet_filename(date_obj), output.getvalue()
+
+
+def select_renderer(data):
+    """Picks 'openpyxl' (styled after writing) or 'streaming' (write-only) for a request."""
+    renderer = data.get('renderer') or TIMESHEET_RENDERER
+    if renderer not in ('openpyxl', 'streaming'):
+        raise ValueError("renderer must be 'openpyxl' or 'streaming'.")
+    return renderer
+
+
+def select_engine(data):
+    """Picks the ASSIGNMENT_ENGINES entry for a request."""
+    engine = data.get('engine') or SCHEDULER_ENGINE
+    if engine not in ASSIGNMENT_ENGINES:
+        raise ValueError(
+            f"engine must be one of: {', '.join(sorted(ASSIGNMENT_ENGINES))}.")
+    return engine
+
+
+_file_templates = None
+_file_templates_lock = threading.Lock()
+
+
+def file_templates():
+    """Templates from TIMESHEET_TEMPLATE_DIR, compiled once per process on first use."""
+    global _file_templates
+    if _file_templates is None:
+        with _file_templates_lock:
+            if _file_templates is None:
+                _file_templates = load_template_dir(TIMESHEET_TEMPLATE_DIR, COLUMN_WIDTHS)
+    return _file_templates
+
+
+def load_template_spec(template_id):
+    ph = get_placeholder()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT spec FROM timesheet_templates WHERE id = {ph}", (template_id,))
+        row = c.fetchone()
+        c.close()
+    return json.loads(row[0]) if row else None
+
+
+def get_template(template_id):
+    """The compiled template for `template_id`, or None.
+
+    Looks at the built-in default, then TIMESHEET_TEMPLATE_DIR, then the
+    timesheet_templates table. Database templates are compiled once per
+    revision of that table, so a request only pays for the revision check.
+    """
+    if template_id == DEFAULT_TEMPLATE.id:
+        return DEFAULT_TEMPLATE
+    template = file_templates().get(template_id)
+    if template is not None:
+        return template
+    revision, _ = get_table_revision("timesheet_templates")
+    return template_cache.get(template_id, revision,
+                              lambda: load_template_spec(template_id))
+
+
+def select_template(data):
+    """Picks the compiled template for a request (default TIMESHEET_TEMPLATE)."""
+    template_id = data.get('template') or TIMESHEET_TEMPLATE
+    if not isinstance(template_id, str):
+        raise ValueError("template must be a template id.")
+    template = get_template(template_id)
+    if template is None:
+        raise ValueError(f"Unknown template '{template_id}'.")
+    return template
+
+
+def template_changed():
+    with _revision_cache_lock:
+        _revision_cache.pop("timesheet_templates", None)
+
+
+@app.route('/templates', methods=['GET'])
+def list_templates():
+    """Every template id with its title and where it is defined."""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id FROM timesheet_templates ORDER BY id")
+        stored = [row[0] for row in c.fetchall()]
+        c.close()
+    entries = [(DEFAULT_TEMPLATE.id, "built-in")]
+    entries += [(template_id, "file") for template_id in sorted(file_templates())]
+    entries += [(template_id, "database") for template_id in stored
+                if template_id != DEFAULT_TEMPLATE.id and template_id not in file_templates()]
+    result = []
+    for template_id, source in entries:
+        template = get_template(template_id)
+        if template is not None:
+            result.append({"id": template_id, "title": template.title, "source": source})
+    return jsonify(result)
+
+
+@app.route('/templates/<template_id>', methods=['GET', 'PUT', 'DELETE'])
+def manage_template(template_id):
+    if request.method == 'GET':
+        template = get_template(template_id)
+        if template is None:
+            return jsonify({"error": "Template not found."}), 404
+        return jsonify(template.spec)
+
+    if template_id == DEFAULT_TEMPLATE.id or template_id in file_templates():
+        return jsonify({"error": "This template is defined in code or a template file."}), 409
+
+    ph = get_placeholder()
+    if request.method == 'DELETE':
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute(f"DELETE FROM timesheet_templates WHERE id = {ph}", (template_id,))
+            deleted = c.rowcount
+            if deleted:
+                bump_revision(c, "timesheet_templates")
+            conn.commit()
+            c.close()
+        template_changed()
+        if not deleted:
+            return jsonify({"error": "Template not found."}), 404
+        return jsonify({"message": f"Template {template_id} deleted."})
+
+    spec = request.json
+    if isinstance(spec, dict):
+        spec = dict(spec, id=template_id)
+    try:
+        template = compile_template(spec, COLUMN_WIDTHS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            f"INSERT INTO timesheet_templates (id, spec) VALUES ({ph}, {ph}) "
+            "ON CONFLICT (id) DO UPDATE SET spec = excluded.spec",
+            (template_id, json.dumps(template.spec)))
+        bump_revision(c, "timesheet_templates")
+        conn.commit()
+        c.close()
+    template_changed()
+    return jsonify(template.spec)
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Returns the shared worker pool for batch rendering, or None when it is disabled."""
+    global _render_pool
+    if RENDER_POOL_SIZE < 2:
+        return None
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn keeps DB pool threads and sockets out of the workers.
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=RENDER_POOL_SIZE,
+                    mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+
+def close_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown()
+        _render_pool = None
+
+
+atexit.register(close_render_pool)
+
+
+def render_day_workbooks(days, volunteer_task_history, renderer='openpyxl', rng=None, engine=None,
+                         template=None):
+    """Schedules each day in order, then renders every day to (filename, xlsx bytes).
+
+    Scheduling stays in this process so volunteer history carries from day
+    to day; the CPU-bound openpyxl rendering fans out over the render pool
+    when one is configured.
+    """
+    grids = [generate_schedule_data(staff_data, raw_date, volunteer_task_history, rng,
+                                    engine, template)
+             for raw_date, staff_data in days]
+    return render_grid_workbooks(grids, days, renderer)
+
+
+def render_grid_workbooks(grids, days, renderer='openpyxl'):
+    """Renders already scheduled days to (filename, xlsx bytes), over the render pool if any."""
+    scheduled = [(grid, staff_data, raw_date, renderer)
+                 for grid, (raw_date, staff_data) in zip(grids, days)]
+    pool = get_render_pool()
+    if pool is None or len(scheduled) < 2:
+        return [render_workbook_bytes(*day) for day in scheduled]
+    # Stages inside the pool's processes are not seen here, so time the fan-out whole.
+    with metrics.stage("render_pool"):
+        return list(pool.map(render_workbook_bytes, *zip(*scheduled)))
+
+
+def timesheet_filename(date_obj, extension='xlsx'):
+    formatted_date = date_obj.strftime("%A, %d %B %Y")
+    return f"Timesheet_{formatted_date}.{extension}"
+
+
+# 48 bits, so a seed fits the BIGINT schedules.seed column and survives a
+# round trip through JavaScript numbers.
+SEED_BITS = 48
+
+
+def resolve_schedule_seed(seed, days):
+    """Returns the request's seed, or one derived from its rosters and dates.
+
+    `days` is a list of (raw_date, staff_data); call this before scheduling,
+    which mutates the rosters. Raises ValueError for a seed that is not an
+    integer in [0, 2**SEED_BITS).
+    """
+    if seed is not None:
+        if isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed < 2 ** SEED_BITS:
+            raise ValueError(f"seed must be an integer from 0 to {2 ** SEED_BITS - 1}.")
+        return seed
+    canonical = json.dumps(
+        [[parse_date_from_payload(raw_date).strftime("%Y-%m-%d"), staff_data]
+         for raw_date, staff_data in days],
+        sort_keys=True, separators=(",", ":"), default=str)
+    return int(hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:SEED_BITS // 4], 16)
+
+
+# Bump when a scheduling or rendering change alters the workbook for the same input.
+TIMESHEET_CACHE_VERSION = 4
+
+
+def timesheet_cache_key(staff_data, date_obj, renderer, seed, engine, template=DEFAULT_TEMPLATE):
+    """Hashes everything that decides a rendered timesheet into a cache key.
+
+    Must run before scheduling, which fills in tea slots and reorders
+    `staff_data` in place.
+    """
+    canonical = json.dumps({
+        "version": TIMESHEET_CACHE_VERSION,
+        "roster": staff_data,
+        "date": date_obj.strftime("%Y-%m-%d"),
+        "template": template.fingerprint,
+        "breaks": [period.to_dict() for period in BREAK_PERIODS],
+        "break_preferences": BREAK_PREFERENCES,
+        "seed": seed,
+        "renderer": renderer,
+        "engine": engine,
+        "restarts": SCHEDULER_RESTARTS if engine == "optimal" else None,
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+OUTPUT_FORMAT_MIMETYPES = {'xlsx': XLSX_MIMETYPE,
+                           'json': 'application/json', 'csv': 'text/csv'}
+
+
+def select_output_format(data):
+    """Picks 'xlsx', 'json' or 'csv' from the payload, the query string or Accept."""
+    output_format = data.get('format') or request.args.get('format')
+    if output_format is None:
+        best = request.accept_mimetypes.best_match(
+            [XLSX_MIMETYPE, 'application/json', 'text/csv'], default=XLSX_MIMETYPE)
+        # Browsers send */*, which should still download the workbook. Indexing
+        # accept_mimetypes with '*/*' matches every entry, so read the explicit one.
+        any_quality = max((quality for value, quality in request.accept_mimetypes
+                           if value == '*/*'), default=0)
+        if request.accept_mimetypes.quality(best) > any_quality:
+            output_format = {v: k for k, v in OUTPUT_FORMAT_MIMETYPES.items()}[best]
+        else:
+            output_format = 'xlsx'
+    if output_format not in OUTPUT_FORMAT_MIMETYPES:
+        raise ValueError("format must be 'xlsx', 'json' or 'csv'.")
+    return output_format
+
+
+def set_schedule_seed_header(response, seed, truncated=False):
+    """Sends X-Schedule-Seed, or X-Schedule-Truncated when the seed would not give the result again."""
+    if truncated:
+        response.headers["X-Schedule-Truncated"] = "1"
+    else:
+        response.headers["X-Schedule-Seed"] = str(seed)
+
+
+def schedule_preview_response(grid, raw_date, output_format, seed):
+    """Returns the scheduled grid without rendering a workbook."""
+    date_obj = parse_date_from_payload(raw_date)
+    if output_format == 'csv':
+        response = Response(grid.to_csv(), mimetype='text/csv', headers={
+            "Content-Disposition": f'attachment; filename="{timesheet_filename(date_obj, "csv")}"'})
+    else:
+        response = jsonify({"date": date_obj.strftime("%Y-%m-%d"),
+                            "seed": None if grid.truncated else seed,
+                            "truncated": grid.truncated,
+                            "columns": grid.columns, "rows": grid.to_records()})
+    set_schedule_seed_header(response, seed, grid.truncated)
+    return response
+
+
+def build_timesheet(staff_data, raw_date, renderer, engine, template, seed):
+    """Schedules and renders one day, through the timesheet cache.
+
+    Returns (filename, xlsx bytes, cache status, grid). On a cache hit
+    nothing is scheduled, so grid is None and staff_data is left as it was.
+    A day cut short by SCHEDULER_TIME_LIMIT is not cached: its seed would
+    not give the same workbook again.
+    """
+    date_obj = parse_date_from_payload(raw_date)
+    cache_key = timesheet_cache_key(
+        staff_data, date_obj, renderer, seed, engine, template)
+    grid = None
+    with metrics.stage("cache"):
+        xlsx_bytes = timesheet_cache.get(cache_key)
+    if xlsx_bytes is not None:
+        cache_status = "HIT"
+    else:
+        cache_status = "MISS" if timesheet_cache.enabled else "BYPASS"
+        grid = generate_schedule_data(
+            staff_data, raw_date, rng=random.Random(seed), engine=engine,
+            template=template)
+        _, xlsx_bytes = render_workbook_bytes(
+            grid, staff_data, raw_date, renderer)
+        if not grid.truncated:
+            with metrics.stage("cache"):
+                timesheet_cache.set(cache_key, xlsx_bytes)
+    return timesheet_filename(date_obj), xlsx_bytes, cache_status, grid
+
+
 @app.route('/generate-timesheet', methods=['POST'])
 def generate_timesheet():
+    """Schedules and renders one day; with "save": true the rota is also stored.
+
+    A stored rota's id comes back in X-Schedule-Id; read it later from
+    GET /schedules/<id> without scheduling again.
+    """
     data = request.json or {}
     staff_data = data.get('schedule', [])
     raw_date = data.get('date')
+    save = bool(data.get('save'))
 
     if not staff_data:
         return jsonify({"error": "No staff data provided for scheduling."}), 400
 
     try:
-        df = generate_schedule_data(staff_data, raw_date)
-        duty_managers = [s["name"]
-                         for s in staff_data if s.get("role") == "Duty Manager"]
-        duty_manager_names = " & ".join(duty_managers)
-        date_obj = parse_date_from_payload(raw_date)
-        formatted_date = date_obj.strftime("%A, %d %B %Y")
-        filename = f"Timesheet_{formatted_date}.xlsx"
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Timesheet', index=False,
-                        header=False, startrow=DATA_START_ROW_EXCEL - 1)
-            worksheet = writer.sheets['Timesheet']
-            add_template_header_rows(worksheet, date_obj, duty_manager_names)
-            apply_excel_styling(writer, df, staff_data)
-
-        output.seek(0)
-        return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, attachment_filename=filename)
+        renderer = select_renderer(data)
+        output_format = select_output_format(data)
+        engine = select_engine(data)
+        template = select_template(data)
+        seed = resolve_schedule_seed(data.get('seed'), [(raw_date, staff_data)])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if output_format != 'xlsx':
+            grid = generate_schedule_data(
+                staff_data, raw_date, rng=random.Random(seed), engine=engine,
+                template=template)
+            response = schedule_preview_response(grid, raw_date, output_format, seed)
+        else:
+            filename, xlsx_bytes, cache_status, grid = build_timesheet(
+                staff_data, raw_date, renderer, engine, template, seed)
+            output = io.BytesIO(xlsx_bytes)
+            response = send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                                 attachment_filename=filename)
+            response.headers["X-Timesheet-Cache"] = cache_status
+            set_schedule_seed_header(response, seed, grid is not None and grid.truncated)
+
+        if save:
+            if grid is None:
+                # A cache hit skipped scheduling; the same seed gives the same grid.
+                grid = generate_schedule_data(
+                    staff_data, raw_date, rng=random.Random(seed), engine=engine,
+                    template=template)
+            response.headers["X-Schedule-Id"] = str(
+                store_schedule(grid, staff_data, raw_date, engine, template, seed))
+        return response
 
     except Exception as e:
         print(f"Scheduling Error: {e}")
@@ -849,11 +2389,707 @@ def generate_timesheet():
         return jsonify({"error": f"Failed to generate timesheet. Error: {str(e)}"}), 500
 
 
+@app.route('/schedule/coverage', methods=['POST'])
+def schedule_coverage():
+    """Per-quarter-hour headcount by role for a roster, and the slots short of staff."""
+    from shift_coverage import ShiftCoverage
+    data = request.json or {}
+    staff_data = data.get('schedule', [])
+    if not staff_data:
+        return jsonify({"error": "No staff data provided for scheduling."}), 400
+    try:
+        template = select_template(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    required = data.get('required', dict(template.min_headcount))
+    start_hour = data.get('start_hour', COVERAGE_REPORT_HOURS[0])
+    end_hour = data.get('end_hour', COVERAGE_REPORT_HOURS[1])
+    if not isinstance(required, dict) or not all(
+            isinstance(v, int) and not isinstance(v, bool) for v in required.values()):
+        return jsonify({"error": "required must map roles to whole headcounts."}), 400
+    try:
+        if not 0 <= float(start_hour) < float(end_hour) <= 24:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"error": "start_hour and end_hour must satisfy 0 <= start < end <= 24."}), 400
+
+    report = ShiftCoverage(staff_data).report(
+        float(start_hour), float(end_hour), required)
+    report["required"] = required
+    return jsonify(report)
+
+
+# Roster fields an incremental change may set.
+INCREMENTAL_CHANGE_FIELDS = ("status", "status_detail", "start_hour", "end_hour", "tea_slot")
+# Grid columns holding each assignment hour's task; 13:00 spans the minute columns.
+HOUR_GRID_COLUMNS = {"12:00": ["12-1"], "13:00": ["00", "15", "30", "45"],
+                     "14:00": ["2-3"], "15:00": ["3-4"]}
+
+
+def apply_roster_changes(staff_data, changes):
+    """Returns (a copy of staff_data with `changes` applied, {name: change}).
+
+    `changes` is a list of {"name": ..., <INCREMENTAL_CHANGE_FIELDS>...}.
+    Raises ValueError for unknown names or fields.
+    """
+    if not isinstance(changes, list) or not changes:
+        raise ValueError("'changes' must be a non-empty list.")
+    updated = copy.deepcopy(staff_data)
+    by_name = {s.get("name"): s for s in updated}
+    applied = {}
+    for change in changes:
+        if not isinstance(change, dict) or change.get("name") not in by_name:
+            raise ValueError("Every change needs the 'name' of someone in 'schedule'.")
+        allowed = INCREMENTAL_CHANGE_FIELDS + tuple(
+            p.field for p in BREAK_PERIODS if p.field not in INCREMENTAL_CHANGE_FIELDS)
+        fields = set(change) - {"name"}
+        unknown = fields - set(allowed)
+        if unknown:
+            raise ValueError(f"Changes may only set: {', '.join(allowed)}.")
+        person = by_name[change["name"]]
+        for field in fields:
+            if change[field] is None:
+                person.pop(field, None)
+            else:
+                person[field] = change[field]
+        applied.setdefault(change["name"], {}).update(change)
+    return updated, applied
+
+
+def parse_previous_grid(previous, staff_data, template=DEFAULT_TEMPLATE):
+    """Reads a format=json grid back into ({name: {hour: task}}, {name: {field: slot}}).
+
+    Accepts the whole JSON body or just its "rows". Breaks come from the
+    1-2pm minute columns and from break_notes in Comments. Duty managers'
+    minute cells are cover, not assignments, so only their breaks are read.
+    Raises ValueError for a malformed grid.
+    """
+    rows = previous.get("rows") if isinstance(previous, dict) else previous
+    if not isinstance(rows, list) or not all(
+            isinstance(r, dict) and r.get("Staff Name") for r in rows):
+        raise ValueError("'previous' must be the rows of an earlier format=json response.")
+    roles = {s.get("name"): s.get("role") for s in staff_data}
+    tea_display = template.task_code_map["T"]
+    assignments = {}
+    breaks = {}
+    for row in rows:
+        name = row["Staff Name"]
+        comments = str(row.get("Comments") or "")
+        for period in BREAK_PERIODS:
+            labels = [f"13:{minute}" for minute in HOUR_GRID_COLUMNS["13:00"]
+                      if row.get(minute) == tea_display]
+            labels += [label for label in period.slots
+                       if f"{period.name.capitalize()} {label}" in comments]
+            for label in labels:
+                if period.slot_span(label) is not None:
+                    breaks.setdefault(name, {})[period.field] = label
+                    break
+        if roles.get(name) == "Duty Manager":
+            continue
+        for hour, columns in HOUR_GRID_COLUMNS.items():
+            for column in columns:
+                task = template.display_to_task.get(row.get(column))
+                if task and task not in ("T", "Set Up"):
+                    assignments.setdefault(name, {})[hour] = task
+                    break
+    return assignments, breaks
+
+
+def rescheduled_hours_for(old_staff, new_staff, names):
+    """Assignment hours in which any of `names` joins or leaves the available staff."""
+    from shift_coverage import ShiftCoverage
+    old = [s for s in old_staff if s.get("name") in names]
+    new = [s for s in new_staff if s.get("name") in names]
+    hours = [hour_of_key(key) for key in ASSIGNMENT_HOUR_KEYS]
+    old_cov, new_cov = ShiftCoverage(old), ShiftCoverage(new)
+    before = old_cov.columns(hours) & old_cov.available[:, None]
+    after = new_cov.columns(hours) & new_cov.available[:, None]
+    changed = (before != after).any(axis=0)
+    return [key for key, hit in zip(ASSIGNMENT_HOUR_KEYS, changed) if hit]
+
+
+def pin_break_slots(staff_data, previous_breaks, changes):
+    """Keeps everyone's previous break slots unless a change sets or invalidates one."""
+    from shift_coverage import ShiftCoverage
+    coverage = ShiftCoverage(staff_data)
+    for period in BREAK_PERIODS:
+        field = period.field
+        for staff, present in zip(staff_data, coverage.column(period.start)):
+            name = staff.get("name")
+            change = changes.get(name)
+            previous = previous_breaks.get(name, {})
+            if change is None:
+                if field in previous:
+                    staff[field] = previous[field]
+            elif field not in change:
+                if staff.get("status", "Available") == "Available" and present and field in previous:
+                    staff[field] = previous[field]
+                else:
+                    # Let auto_assign_tea_slots decide again.
+                    staff.pop(field, None)
+
+
+def changed_cells(previous_rows, grid):
+    """Cells of `grid` that differ from the previous rows, by person and column."""
+    before = {row["Staff Name"]: row for row in previous_rows}
+    diff = []
+    for record in grid.to_records():
+        name = record["Staff Name"]
+        old = before.get(name, {})
+        for column in grid.columns[1:]:
+            if old.get(column) != record[column]:
+                diff.append({"name": name, "column": column,
+                             "before": old.get(column), "after": record[column]})
+    return diff
+
+
+@app.route('/generate-timesheet/incremental', methods=['POST'])
+def generate_timesheet_incremental():
+    """Re-schedules a day after a few people's status, shift or tea change.
+
+    Takes the roster the previous grid was built from ('schedule'), that
+    grid ('previous', from format=json) and 'changes'. Only the hours where
+    a changed person joins or leaves are refilled; every other assignment
+    and tea slot stays put.
+    """
+    data = request.json or {}
+    staff_data = data.get('schedule', [])
+    raw_date = data.get('date')
+    if not staff_data:
+        return jsonify({"error": "No staff data provided for scheduling."}), 400
+
+    try:
+        renderer = select_renderer(data)
+        output_format = select_output_format(data)
+        template = select_template(data)
+        updated, changes = apply_roster_changes(staff_data, data.get('changes'))
+        previous, previous_breaks = parse_previous_grid(data.get('previous'), updated, template)
+        seed = resolve_schedule_seed(data.get('seed'), [(raw_date, updated)])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        hours = rescheduled_hours_for(staff_data, updated, set(changes))
+        pin_break_slots(updated, previous_breaks, changes)
+        engine = functools.partial(incremental_assign_hours, previous=previous,
+                                   rescheduled_hours=hours)
+        grid = generate_schedule_data(
+            updated, raw_date, rng=random.Random(seed), engine=engine, template=template)
+
+        if output_format == 'json':
+            previous_rows = data['previous'].get("rows") if isinstance(
+                data['previous'], dict) else data['previous']
+            response = jsonify({
+                "date": parse_date_from_payload(raw_date).strftime("%Y-%m-%d"),
+                "seed": seed, "columns": grid.columns, "rows": grid.to_records(),
+                "rescheduled_hours": hours,
+                "changed_cells": changed_cells(previous_rows, grid),
+                "schedule": updated})
+        elif output_format == 'csv':
+            response = schedule_preview_response(grid, raw_date, output_format, seed)
+        else:
+            filename, xlsx_bytes = render_workbook_bytes(
+                grid, updated, raw_date, renderer)
+            response = send_file(io.BytesIO(xlsx_bytes), mimetype=XLSX_MIMETYPE,
+                                 as_attachment=True, attachment_filename=filename)
+        response.headers["X-Schedule-Seed"] = str(seed)
+        response.headers["X-Rescheduled-Hours"] = ",".join(hours)
+        return response
+
+    except Exception as e:
+        print(f"Scheduling Error: {e}")
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to re-schedule timesheet. Error: {str(e)}"}), 500
+
+
+def expand_batch_days(data):
+    """Turns a batch payload into a list of (raw_date, staff_data) pairs.
+
+    Accepts either {"days": [{"date": ..., "schedule": [...]}, ...]} or a
+    single roster repeated over {"start_date": ..., "end_date": ...}.
+    Raises ValueError for malformed payloads.
+    """
+    days = data.get('days')
+    if days is not None:
+        if not isinstance(days, list) or not days:
+            raise ValueError("'days' must be a non-empty list.")
+        result = []
+        for day in days:
+            if not isinstance(day, dict) or not day.get('schedule'):
+                raise ValueError("Every day needs a non-empty 'schedule'.")
+            result.append((day.get('date'), day['schedule']))
+    else:
+        staff_data = data.get('schedule')
+        if not staff_data:
+            raise ValueError("No staff data provided for scheduling.")
+        start = parse_date_from_payload(data.get('start_date'))
+        end = parse_date_from_payload(data.get('end_date') or data.get('start_date'))
+        if end < start:
+            raise ValueError("end_date is before start_date.")
+        count = (end - start).days + 1
+        if count > MAX_BATCH_DAYS:
+            raise ValueError(f"A batch covers at most {MAX_BATCH_DAYS} days.")
+        result = [((start + timedelta(days=i)).strftime("%Y-%m-%d"), staff_data)
+                  for i in range(count)]
+    if len(result) > MAX_BATCH_DAYS:
+        raise ValueError(f"A batch covers at most {MAX_BATCH_DAYS} days.")
+    # Scheduling fills in tea slots and reorders the roster, so each day gets its own copy.
+    return [(raw_date, copy.deepcopy(staff_data)) for raw_date, staff_data in result]
+
+
+def batch_sheet_name(date_obj, used_names):
+    base = f"Timesheet {date_obj.strftime('%a %d %b %Y')}"
+    name = base
+    n = 2
+    while name in used_names:
+        name = f"{base} ({n})"
+        n += 1
+    used_names.add(name)
+    return name
+
+
+def build_timesheet_batch(days, output_format, renderer, engine, template, seed):
+    """Schedules and renders every day of a batch as one workbook or a zip of workbooks.
+
+    Returns (filename, mimetype, bytes, truncated); truncated is True when
+    any day's search stopped at SCHEDULER_TIME_LIMIT, so the seed would not
+    give the same batch again.
+    """
+    volunteer_task_history = {}
+    # One generator for the whole batch, drawn from in day order.
+    rng = random.Random(seed)
+    grids = [generate_schedule_data(staff_data, raw_date, volunteer_task_history, rng,
+                                    engine, template)
+             for raw_date, staff_data in days]
+    output = io.BytesIO()
+    if output_format == 'zip':
+        workbooks = render_grid_workbooks(grids, days, renderer)
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            used_names = set()
+            for entry_name, xlsx_bytes in workbooks:
+                if entry_name in used_names:
+                    entry_name = entry_name.replace(
+                        ".xlsx", f" ({len(used_names) + 1}).xlsx")
+                used_names.add(entry_name)
+                archive.writestr(entry_name, xlsx_bytes)
+        mimetype = 'application/zip'
+        extension = 'zip'
+    elif renderer == 'streaming':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        used_names = set()
+        for grid, (raw_date, staff_data) in zip(grids, days):
+            date_obj = parse_date_from_payload(raw_date)
+            with metrics.stage("stream"):
+                write_streaming_sheet(workbook, grid, staff_data, raw_date,
+                                      batch_sheet_name(date_obj, used_names))
+        with metrics.stage("save"):
+            workbook.save(output)
+        mimetype = XLSX_MIMETYPE
+        extension = 'xlsx'
+    else:
+        workbook = new_timesheet_workbook()
+        used_names = set()
+        for grid, (raw_date, staff_data) in zip(grids, days):
+            date_obj = parse_date_from_payload(raw_date)
+            render_timesheet_sheet(workbook, grid, staff_data, raw_date,
+                                   batch_sheet_name(date_obj, used_names))
+        with metrics.stage("save"):
+            workbook.save(output)
+        mimetype = XLSX_MIMETYPE
+        extension = 'xlsx'
+
+    first = parse_date_from_payload(days[0][0]).strftime("%d %B %Y")
+    last = parse_date_from_payload(days[-1][0]).strftime("%d %B %Y")
+    filename = f"Timesheets_{first} - {last}.{extension}"
+    return filename, mimetype, output.getvalue(), any(grid.truncated for grid in grids)
+
+
+@app.route('/generate-timesheet/batch', methods=['POST'])
+def generate_timesheet_batch():
+    data = request.json or {}
+    output_format = data.get('output', 'workbook')
+    if output_format not in ('workbook', 'zip'):
+        return jsonify({"error": "output must be 'workbook' or 'zip'."}), 400
+    try:
+        renderer = select_renderer(data)
+        days = expand_batch_days(data)
+        engine = select_engine(data)
+        template = select_template(data)
+        seed = resolve_schedule_seed(data.get('seed'), days)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        filename, mimetype, body, truncated = build_timesheet_batch(
+            days, output_format, renderer, engine, template, seed)
+        response = send_file(io.BytesIO(body), mimetype=mimetype, as_attachment=True,
+                             attachment_filename=filename)
+        set_schedule_seed_header(response, seed, truncated)
+        return response
+
+    except Exception as e:
+        print(f"Scheduling Error: {e}")
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to generate timesheets. Error: {str(e)}"}), 500
+
+
+# --- 6. BACKGROUND JOBS ---
+# Seconds a client is asked to wait when the job queue is full.
+JOB_RETRY_AFTER_SECONDS = 5
+JOB_STATUS_FIELDS = ("id", "kind", "status", "seed", "created_at", "started_at", "finished_at",
+                     "wait_seconds", "run_seconds", "expires_at", "error")
+
+
+def run_timesheet_job(staff_data, raw_date, renderer, engine, template, seed):
+    filename, xlsx_bytes, _, grid = build_timesheet(
+        staff_data, raw_date, renderer, engine, template, seed)
+    return filename, XLSX_MIMETYPE, xlsx_bytes, grid is not None and grid.truncated
+
+
+def job_status_body(job):
+    body = {field: job[field] for field in JOB_STATUS_FIELDS}
+    body["truncated"] = bool(job["truncated"])
+    if job["status"] == "done":
+        body["result_url"] = f"/jobs/{job['id']}/result"
+        body["size"] = job["size"]
+    return body
+
+
+@app.route('/jobs/timesheet', methods=['POST'])
+def submit_timesheet_job():
+    """Queues a timesheet and returns its job id without waiting for it.
+
+    Takes a /generate-timesheet payload, or a /generate-timesheet/batch one
+    (anything with "days" or "start_date"). Poll GET /jobs/<id>, then fetch
+    the xlsx (or zip) from GET /jobs/<id>/result.
+    """
+    data = request.json or {}
+    is_batch = 'days' in data or 'start_date' in data
+    try:
+        renderer = select_renderer(data)
+        engine = select_engine(data)
+        template = select_template(data)
+        if is_batch:
+            output_format = data.get('output', 'workbook')
+            if output_format not in ('workbook', 'zip'):
+                raise ValueError("output must be 'workbook' or 'zip'.")
+            days = expand_batch_days(data)
+            seed = resolve_schedule_seed(data.get('seed'), days)
+            run = functools.partial(build_timesheet_batch, days, output_format,
+                                    renderer, engine, template, seed)
+        else:
+            staff_data = data.get('schedule', [])
+            raw_date = data.get('date')
+            if not staff_data:
+                raise ValueError("No staff data provided for scheduling.")
+            seed = resolve_schedule_seed(data.get('seed'), [(raw_date, staff_data)])
+            run = functools.partial(run_timesheet_job, staff_data, raw_date,
+                                    renderer, engine, template, seed)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        job_id = job_queue.submit("batch" if is_batch else "timesheet", seed, run)
+    except JobQueueFull:
+        response = jsonify({"error": "Too many timesheet jobs are waiting. Try again shortly."})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(JOB_RETRY_AFTER_SECONDS)
+        return response
+    response = jsonify(job_status_body(job_queue.store.get(job_id)))
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired."}), 404
+    return jsonify(job_status_body(job))
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Streams a finished job's file from the job store."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found or expired."}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}.", "status": job["status"],
+                        "job_error": job["error"]}), 409
+    try:
+        # TTL eviction may delete the file after the status check above.
+        return send_file(job_queue.store.result_path(job_id), mimetype=job["mimetype"],
+                         as_attachment=True, attachment_filename=job["filename"])
+    except FileNotFoundError:
+        return jsonify({"error": "Job not found or expired."}), 404
+
+
+# --- 7. METRICS ---
+metrics.describe("timesheet_requests_total", "counter", "Requests handled, by endpoint and status.")
+metrics.describe("timesheet_request_seconds", "histogram", "Seconds from request start to response.")
+
+
+def cache_counters(cache):
+    def read():
+        stats = cache.stats()
+        return {(("event", event),): stats[event]
+                for event in ("hits", "misses", "stores", "evictions") if event in stats}
+    return read
+
+
+metrics.collect("timesheet_roster_cache_events_total", "counter",
+                "Roster cache hits, misses, stores and evictions.", cache_counters(roster_cache))
+metrics.collect("timesheet_cache_events_total", "counter",
+                "Rendered timesheet cache hits, misses, stores and evictions.",
+                cache_counters(timesheet_cache))
+metrics.collect("timesheet_template_compiles_total", "counter",
+                "Templates compiled by this process.",
+                lambda: {(): template_cache.stats()["compiles"]})
+metrics.collect("timesheet_jobs_queued", "gauge", "Background jobs waiting for a worker.",
+                lambda: {(): job_queue.depth()})
+metrics.collect("process_startup_seconds", "gauge",
+                "Module import and first request times of this process.",
+                lambda: {(("phase", "import"),): STARTUP_STATS["import_seconds"],
+                         (("phase", "first_request"),): STARTUP_STATS["first_request_seconds"]})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """This process's counters and histograms in Prometheus text format."""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled (METRICS_ENABLED=0)."}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# --- 8. SCHEDULE HISTORY ---
+SCHEDULE_COLUMNS = ("id", "schedule_date", "branch", "seed", "engine", "roster_size",
+                    "created_at")
+SCHEDULE_ENTRY_COLUMNS = ("row_index", "staff_name", "role", "status", "shift", "comments")
+
+
+def store_schedule(grid, staff_data, raw_date, engine, template, seed):
+    """Saves a scheduled day in schedules, schedule_staff and schedule_assignments.
+
+    `staff_data` must be in grid row order, as generate_schedule_data leaves
+    it. A truncated grid is stored without its seed, which would not give
+    it again. Returns the new schedule id.
+    """
+    ph = get_placeholder()
+    date_str = parse_date_from_payload(raw_date).strftime("%Y-%m-%d")
+    engine_name = engine if isinstance(engine, str) else "custom"
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            sql = ("INSERT INTO schedules (schedule_date, branch, seed, engine, roster_size, "
+                   f"created_at) VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph})")
+            params = (date_str, template.id, None if grid.truncated else seed, engine_name,
+                      len(grid.rows), time.time())
+            if DATABASE_URL:
+                c.execute(sql + " RETURNING id", params)
+                schedule_id = c.fetchone()[0]
+            else:
+                c.execute(sql, params)
+                schedule_id = c.lastrowid
+
+            people, cells = [], []
+            for row_index, (staff, row) in enumerate(zip(staff_data, grid.rows)):
+                record = dict(zip(grid.columns, row))
+                name = record["Staff Name"]
+                people.append((schedule_id, row_index, name, name, staff.get("role"),
+                               staff.get("status", "Available"), record["Shift"],
+                               record["Comments"]))
+                cells.extend((schedule_id, row_index, slot, record[slot])
+                             for slot in TIME_COLUMN_HOURS if record[slot])
+            c.executemany(
+                "INSERT INTO schedule_staff (schedule_id, row_index, staff_name, staff_id, "
+                f"role, status, shift, comments) VALUES ({ph}, {ph}, {ph}, "
+                f"(SELECT id FROM staff WHERE name = {ph}), {ph}, {ph}, {ph}, {ph})", people)
+            c.executemany(
+                "INSERT INTO schedule_assignments (schedule_id, row_index, slot, task) "
+                f"VALUES ({ph}, {ph}, {ph}, {ph})", cells)
+            conn.commit()
+        finally:
+            c.close()
+    return schedule_id
+
+
+def schedule_summary(row):
+    summary = dict(zip(SCHEDULE_COLUMNS, row))
+    summary["date"] = summary.pop("schedule_date")
+    return summary
+
+
+def history_filters(args, ph):
+    """WHERE clauses and params for the from, to and branch args; raises ValueError."""
+    where, params = [], []
+    for arg, op in (("from", ">="), ("to", "<=")):
+        if args.get(arg):
+            where.append(f"s.schedule_date {op} {ph}")
+            params.append(parse_date_from_payload(args[arg]).strftime("%Y-%m-%d"))
+    branches = [b for b in args.getlist("branch") if b]
+    if branches:
+        where.append(f"s.branch IN ({', '.join([ph] * len(branches))})")
+        params.extend(branches)
+    return where, params
+
+
+def history_limit(args, default=100):
+    try:
+        limit = int(args.get("limit", default))
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+
+@app.route('/schedules', methods=['GET'])
+def list_schedules():
+    """Stored rotas, newest date first.
+
+    Args: from and to (YYYY-MM-DD, inclusive), branch (template id,
+    repeatable), staff (only rotas that person is on) and limit.
+    """
+    ph = get_placeholder()
+    try:
+        where, params = history_filters(request.args, ph)
+        limit = history_limit(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.args.get("staff"):
+        where.append(f"s.id IN (SELECT schedule_id FROM schedule_staff WHERE staff_name = {ph})")
+        params.append(request.args["staff"])
+
+    sql = f"SELECT {', '.join('s.' + col for col in SCHEDULE_COLUMNS)} FROM schedules s"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY s.schedule_date DESC, s.id DESC LIMIT {limit}"
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+        c.close()
+    return jsonify([schedule_summary(row) for row in rows])
+
+
+@app.route('/schedules/entries', methods=['GET'])
+def list_schedule_entries():
+    """One line per person per stored rota, with their tasks, newest date first.
+
+    Args: name, role and status (repeatable), plus from, to, branch and
+    limit as for GET /schedules. E.g. ?status=Annual Leave&from=2026-03-01.
+    """
+    ph = get_placeholder()
+    try:
+        where, params = history_filters(request.args, ph)
+        limit = history_limit(request.args, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for arg, col in (("name", "staff_name"), ("role", "role"), ("status", "status")):
+        values = [v for v in request.args.getlist(arg) if v]
+        if values:
+            where.append(f"ss.{col} IN ({', '.join([ph] * len(values))})")
+            params.extend(values)
+
+    columns = ", ".join("ss." + col for col in SCHEDULE_ENTRY_COLUMNS)
+    sql = (f"SELECT s.id, s.schedule_date, s.branch, {columns} FROM schedule_staff ss "
+           "JOIN schedules s ON s.id = ss.schedule_id")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY s.schedule_date DESC, s.id DESC, ss.row_index LIMIT {limit}"
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(sql, params)
+        rows = c.fetchall()
+        row_indexes = {}
+        for row in rows:
+            row_indexes.setdefault(row[0], []).append(row[3])
+        tasks = {}
+        # Each matched person's tasks, by primary key, a chunk of rows at a time.
+        for schedule_id, indexes in row_indexes.items():
+            for chunk in chunked(indexes):
+                c.execute("SELECT row_index, slot, task FROM schedule_assignments "
+                          f"WHERE schedule_id = {ph} AND row_index IN "
+                          f"({', '.join([ph] * len(chunk))})", [schedule_id] + chunk)
+                for row_index, slot, task in c.fetchall():
+                    tasks.setdefault((schedule_id, row_index), {})[slot] = task
+        c.close()
+
+    result = []
+    for schedule_id, schedule_date, branch, *entry in rows:
+        item = dict(zip(SCHEDULE_ENTRY_COLUMNS, entry))
+        item.update(schedule_id=schedule_id, date=schedule_date, branch=branch,
+                    tasks=tasks.get((schedule_id, item["row_index"]), {}))
+        result.append(item)
+    return jsonify(result)
+
+
+@app.route('/schedules/<int:schedule_id>', methods=['GET', 'DELETE'])
+def stored_schedule(schedule_id):
+    """A stored rota as the format=json (or ?format=csv) preview shape, or deletes it."""
+    ph = get_placeholder()
+    if request.method == 'DELETE':
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            # schedule_staff and schedule_assignments rows go with it (ON DELETE CASCADE).
+            c.execute(f"DELETE FROM schedules WHERE id = {ph}", (schedule_id,))
+            deleted = c.rowcount
+            conn.commit()
+            c.close()
+        if not deleted:
+            return jsonify({"error": f"Schedule {schedule_id} not found."}), 404
+        return jsonify({"message": f"Schedule {schedule_id} removed."})
+
+    output_format = request.args.get("format", "json")
+    if output_format not in ("json", "csv"):
+        return jsonify({"error": "format must be 'json' or 'csv'."}), 400
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(SCHEDULE_COLUMNS)} FROM schedules WHERE id = {ph}",
+                  (schedule_id,))
+        head = c.fetchone()
+        people = cells = []
+        if head is not None:
+            c.execute("SELECT row_index, staff_name, shift, comments FROM schedule_staff "
+                      f"WHERE schedule_id = {ph} ORDER BY row_index", (schedule_id,))
+            people = c.fetchall()
+            c.execute("SELECT row_index, slot, task FROM schedule_assignments "
+                      f"WHERE schedule_id = {ph}", (schedule_id,))
+            cells = c.fetchall()
+        c.close()
+    if head is None:
+        return jsonify({"error": f"Schedule {schedule_id} not found."}), 404
+
+    records = {}
+    for row_index, name, shift, comments in people:
+        record = dict.fromkeys(FINAL_COLUMN_NAMES, "")
+        record.update({"Staff Name": name, "Shift": shift or "", "Comments": comments or ""})
+        records[row_index] = record
+    for row_index, slot, task in cells:
+        records[row_index][slot] = task
+    summary = schedule_summary(head)
+    grid = ScheduleGrid([[record[col] for col in FINAL_COLUMN_NAMES]
+                         for _, record in sorted(records.items())],
+                        truncated=summary["seed"] is None)
+
+    if output_format == "csv":
+        return schedule_preview_response(grid, summary["date"], "csv", summary["seed"])
+    summary.update(columns=grid.columns, rows=grid.to_records())
+    return jsonify(summary)
+
+
+STARTUP_STATS["import_seconds"] = round(time.perf_counter() - IMPORT_STARTED_AT, 4)
+
+
 def handler(event, context):
+    import serverless_wsgi
     return serverless_wsgi.handle_request(app, event, context)
 
 
 if __name__ == '__main__':
-    init_db()
+    ensure_schema()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
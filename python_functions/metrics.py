@@ -0,0 +1,177 @@
+"""Per-stage timers, counters and histograms, exported in Prometheus text format.
+
+The Flask app keeps one Metrics registry per process. `metrics.stage(name)`
+times a block of work into the `timesheet_stage_seconds` histogram, and
+into the current request's breakdown when one is being collected, which
+the app sends back as a Server-Timing header. A disabled registry hands
+out one shared no-op stage, so instrumented code costs a method call.
+Numbers are per process: each worker (and each render pool process)
+keeps its own.
+"""
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds, in seconds, of the histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+STAGE_METRIC = "timesheet_stage_seconds"
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"')
+                         .replace("\n", "\\n"))
+        for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Counters, histograms and collector callbacks for one process."""
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self._histograms = {}
+        self._collectors = []
+        self._local = threading.local()
+        self.describe(STAGE_METRIC, "histogram", "Seconds spent in each stage of a request.")
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def collect(self, name, kind, help_text, read):
+        """Registers `read()`, called at export time, returning {labels tuple: value}.
+
+        For numbers kept elsewhere, e.g. cache hit counts or the job queue depth.
+        """
+        self.describe(name, kind, help_text)
+        self._collectors.append((name, read))
+
+    def inc(self, name, labels=(), amount=1):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        if not self.enabled:
+            return
+        key = (name, tuple(labels))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def stage(self, name):
+        """A context manager timing one stage; a no-op when disabled."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def record_stage(self, name, seconds):
+        self.observe(STAGE_METRIC, seconds, (("stage", name),))
+        timings = getattr(self._local, "timings", None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+    def begin_request(self):
+        """Starts collecting this thread's stage timings."""
+        if self.enabled:
+            self._local.timings = {}
+
+    def end_request(self):
+        """Stops collecting and returns {stage: seconds}, in the order first seen."""
+        timings = getattr(self._local, "timings", None)
+        self._local.timings = None
+        return timings or {}
+
+    def render(self):
+        """Everything recorded so far, in Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(counts) for key, counts in self._histograms.items()}
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), counts in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append((name + "_bucket", labels + (("le", _number(bound)),), cumulative))
+            lines.append((name + "_sum", labels, round(counts[-2], 6)))
+            lines.append((name + "_count", labels, counts[-1]))
+        for name, read in self._collectors:
+            lines = samples.setdefault(name, [])
+            for labels, value in read().items():
+                if value is not None:
+                    lines.append((name, tuple(labels), value))
+
+        out = []
+        for name in sorted(samples):
+            kind, help_text = self._help.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for sample, labels, value in samples[name]:
+                out.append(f"{sample}{_label_text(labels)} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+
+def server_timing_header(timings, total=None):
+    """A Server-Timing value such as "tea;dur=1.2, assign;dur=3.4" (milliseconds)."""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def metrics_from_env():
+    """Builds the process-wide Metrics; METRICS_ENABLED=0 turns it off."""
+    enabled = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "off", "no")
+    return Metrics(enabled)
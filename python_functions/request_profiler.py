@@ -0,0 +1,140 @@
+"""Opt-in profiling of single requests.
+
+With PROFILE_REQUESTS=1, a request carrying an `X-Profile` header (equal to
+PROFILE_TOKEN when one is set) runs under cProfile while a sampler thread
+records its call stack every PROFILE_SAMPLE_INTERVAL seconds. Each
+profile is saved in PROFILE_DIR as three files sharing an id:
+    <id>.pstats     cProfile stats, for pstats or snakeviz
+    <id>.collapsed  sampled stacks, one "a;b;c count" line each, for
+                    flamegraph.pl or speedscope
+    <id>.json       the request, its roster size and its stage timings
+Only the newest PROFILE_KEEP profiles are kept. One request is profiled
+at a time; a second asking while one runs is served unprofiled.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+HEADER = "X-Profile"
+
+
+class StackSampler:
+    """Counts the call stacks of one thread, sampled from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="request-sampler")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                code = frame.f_code
+                labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                              f":{code.co_firstlineno})")
+                frame = frame.f_back
+            if labels:
+                stack = ";".join(reversed(labels))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class ActiveProfile:
+    def __init__(self, profile_id, sample_interval):
+        self.id = profile_id
+        self.started_at = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), sample_interval)
+
+    def start(self):
+        self.sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.sampler.stop()
+        return time.perf_counter() - self.started_at
+
+
+class RequestProfiler:
+    """Starts and saves per-request profiles; a disabled profiler never starts one."""
+
+    def __init__(self, directory, enabled=False, token=None, keep=20, sample_interval=0.005):
+        self.directory = directory
+        self.enabled = enabled
+        self.token = token
+        self.keep = max(1, keep)
+        self.sample_interval = sample_interval
+        self._busy = threading.Lock()
+
+    def wanted(self, header_value):
+        if not self.enabled or header_value is None:
+            return False
+        return self.token is None or header_value == self.token
+
+    def start(self):
+        """Returns a running ActiveProfile, or None if another request holds the profiler."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        # Sorts by start time, which is what rotate() relies on.
+        now = time.time()
+        profile_id = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+                      f"{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:6]}")
+        active = ActiveProfile(profile_id, self.sample_interval)
+        active.start()
+        return active
+
+    def finish(self, active, details):
+        """Stops `active`, writes its files with `details` and rotates old profiles."""
+        try:
+            seconds = active.stop()
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, active.id)
+            active.profile.dump_stats(base + ".pstats")
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(active.sampler.collapsed())
+            details = dict(details, id=active.id, profiled_seconds=round(seconds, 4),
+                           samples=sum(active.sampler.stacks.values()),
+                           sample_interval=self.sample_interval)
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump(details, f, indent=2, default=str)
+            self.rotate()
+        finally:
+            self._busy.release()
+
+    def rotate(self):
+        """Deletes all but the newest `keep` profiles."""
+        ids = sorted(name[:-len(".json")] for name in os.listdir(self.directory)
+                     if name.endswith(".json"))
+        for profile_id in ids[:-self.keep]:
+            for extension in (".json", ".pstats", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+
+def profiler_from_env(default_dir):
+    """Builds the process-wide RequestProfiler from PROFILE_* environment variables."""
+    enabled = os.environ.get("PROFILE_REQUESTS", "0").lower() in ("1", "true", "on", "yes")
+    directory = os.environ.get("PROFILE_DIR") or os.path.join(default_dir, "request_profiles")
+    return RequestProfiler(directory, enabled, os.environ.get("PROFILE_TOKEN") or None,
+                           int(os.environ.get("PROFILE_KEEP", 20)),
+                           float(os.environ.get("PROFILE_SAMPLE_INTERVAL", 0.005)))
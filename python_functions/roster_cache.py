@@ -0,0 +1,188 @@
+"""Read-through cache for decoded roster query results.
+
+The Flask app keeps one RosterCache per process. Its backend is pluggable:
+the in-memory backend is private to one worker, while the SQLite backend
+stores entries in a local file so every worker on the host shares them
+(a stand-in for a networked cache such as Redis).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """Per-process LRU dictionary with per-entry expiry."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (found, value, evicted) where evicted counts expired entries dropped."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None, 0
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return False, None, 1
+            self._entries.move_to_end(key)
+            return True, value, 0
+
+    def set(self, key, value, ttl):
+        """Stores value and returns how many entries were evicted to make room."""
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """File-backed cache shared by every worker process on the host."""
+
+    def __init__(self, path, max_entries=256):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None, 0
+        value, expires_at = row
+        now = time.time()
+        if expires_at <= now:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            conn.commit()
+            return False, None, 1
+        conn.execute(
+            "UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return True, json.loads(value), 0
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+            (key, json.dumps(value), now + ttl, now))
+        cur = conn.execute(
+            "DELETE FROM cache_entries WHERE key IN ("
+            "SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+        conn.commit()
+        return max(cur.rowcount, 0)
+
+    def delete_prefix(self, prefix):
+        conn = self._conn()
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conn.execute(
+            "DELETE FROM cache_entries WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries")
+        conn.commit()
+
+
+class RosterCache:
+    """Read-through cache keyed by table, invalidated per table on writes."""
+
+    def __init__(self, backend=None, ttl=30.0, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled and backend is not None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0,
+                          "evictions": 0, "invalidations": 0}
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self._counters[name] += amount
+
+    def get_or_load(self, table, key, loader):
+        """Returns the cached value for (table, key), calling loader() on a miss."""
+        if not self.enabled:
+            return loader()
+        full_key = f"{table}:{key}"
+        found, value, evicted = self.backend.get(full_key)
+        self._count("evictions", evicted)
+        if found:
+            self._count("hits")
+            return value
+        self._count("misses")
+        value = loader()
+        self._count("evictions", self.backend.set(full_key, value, self.ttl))
+        return value
+
+    def invalidate(self, table):
+        if not self.enabled:
+            return
+        self.backend.delete_prefix(f"{table}:")
+        self._count("invalidations")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self.backend).__name__ if self.enabled else None
+        stats["ttl"] = self.ttl
+        return stats
+
+
+def cache_from_env(default_dir):
+    """Builds the process-wide RosterCache from ROSTER_CACHE_* environment variables."""
+    backend_name = os.environ.get("ROSTER_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.environ.get("ROSTER_CACHE_TTL", 30))
+    max_entries = int(os.environ.get("ROSTER_CACHE_MAX_ENTRIES", 256))
+
+    if backend_name == "off":
+        return RosterCache(None, ttl=ttl, enabled=False)
+    if backend_name == "sqlite":
+        path = os.environ.get("ROSTER_CACHE_PATH") or os.path.join(
+            default_dir, "roster_cache.db")
+        return RosterCache(SQLiteCacheBackend(path, max_entries), ttl=ttl)
+    return RosterCache(MemoryCacheBackend(max_entries), ttl=ttl)
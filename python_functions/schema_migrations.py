@@ -0,0 +1,186 @@
+"""Versioned schema migrations for the roster database.
+
+Each migration runs once, in version order, in its own transaction, and is
+recorded in schema_migrations. Version 1 is the schema init_db always
+created (every statement IF NOT EXISTS), so databases made before
+migrations existed adopt it unchanged. Workers starting together take a
+lock first (an advisory lock on Postgres, BEGIN IMMEDIATE on SQLite), so
+only one of them applies a migration. Add a migration by appending to
+MIGRATIONS; never edit one that has shipped.
+"""
+import time
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every worker.
+MIGRATION_LOCK_ID = 7245101
+
+
+def _baseline(c, postgres):
+    id_type = "SERIAL PRIMARY KEY" if postgres else "INTEGER PRIMARY KEY"
+    ph = "%s" if postgres else "?"
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS staff (
+            id {id_type},
+            name TEXT UNIQUE NOT NULL,
+            role TEXT NOT NULL
+        )
+    ''')
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS profiles (
+            id {id_type},
+            name TEXT UNIQUE NOT NULL,
+            role TEXT NOT NULL,
+            status TEXT,
+            status_detail TEXT,
+            start_hour REAL,
+            end_hour REAL,
+            tea_slot TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS timesheet_templates (
+            id TEXT PRIMARY KEY,
+            spec TEXT NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_staff_role ON staff (role)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_profiles_role ON profiles (role)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_profiles_status ON profiles (status)")
+    # One row per roster table, bumped by every write so reads can revalidate cheaply.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS table_revisions (
+            table_name TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    for table in ("staff", "profiles", "timesheet_templates"):
+        c.execute(
+            f"INSERT INTO table_revisions (table_name, revision, updated_at) VALUES ({ph}, 1, {ph}) "
+            "ON CONFLICT (table_name) DO NOTHING",
+            (table, time.time()))
+
+
+def _profiles_staff_fk(c, postgres):
+    # Nullable, so a profile can still be saved before its staff row exists;
+    # the app links it by name on the next roster write.
+    c.execute("ALTER TABLE profiles ADD COLUMN staff_id INTEGER "
+              "REFERENCES staff (id) ON DELETE SET NULL")
+    c.execute("UPDATE profiles SET staff_id = "
+              "(SELECT staff.id FROM staff WHERE staff.name = profiles.name)")
+    c.execute("CREATE INDEX idx_profiles_staff_id ON profiles (staff_id)")
+
+
+def _schedules(c, postgres):
+    id_type = "SERIAL PRIMARY KEY" if postgres else "INTEGER PRIMARY KEY"
+    c.execute(f'''
+        CREATE TABLE schedules (
+            id {id_type},
+            schedule_date TEXT NOT NULL,
+            branch TEXT NOT NULL,
+            seed BIGINT NOT NULL,
+            engine TEXT NOT NULL,
+            roster_size INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX idx_schedules_date ON schedules (schedule_date, branch)")
+    # One row per person on the sheet, in sheet order.
+    c.execute('''
+        CREATE TABLE schedule_staff (
+            schedule_id INTEGER NOT NULL REFERENCES schedules (id) ON DELETE CASCADE,
+            row_index INTEGER NOT NULL,
+            staff_name TEXT NOT NULL,
+            staff_id INTEGER REFERENCES staff (id) ON DELETE SET NULL,
+            role TEXT,
+            status TEXT,
+            shift TEXT,
+            comments TEXT,
+            PRIMARY KEY (schedule_id, row_index)
+        )
+    ''')
+    c.execute("CREATE INDEX idx_schedule_staff_name ON schedule_staff (staff_name)")
+    c.execute("CREATE INDEX idx_schedule_staff_role_status ON schedule_staff (role, status)")
+    # One row per filled time column ("11.30-12", "00", "2-3", ...).
+    c.execute('''
+        CREATE TABLE schedule_assignments (
+            schedule_id INTEGER NOT NULL,
+            row_index INTEGER NOT NULL,
+            slot TEXT NOT NULL,
+            task TEXT NOT NULL,
+            PRIMARY KEY (schedule_id, row_index, slot),
+            FOREIGN KEY (schedule_id, row_index)
+                REFERENCES schedule_staff (schedule_id, row_index) ON DELETE CASCADE
+        )
+    ''')
+
+
+def _nullable_schedule_seed(c, postgres):
+    # A day cut short by SCHEDULER_TIME_LIMIT is stored without a seed.
+    if postgres:
+        c.execute("ALTER TABLE schedules ALTER COLUMN seed DROP NOT NULL")
+        return
+    # SQLite cannot drop a NOT NULL in place, and rebuilding schedules would
+    # cascade-delete its rows' staff and cells. Dropping a NOT NULL leaves the
+    # file format unchanged, so edit the stored definition as the SQLite
+    # ALTER TABLE docs describe, bumping schema_version so connections reload it.
+    c.execute("PRAGMA schema_version")
+    version = c.fetchone()[0]
+    c.execute("PRAGMA writable_schema = ON")
+    c.execute("UPDATE sqlite_master SET sql = replace(sql, 'seed BIGINT NOT NULL', 'seed BIGINT') "
+              "WHERE type = 'table' AND name = 'schedules'")
+    c.execute(f"PRAGMA schema_version = {version + 1}")
+    c.execute("PRAGMA writable_schema = OFF")
+
+
+MIGRATIONS = (
+    (1, "baseline roster tables", _baseline),
+    (2, "link profiles to staff", _profiles_staff_fk),
+    (3, "stored schedules", _schedules),
+    (4, "nullable schedule seed", _nullable_schedule_seed),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(c):
+    c.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in c.fetchall()}
+
+
+def migrate(conn, postgres):
+    """Brings the database up to LATEST_VERSION; returns the versions it applied."""
+    ph = "%s" if postgres else "?"
+    c = conn.cursor()
+    try:
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        done = applied_versions(c)
+        applied = []
+        for version, name, apply in MIGRATIONS:
+            if version in done:
+                continue
+            if postgres:
+                c.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            else:
+                c.execute("BEGIN IMMEDIATE")
+            # Another worker may have applied it while we waited for the lock.
+            if version in applied_versions(c):
+                conn.commit()
+                continue
+            apply(c, postgres)
+            c.execute(
+                f"INSERT INTO schema_migrations (version, name, applied_at) VALUES ({ph}, {ph}, {ph})",
+                (version, name, time.time()))
+            conn.commit()
+            applied.append(version)
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        c.close()
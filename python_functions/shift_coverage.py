@@ -0,0 +1,157 @@
+"""Staff x quarter-hour shift coverage for one roster.
+
+Built once per request from each person's start_hour, end_hour and status.
+Every scheduling and styling stage then asks it who is on shift at a given
+time instead of re-checking `start <= hour < end` on the roster dicts, and it
+answers per-slot headcount and coverage-gap questions for whole rosters with
+a few array operations.
+"""
+import numpy as np
+
+SLOTS_PER_HOUR = 4
+DAY_SLOTS = 24 * SLOTS_PER_HOUR
+SLOT_TIMES = np.arange(DAY_SLOTS) / SLOTS_PER_HOUR
+
+# Fallbacks for a missing start_hour/end_hour. Each stage has always read
+# them differently, and the matrices keep it that way.
+SCHEDULING_DEFAULTS = (0, 0)
+SHADING_DEFAULTS = (0, 24)
+STATUS_SPAN_DEFAULTS = (12, 16)
+
+
+def slot_of(hour):
+    """Column index of the quarter-hour starting at `hour` (e.g. 13.25 -> 53)."""
+    return int(round(hour * SLOTS_PER_HOUR))
+
+
+def slot_label(slot):
+    hours, quarter = divmod(slot, SLOTS_PER_HOUR)
+    return f"{hours:02d}:{quarter * 60 // SLOTS_PER_HOUR:02d}"
+
+
+def _hours(staff_data, key):
+    # A missing value becomes NaN, to be filled with each caller's default.
+    return np.array([s.get(key) for s in staff_data], dtype=float)
+
+
+class ShiftCoverage:
+    """Boolean staff x quarter-hour matrices; row i is staff_data[i]."""
+
+    def __init__(self, staff_data):
+        self.staff = list(staff_data)
+        self.starts = _hours(self.staff, "start_hour")
+        self.ends = _hours(self.staff, "end_hour")
+        self.available = np.array(
+            [s.get("status", "Available") == "Available" for s in self.staff], dtype=bool)
+        self._roles = None
+        self._row_index = None
+        self._matrices = {}
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.staff)
+
+    def __getstate__(self):
+        # id()s change when a render pool worker unpickles the roster.
+        state = self.__dict__.copy()
+        state["_row_index"] = None
+        return state
+
+    @property
+    def _rows(self):
+        if self._row_index is None:
+            self._row_index = {id(s): i for i, s in enumerate(self.staff)}
+        return self._row_index
+
+    @property
+    def roles(self):
+        if self._roles is None:
+            self._roles = np.array([s.get("role", "") for s in self.staff], dtype=object)
+        return self._roles
+
+    def row(self, staff):
+        """Row index of a roster dict (matched by identity, so duplicate names are safe)."""
+        return self._rows[id(staff)]
+
+    def matrix(self, defaults=SCHEDULING_DEFAULTS):
+        """staff x DAY_SLOTS booleans: True where the slot starts inside the shift."""
+        matrix = self._matrices.get(defaults)
+        if matrix is None:
+            starts = np.where(np.isnan(self.starts), defaults[0], self.starts)
+            ends = np.where(np.isnan(self.ends), defaults[1], self.ends)
+            matrix = ((starts[:, None] <= SLOT_TIMES[None, :])
+                      & (SLOT_TIMES[None, :] < ends[:, None]))
+            self._matrices[defaults] = matrix
+        return matrix
+
+    def has(self, staff):
+        return id(staff) in self._rows
+
+    def columns(self, hours, defaults=SCHEDULING_DEFAULTS):
+        """staff x len(hours) booleans for the quarter-hours starting at `hours`."""
+        return self.matrix(defaults)[:, [slot_of(h) for h in hours]]
+
+    def column(self, hour, defaults=SCHEDULING_DEFAULTS):
+        """One quarter-hour as a plain list of booleans in row order.
+
+        Per-person loops should index this list; NumPy scalar indexing is slower.
+        """
+        key = (slot_of(hour), defaults)
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = self.matrix(defaults)[:, key[0]].tolist()
+        return column
+
+    def covers(self, staff, hour, defaults=SCHEDULING_DEFAULTS):
+        return self.column(hour, defaults)[self._rows[id(staff)]]
+
+    def on_shift(self, hour, available_only=True):
+        """Roster dicts on shift at `hour`, in row order."""
+        mask = self.matrix()[:, slot_of(hour)]
+        if available_only:
+            mask = mask & self.available
+        return [self.staff[i] for i in np.flatnonzero(mask)]
+
+    def reordered(self, order):
+        """The same coverage with its rows in a new order; row i becomes old row order[i]."""
+        order = np.asarray(order, dtype=int)
+        other = ShiftCoverage.__new__(ShiftCoverage)
+        other.staff = [self.staff[i] for i in order]
+        other.starts = self.starts[order]
+        other.ends = self.ends[order]
+        other.available = self.available[order]
+        other._roles = None if self._roles is None else self._roles[order]
+        other._row_index = None
+        other._matrices = {key: m[order] for key, m in self._matrices.items()}
+        other._columns = {}
+        return other
+
+    def headcount(self, start_hour=0, end_hour=24, role=None):
+        """Available staff on shift in each quarter-hour of [start_hour, end_hour)."""
+        mask = self.available if role is None else self.available & (self.roles == role)
+        window = self.matrix()[:, slot_of(start_hour):slot_of(end_hour)]
+        return window[mask].sum(axis=0)
+
+    def report(self, start_hour, end_hour, required=None):
+        """Per-slot headcount, overall and by role, plus slots below `required`.
+
+        `required` maps a role (or "total") to the minimum headcount wanted
+        in every slot of the window.
+        """
+        first, last = slot_of(start_hour), slot_of(end_hour)
+        roles = sorted({r for r in self.roles[self.available] if r})
+        counts = {"total": self.headcount(start_hour, end_hour)}
+        for role in roles:
+            counts[role] = self.headcount(start_hour, end_hour, role)
+        gaps = []
+        for role, minimum in (required or {}).items():
+            have = counts.get(role)
+            if have is None:
+                have = np.zeros(last - first, dtype=int)
+            for offset in np.flatnonzero(have < minimum):
+                gaps.append({"slot": slot_label(first + int(offset)), "role": role,
+                             "required": minimum, "on_shift": int(have[offset])})
+        gaps.sort(key=lambda g: (g["slot"], g["role"]))
+        return {"slots": [slot_label(s) for s in range(first, last)],
+                "headcount": {key: [int(n) for n in value] for key, value in counts.items()},
+                "gaps": gaps}
@@ -0,0 +1,67 @@
+"""Shared fixtures: the Flask app, each test against its own SQLite file.
+
+Run from python_functions/ with `python -m pytest`.
+"""
+import copy
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+# Read at import time, so set before library_excel is imported; nothing the
+# tests do should land next to the code.
+_scratch = tempfile.mkdtemp(prefix="timesheet-tests-")
+os.environ["SQLITE_PATH"] = os.path.join(_scratch, "staff.db")
+os.environ["ROSTER_CACHE_BACKEND"] = "memory"
+os.environ["TIMESHEET_CACHE_BACKEND"] = "off"
+os.environ["TIMESHEET_JOB_DIR"] = os.path.join(_scratch, "timesheet_jobs")
+os.environ["PROFILE_REQUESTS"] = "0"
+
+import pytest  # noqa: E402
+
+import library_excel  # noqa: E402
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """library_excel pointed at a fresh database, with its roster caches emptied."""
+    monkeypatch.setattr(library_excel, "SQLITE_PATH", str(tmp_path / "staff.db"))
+    monkeypatch.setattr(library_excel, "_schema_ready", False)
+    library_excel._sqlite_local.conn = None
+    library_excel._revision_cache.clear()
+    if library_excel.roster_cache.enabled:
+        library_excel.roster_cache.backend.clear()
+    yield library_excel
+    conn = getattr(library_excel._sqlite_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        library_excel._sqlite_local.conn = None
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+with open(os.path.join(HERE, "schedule.json"), encoding="utf-8") as f:
+    SAMPLE_SCHEDULE = json.load(f)["schedule"]
+
+
+@pytest.fixture
+def schedule():
+    """A fresh copy of the sample roster in schedule.json."""
+    return copy.deepcopy(SAMPLE_SCHEDULE)
+
+
+@pytest.fixture
+def truncating_clock(monkeypatch):
+    """A one-second SCHEDULER_TIME_LIMIT and a clock that jumps an hour per read,
+    so every optimal search stops after its first sweep."""
+    monkeypatch.setattr(library_excel, "SCHEDULER_TIME_LIMIT", 1.0)
+    ticks = itertools.count(step=3600.0)
+    monkeypatch.setattr(time, "perf_counter", lambda: next(ticks))
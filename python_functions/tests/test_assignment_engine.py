@@ -0,0 +1,93 @@
+import copy
+import itertools
+import random
+
+import pytest
+
+import assignment_engine
+import library_excel
+from assignment_engine import solve_assignment
+from benchmarks.synthetic_roster import synthetic_roster
+
+TEMPLATE = library_excel.DEFAULT_TEMPLATE
+HOURS = library_excel.ASSIGNMENT_HOUR_KEYS
+
+
+def assign(engine, roster, seed, **kwargs):
+    staff_data = copy.deepcopy(roster)
+    rng = random.Random(seed)
+    library_excel.auto_assign_tea_slots(staff_data, rng)
+    pivot = {s["name"]: {} for s in staff_data}
+    _, on_shift = library_excel.build_staff_index(staff_data, HOURS)
+    library_excel.ASSIGNMENT_ENGINES[engine](pivot, on_shift, {}, rng, **kwargs)
+    return pivot, on_shift
+
+
+def mandatory_filled(pivot):
+    return sum(1 for slots in pivot.values() for task in slots.values()
+               if task in TEMPLATE.mandatory_tasks)
+
+
+@pytest.mark.parametrize("size,seed", [(6, 0), (10, 1), (20, 2), (50, 3)])
+def test_optimal_engine_respects_constraints(size, seed):
+    roster = synthetic_roster(size, seed)
+    roles = {s["name"]: s["role"] for s in roster}
+    pivot, on_shift = assign("optimal", roster, seed)
+
+    for hour in HOURS:
+        available = {s["name"] for s in on_shift[hour]}
+        holders = {}
+        for name, slots in pivot.items():
+            task = slots.get(hour)
+            if task is None:
+                continue
+            assert name in available, (name, hour)
+            assert roles[name] in TEMPLATE.task_config[task]["roles"], (name, task)
+            assert task not in holders, (hour, task)
+            holders[task] = name
+    for task in ("SM", "R"):
+        holders = [name for name, slots in pivot.items() for t in slots.values() if t == task]
+        assert len(holders) == len(set(holders)), task
+
+    greedy, _ = assign("greedy", roster, seed)
+    assert mandatory_filled(pivot) >= mandatory_filled(greedy)
+
+
+def test_optimal_engine_is_reproducible_whatever_the_clock(monkeypatch):
+    monkeypatch.setattr(library_excel, "SCHEDULER_TIME_LIMIT", 0)
+    roster = synthetic_roster(30, 4)
+    first, _ = assign("optimal", roster, 4)
+    # A clock that jumps an hour per read would have cut a time budget short.
+    ticks = itertools.count(step=3600.0)
+    monkeypatch.setattr(assignment_engine.time, "perf_counter", lambda: next(ticks))
+    assert assign("optimal", roster, 4)[0] == first
+
+
+def test_time_limit_truncates_the_search(monkeypatch):
+    roster = synthetic_roster(30, 4)
+    ticks = itertools.count(step=3600.0)
+    monkeypatch.setattr(assignment_engine.time, "perf_counter", lambda: next(ticks))
+    stats = {}
+    pivot, _ = assign("optimal", roster, 4, time_limit=1.0, stats=stats)
+    assert stats["truncated"] and stats["restarts"] == 1 and stats["sweeps"] == 1
+    greedy, _ = assign("greedy", roster, 4)
+    assert mandatory_filled(pivot) >= mandatory_filled(greedy)
+
+
+def test_time_limit_is_not_flagged_when_the_search_finishes():
+    stats = {}
+    assign("optimal", synthetic_roster(10, 1), 1, time_limit=3600.0, stats=stats)
+    assert not stats["truncated"]
+    assert stats["restarts"] == library_excel.SCHEDULER_RESTARTS
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_solve_assignment_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rows, cols = rng.randint(1, 4), rng.randint(4, 6)
+    cost = [[rng.randint(-9, 9) for _ in range(cols)] for _ in range(rows)]
+    best = min(sum(cost[r][c] for r, c in enumerate(perm))
+               for perm in itertools.permutations(range(cols), rows))
+    chosen = solve_assignment(cost)
+    assert len(set(chosen)) == rows
+    assert sum(cost[r][c] for r, c in enumerate(chosen)) == best
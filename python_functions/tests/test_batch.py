@@ -0,0 +1,84 @@
+import io
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+import library_excel
+
+# A volunteer on for one assignment hour, alone, so nobody else competes for
+# the two tasks a volunteer can be given (1st and Res).
+VOLUNTEER_ONLY = [{"name": "Dee", "role": "Volunteer", "status": "Available",
+                   "start_hour": 12, "end_hour": 13}]
+
+
+def batch(client, **payload):
+    return client.post("/generate-timesheet/batch", json=dict({"seed": 7}, **payload))
+
+
+@pytest.mark.parametrize("renderer", ["openpyxl", "streaming"])
+def test_workbook_has_one_sheet_per_day_with_repeats_numbered(client, schedule, renderer):
+    response = batch(client, renderer=renderer, days=[
+        {"date": "2026-10-18", "schedule": schedule},
+        {"date": "2026-10-19", "schedule": schedule},
+        {"date": "2026-10-18", "schedule": schedule},
+    ])
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].endswith(
+        'filename="Timesheets_18 October 2026 - 18 October 2026.xlsx"')
+    sheets = load_workbook(io.BytesIO(response.data)).sheetnames
+    assert sheets == ["Timesheet Sun 18 Oct 2026", "Timesheet Mon 19 Oct 2026",
+                      "Timesheet Sun 18 Oct 2026 (2)"]
+
+
+def test_date_range_covers_every_day(client, schedule):
+    response = batch(client, schedule=schedule,
+                     start_date="2026-10-18", end_date="2026-10-20")
+    assert response.status_code == 200
+    sheets = load_workbook(io.BytesIO(response.data)).sheetnames
+    assert sheets == ["Timesheet Sun 18 Oct 2026", "Timesheet Mon 19 Oct 2026",
+                      "Timesheet Tue 20 Oct 2026"]
+
+
+def test_zip_has_one_workbook_per_day_with_repeats_numbered(client, schedule):
+    response = batch(client, output="zip", days=[
+        {"date": "2026-10-18", "schedule": schedule},
+        {"date": "2026-10-18", "schedule": schedule},
+    ])
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.namelist() == ["Timesheet_Sunday, 18 October 2026.xlsx",
+                                      "Timesheet_Sunday, 18 October 2026 (2).xlsx"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"days": []},
+    {"days": [{"date": "2026-10-18"}]},
+    {"schedule": VOLUNTEER_ONLY, "start_date": "2026-10-19", "end_date": "2026-10-18"},
+    {"schedule": VOLUNTEER_ONLY, "start_date": "2026-10-01", "end_date": "2026-12-01"},
+    {"days": [{"date": "2026-10-18", "schedule": VOLUNTEER_ONLY}], "output": "tar"},
+])
+def test_malformed_batches_are_rejected(client, payload):
+    assert batch(client, **payload).status_code == 400
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_volunteer_history_carries_across_days(client, monkeypatch, seed):
+    histories = []
+    generate = library_excel.generate_schedule_data
+
+    def spy(staff_data, date_str, volunteer_task_history=None, *args, **kwargs):
+        grid = generate(staff_data, date_str, volunteer_task_history, *args, **kwargs)
+        histories.append((volunteer_task_history, set(volunteer_task_history["Dee"])))
+        return grid
+
+    monkeypatch.setattr(library_excel, "generate_schedule_data", spy)
+    response = batch(client, seed=seed, schedule=VOLUNTEER_ONLY,
+                     start_date="2026-10-18", end_date="2026-10-19")
+    assert response.status_code == 200
+    (first, first_tasks), (second, second_tasks) = histories
+    assert first is second
+    # One task a day, and the second day picks the one the first did not.
+    assert len(first_tasks) == 1
+    assert second_tasks == {"1st", "Res"}
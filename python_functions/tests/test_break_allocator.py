@@ -0,0 +1,141 @@
+import random
+from collections import Counter
+
+import pytest
+
+import library_excel
+from break_allocator import (BreakPeriod, allocate_breaks, allocate_period, breaks_from_env,
+                             periods_from_json)
+
+TEA = BreakPeriod("tea", "13:00", "14:00", 15, 2, ("Scale 3", "Duty Manager"), "tea_slot")
+
+
+def staff(count, role="Scale 3", **extra):
+    return [dict({"name": f"P{i}", "role": role, "status": "Available"}, **extra)
+            for i in range(count)]
+
+
+def slots(staff_data, field="tea_slot"):
+    return Counter(s.get(field) for s in staff_data)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_no_slot_takes_more_than_its_capacity(seed):
+    staff_data = staff(8)
+    allocate_period(TEA, staff_data, [True] * 8, random.Random(seed))
+    assert slots(staff_data) == {"13:00": 2, "13:15": 2, "13:30": 2, "13:45": 2}
+
+
+def test_staff_beyond_capacity_get_no_slot():
+    staff_data = staff(10)
+    allocate_period(TEA, staff_data, [True] * 10, random.Random(0))
+    counts = slots(staff_data)
+    assert counts[None] == 2
+    assert max(n for label, n in counts.items() if label) == 2
+
+
+def test_only_eligible_staff_get_a_slot():
+    staff_data = [
+        {"name": "Vol", "role": "Volunteer"},
+        {"name": "Sick", "role": "Scale 3", "status": "Sick"},
+        {"name": "Gone", "role": "Scale 3"},
+        {"name": "Here", "role": "Scale 3"},
+    ]
+    allocate_period(TEA, staff_data, [True, True, False, True], random.Random(0))
+    assert [s.get("tea_slot") for s in staff_data] == [None, None, None, "13:00"]
+
+
+def test_preset_slots_count_towards_capacity():
+    staff_data = staff(8)
+    staff_data[0]["tea_slot"] = staff_data[1]["tea_slot"] = "13:00"
+    allocate_period(TEA, staff_data, [True] * 8, random.Random(0))
+    assert slots(staff_data) == {"13:00": 2, "13:15": 2, "13:30": 2, "13:45": 2}
+    assert [s["tea_slot"] for s in staff_data[:2]] == ["13:00", "13:00"]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_preference_pins_a_slot(seed):
+    staff_data = staff(4)
+    allocate_period(TEA, staff_data, [True] * 4, random.Random(seed), {"P3": "13:45"})
+    assert staff_data[3]["tea_slot"] == "13:45"
+    assert slots(staff_data)["13:45"] == 1
+
+
+def test_preference_outranks_a_preset_slot():
+    staff_data = staff(2)
+    staff_data[0]["tea_slot"] = "13:00"
+    allocate_period(TEA, staff_data, [True, True], random.Random(0), {"P0": "13:30"})
+    assert staff_data[0]["tea_slot"] == "13:30"
+    # The preset no longer holds 13:00, so the least-loaded pick is back at the start.
+    assert staff_data[1]["tea_slot"] == "13:00"
+
+
+def test_full_preferred_slot_falls_back_to_least_loaded():
+    staff_data = staff(3)
+    staff_data[0]["tea_slot"] = staff_data[1]["tea_slot"] = "13:45"
+    allocate_period(TEA, staff_data, [True] * 3, random.Random(0), {"P2": "13:45"})
+    assert staff_data[2]["tea_slot"] == "13:00"
+
+
+def test_full_preferred_slot_keeps_the_preset():
+    staff_data = staff(3)
+    staff_data[0]["tea_slot"] = staff_data[1]["tea_slot"] = "13:45"
+    staff_data[2]["tea_slot"] = "13:15"
+    allocate_period(TEA, staff_data, [True] * 3, random.Random(0), {"P2": "13:45"})
+    assert staff_data[2]["tea_slot"] == "13:15"
+
+
+def test_preference_for_someone_off_shift_is_ignored():
+    staff_data = staff(2)
+    allocate_period(TEA, staff_data, [False, True], random.Random(0), {"P0": "13:45"})
+    assert "tea_slot" not in staff_data[0]
+    assert slots(staff_data)["13:45"] == 0
+
+
+def test_preferences_apply_to_the_period_their_label_belongs_to():
+    lunch = BreakPeriod("lunch", "12:00", "13:00", 30, 1, None, "lunch_slot")
+    staff_data = staff(3)
+    allocate_breaks(staff_data, (TEA, lunch), random.Random(0), lambda hour: [True] * 3,
+                    {"P1": ["12:30", "13:15"], "P2": "13:45"})
+    assert (staff_data[1]["lunch_slot"], staff_data[1]["tea_slot"]) == ("12:30", "13:15")
+    assert staff_data[2]["tea_slot"] == "13:45"
+    assert slots(staff_data, "lunch_slot") == {"12:00": 1, "12:30": 1, None: 1}
+
+
+@pytest.mark.parametrize("raw", [
+    "not json", "[]", "{}", '[{"name": "tea"}]',
+    '[{"name": "tea", "start": 14, "end": 13}]',
+    '[{"name": "tea", "start": 13, "end": 14, "colour": "red"}]',
+    '[{"name": "a", "start": 13, "end": 14, "field": "x"},'
+    ' {"name": "b", "start": 15, "end": 16, "field": "x"}]',
+])
+def test_malformed_periods_are_rejected(raw):
+    with pytest.raises(ValueError):
+        periods_from_json(raw)
+
+
+def test_breaks_from_env(monkeypatch):
+    monkeypatch.setenv("BREAK_PERIODS", '[{"name": "tea", "start": "13:00", "end": "13:30",'
+                                        ' "slot_minutes": 10, "capacity": 3}]')
+    monkeypatch.setenv("BREAK_PREFERENCES", '{"Kyle": "13:20"}')
+    (period,), preferences = breaks_from_env()
+    assert period.slots == ["13:00", "13:10", "13:20"]
+    assert (period.capacity, period.field) == (3, "tea_slot")
+    assert preferences == {"Kyle": "13:20"}
+
+
+def test_kyle_has_no_built_in_pin(schedule):
+    assert library_excel.BREAK_PREFERENCES == {}
+    kyle_slots = set()
+    for seed in range(20):
+        staff_data = [dict(s) for s in schedule]
+        library_excel.auto_assign_tea_slots(staff_data, random.Random(seed))
+        kyle_slots.add(next(s["tea_slot"] for s in staff_data if s["name"] == "Kyle"))
+    assert len(kyle_slots) > 1
+
+
+def test_configured_pin_reaches_the_schedule(schedule, monkeypatch):
+    monkeypatch.setattr(library_excel, "BREAK_PREFERENCES", {"Faisal": "13:15"})
+    library_excel.auto_assign_tea_slots(schedule, random.Random(0))
+    assert next(s["tea_slot"] for s in schedule if s["name"] == "Faisal") == "13:15"
+    assert max(slots(schedule).values()) <= 2
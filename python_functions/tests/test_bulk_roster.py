@@ -0,0 +1,56 @@
+def put(client, table, body):
+    response = client.put(f"/{table}", json=body)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def statuses(body):
+    return [(r["name"], r["status"]) for r in body["results"]]
+
+
+def test_bulk_upsert_reports_each_row(client):
+    put(client, "staff", [{"name": "Ada", "role": "Scale 3"}])
+    body = put(client, "staff", [
+        {"name": "Ada", "role": "Duty Manager"},
+        {"name": "Bea", "role": "Scale 3"},
+        {"name": "Bea", "role": "Volunteer"},
+        {"name": "Cal"},
+        {"name": 7, "role": "Scale 3"},
+        "Dee",
+    ])
+    assert statuses(body) == [("Ada", "updated"), ("Bea", "skipped"), ("Bea", "created"),
+                              ("Cal", "error"), (7, "error"), (None, "error")]
+    assert body["results"][1]["error"] == "Duplicate name later in batch."
+    assert body["summary"] == {"updated": 1, "skipped": 1, "created": 1, "error": 3}
+    # The last Bea in the batch won.
+    assert {r["name"]: r["role"] for r in client.get("/staff").get_json()} == {
+        "Ada": "Duty Manager", "Bea": "Volunteer"}
+
+
+def test_bulk_upsert_ignore_leaves_existing_rows(client):
+    put(client, "profiles", [{"name": "Ada", "role": "Scale 3", "start_hour": 12}])
+    body = put(client, "profiles", {"on_conflict": "ignore", "records": [
+        {"name": "Ada", "role": "Volunteer", "start_hour": 9},
+        {"name": "Bea", "role": "Scale 3"}]})
+    assert statuses(body) == [("Ada", "skipped"), ("Bea", "created")]
+    assert body["summary"] == {"skipped": 1, "created": 1}
+    ada = [p for p in client.get("/profiles").get_json() if p["name"] == "Ada"][0]
+    assert (ada["role"], ada["start_hour"]) == ("Scale 3", 12)
+
+
+def test_bulk_upsert_rejects_bad_payloads(client):
+    assert client.put("/staff", json={"records": "Ada"}).status_code == 400
+    assert client.put("/staff?on_conflict=replace", json=[]).status_code == 400
+
+
+def test_bulk_delete_reports_unknown_and_non_string_names(client):
+    put(client, "staff", [{"name": "Ada", "role": "Scale 3"}, {"name": "Bea", "role": "Scale 3"}])
+    response = client.delete("/staff", json={"names": ["Ada", "Zed", "Ada", 5, None, "",
+                                                       {"name": "Bea"}]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert statuses(body) == [("Ada", "deleted"), ("Zed", "not_found"), (5, "error"),
+                              (None, "error"), ("", "error"), ({"name": "Bea"}, "error")]
+    assert body["summary"] == {"deleted": 1, "not_found": 1, "error": 4}
+    assert [r["name"] for r in client.get("/staff").get_json()] == ["Bea"]
+    assert client.delete("/staff", json={"names": "Bea"}).status_code == 400
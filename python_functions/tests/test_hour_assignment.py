@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+import library_excel
+
+ROLES = ["Duty Manager", "Scale 3", "Scale 3", "Scale 3", "Volunteer"]
+STATUSES = ["Available", "Available", "Available", "Available", "Sick", "Annual Leave"]
+
+
+def synthetic_roster(rng):
+    roster = []
+    for i in range(rng.randint(3, 14)):
+        start = rng.choice([11, 11.5, 12, 12.5, 13, 14])
+        roster.append({"name": f"P{i}", "role": rng.choice(ROLES),
+                       "status": rng.choice(STATUSES), "start_hour": start,
+                       "end_hour": min(16, start + rng.choice([1, 1.5, 2, 3, 4, 5]))})
+    return roster
+
+
+def rescan_assign_hours(pivot_schedule, staff_data, volunteer_task_history, rng,
+                        template=library_excel.DEFAULT_TEMPLATE):
+    """The hour loop as it was before build_staff_index: rescan the roster for
+    every hour and take mandatory holders off a list."""
+    sm_assigned_staff = set()
+    r_assigned_staff = set()
+    for time_str in library_excel.ASSIGNMENT_HOUR_KEYS:
+        hour = library_excel.hour_of_key(time_str)
+        available_staff_for_hour = [
+            s for s in staff_data
+            if s.get("status", "Available") == "Available"
+            and s.get("start_hour", 0) <= hour < s.get("end_hour", 0)]
+        rng.shuffle(available_staff_for_hour)
+        tasks_assigned_in_hour = []
+        tasks_taken_in_hour = set()
+        scale3_staff = [s for s in available_staff_for_hour if s.get("role") == "Scale 3"]
+        for task in template.mandatory_tasks:
+            if task in ("SM", "R"):
+                assigned = sm_assigned_staff if task == "SM" else r_assigned_staff
+                candidates = [s for s in scale3_staff if s["name"] not in assigned]
+                if not candidates:
+                    continue
+                staff_to_assign = candidates[0]
+                assigned.add(staff_to_assign["name"])
+                scale3_staff.remove(staff_to_assign)
+            else:
+                if not scale3_staff:
+                    continue
+                staff_to_assign = scale3_staff.pop(0)
+            tasks_taken_in_hour.add(task)
+            pivot_schedule[staff_to_assign["name"]][time_str] = task
+            tasks_assigned_in_hour.append(staff_to_assign["name"])
+
+        for staff in available_staff_for_hour:
+            name = staff["name"]
+            if name in tasks_assigned_in_hour:
+                continue
+            role = staff.get("role", "")
+            assignable_tasks = [t for t in template.random_tasks_by_role.get(role, ())
+                                if t not in tasks_taken_in_hour]
+            if role == "Volunteer":
+                used = volunteer_task_history.get(name, set())
+                unused_variants = [t for t in assignable_tasks if t not in used]
+                if unused_variants:
+                    assignable_tasks = unused_variants
+            if assignable_tasks:
+                assigned_task = rng.choice(assignable_tasks)
+                pivot_schedule[name][time_str] = assigned_task
+                tasks_assigned_in_hour.append(name)
+                tasks_taken_in_hour.add(assigned_task)
+                if role == "Volunteer":
+                    volunteer_task_history.setdefault(name, set()).add(assigned_task)
+    return r_assigned_staff
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_indexed_hours_match_a_full_rescan(seed):
+    staff_data = synthetic_roster(random.Random(seed))
+    _, on_shift_by_hour = library_excel.build_staff_index(
+        staff_data, library_excel.ASSIGNMENT_HOUR_KEYS)
+    indexed = {s["name"]: {} for s in staff_data}
+    indexed_history = {"P0": {"1st"}}
+    indexed_r = library_excel.greedy_assign_hours(
+        indexed, on_shift_by_hour, indexed_history, random.Random(seed))
+
+    rescanned = {s["name"]: {} for s in staff_data}
+    rescanned_history = {"P0": {"1st"}}
+    rescanned_r = rescan_assign_hours(
+        rescanned, staff_data, rescanned_history, random.Random(seed))
+
+    assert indexed == rescanned
+    assert indexed_history == rescanned_history
+    assert indexed_r == rescanned_r
+
+
+def test_staff_index_buckets_available_staff_in_roster_order():
+    staff_data = [
+        {"name": "A", "role": "Scale 3", "start_hour": 12, "end_hour": 14},
+        {"name": "B", "role": "Duty Manager", "start_hour": 11, "end_hour": 16},
+        {"name": "C", "role": "Scale 3", "status": "Sick", "start_hour": 12, "end_hour": 16},
+        {"name": "D", "role": "Scale 3", "start_hour": 13.5, "end_hour": 16},
+        {"name": "E", "role": "Volunteer"},
+    ]
+    by_role, on_shift = library_excel.build_staff_index(
+        staff_data, library_excel.ASSIGNMENT_HOUR_KEYS)
+
+    def names(people):
+        return [s["name"] for s in people]
+
+    assert {role: names(people) for role, people in by_role.items()} == {
+        "Scale 3": ["A", "D"], "Duty Manager": ["B"], "Volunteer": ["E"]}
+    assert {key: names(people) for key, people in on_shift.items()} == {
+        "12:00": ["A", "B"], "13:00": ["A", "B"], "14:00": ["B", "D"], "15:00": ["B", "D"]}
+
+
+def test_each_hour_fills_mandatory_tasks_and_rotates_sm_and_r(schedule):
+    _, on_shift_by_hour = library_excel.build_staff_index(
+        schedule, library_excel.ASSIGNMENT_HOUR_KEYS)
+    pivot_schedule = {s["name"]: {} for s in schedule}
+    library_excel.greedy_assign_hours(pivot_schedule, on_shift_by_hour, {}, random.Random(3))
+
+    for time_str in library_excel.ASSIGNMENT_HOUR_KEYS:
+        held = [tasks[time_str] for tasks in pivot_schedule.values() if time_str in tasks]
+        assert len(held) == len(set(held))
+        assert {"SM", "R", "C", "C+"} <= set(held)
+    for task in ("SM", "R"):
+        holders = [name for name, tasks in pivot_schedule.items()
+                   for time_str, held in tasks.items() if held == task]
+        # Five Scale 3s over four hours, so nobody needs to hold either twice.
+        assert len(holders) == len(set(holders)) == 4
+    assert not pivot_schedule["Kyle"] and not pivot_schedule["Faisal"]
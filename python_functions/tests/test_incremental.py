@@ -0,0 +1,50 @@
+import copy
+
+import pytest
+
+import library_excel
+
+DATE = "2026-10-18"
+TASKS = library_excel.DEFAULT_TEMPLATE.task_code_map
+MANDATORY = [TASKS[t] for t in ("SM", "R", "C")]
+HOUR_COLUMNS = library_excel.HOUR_GRID_COLUMNS
+
+
+def preview(client, schedule, seed):
+    return client.post("/generate-timesheet?format=json",
+                       json={"schedule": schedule, "date": DATE, "seed": seed}).get_json()
+
+
+def tasks_in_hour(rows, hour):
+    return {row[column] for row in rows for column in HOUR_COLUMNS[hour]}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sick_mandatory_holder_is_covered_and_other_hours_kept(client, schedule, seed):
+    # Tazim leaves at 2pm, so a Sick call only refills 12:00 and 13:00.
+    for person in schedule:
+        if person["name"] == "Tazim":
+            person["end_hour"] = 14
+    previous = preview(client, schedule, seed)
+    tazim = [row for row in previous["rows"] if row["Staff Name"] == "Tazim"]
+    assert (tasks_in_hour(tazim, "12:00") | tasks_in_hour(tazim, "13:00")) & set(MANDATORY)
+
+    response = client.post("/generate-timesheet/incremental?format=json", json={
+        "schedule": copy.deepcopy(schedule), "date": DATE, "seed": seed, "previous": previous,
+        "changes": [{"name": "Tazim", "status": "Sick"}]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["rescheduled_hours"] == ["12:00", "13:00"]
+    assert response.headers["X-Rescheduled-Hours"] == "12:00,13:00"
+
+    for hour in library_excel.ASSIGNMENT_HOUR_KEYS:
+        assert set(MANDATORY) <= tasks_in_hour(body["rows"], hour), hour
+    before = {row["Staff Name"]: row for row in previous["rows"]}
+    for row in body["rows"]:
+        for hour in ("14:00", "15:00"):
+            for column in HOUR_COLUMNS[hour]:
+                assert row[column] == before[row["Staff Name"]][column], (row, column)
+    diff = {(c["name"], c["column"]) for c in body["changed_cells"]}
+    assert diff == {(row["Staff Name"], column) for row in body["rows"]
+                    for column in previous["columns"][1:]
+                    if row[column] != before[row["Staff Name"]][column]}
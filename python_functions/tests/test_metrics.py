@@ -0,0 +1,37 @@
+import time
+
+import schema_migrations
+
+SLOW_MIGRATION = 0.05
+
+
+def server_timing(response):
+    timings = {}
+    for part in response.headers["Server-Timing"].split(","):
+        name, dur = part.strip().split(";dur=")
+        timings[name] = float(dur) / 1000
+    return timings
+
+
+def test_schema_check_is_not_counted_as_connection_checkout(client, app_module, monkeypatch):
+    def slow_migrate(conn, postgres):
+        time.sleep(SLOW_MIGRATION)
+        return schema_migrations.migrate(conn, postgres)
+
+    monkeypatch.setattr(app_module, "migrate", slow_migrate)
+    timings = server_timing(client.get("/staff"))
+    assert timings["db_schema"] >= SLOW_MIGRATION
+    assert timings["db_connect"] < SLOW_MIGRATION
+
+    later = server_timing(client.post("/staff", json={"name": "Ada", "role": "Scale 3"}))
+    assert "db_schema" not in later
+    assert "db_connect" in later and "db_query" in later
+
+
+def test_stages_reach_the_histogram(client):
+    client.post("/generate-timesheet?format=json",
+                json={"schedule": [{"name": "Ada", "role": "Scale 3", "status": "Available",
+                                    "start_hour": 11, "end_hour": 16}],
+                      "date": "2026-10-18"})
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'timesheet_stage_seconds_count{stage="assign"}' in body
@@ -0,0 +1,38 @@
+import pytest
+
+from library_excel import XLSX_MIMETYPE
+
+DATE = "2026-10-18"
+
+
+@pytest.mark.parametrize("accept,mimetype", [
+    (None, XLSX_MIMETYPE),
+    ("*/*", XLSX_MIMETYPE),
+    ("text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8", XLSX_MIMETYPE),
+    ("application/json", "application/json"),
+    ("text/csv", "text/csv"),
+    ("application/json, */*;q=0.1", "application/json"),
+    ("text/csv;q=0.5, */*", XLSX_MIMETYPE),
+])
+def test_accept_header_picks_format(client, schedule, accept, mimetype):
+    headers = {"Accept": accept} if accept else {}
+    response = client.post("/generate-timesheet", json={"schedule": schedule, "date": DATE},
+                           headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+
+
+def test_explicit_format_beats_accept(client, schedule):
+    response = client.post("/generate-timesheet?format=csv",
+                           json={"schedule": schedule, "date": DATE},
+                           headers={"Accept": "application/json"})
+    assert response.mimetype == "text/csv"
+
+
+def test_json_preview_shape(client, schedule):
+    response = client.post("/generate-timesheet", json={"schedule": schedule, "date": DATE},
+                           headers={"Accept": "application/json"})
+    body = response.get_json()
+    assert body["date"] == DATE
+    assert len(body["rows"]) == len(schedule)
+    assert response.headers["X-Schedule-Seed"] == str(body["seed"])
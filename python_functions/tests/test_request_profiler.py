@@ -0,0 +1,106 @@
+import json
+import os
+import pstats
+import re
+import time
+
+import pytest
+
+import library_excel
+from request_profiler import RequestProfiler
+
+# "frame;frame;frame count", where a frame is "function (file.py:line)".
+COLLAPSED_LINE = re.compile(r"^[^;\s][^;]* \([^;]+:\d+\)(;[^;]+ \([^;]+:\d+\))* \d+$")
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    profiler = RequestProfiler(str(tmp_path / "profiles"), enabled=True, token="secret",
+                               keep=2, sample_interval=0.001)
+    monkeypatch.setattr(library_excel, "request_profiler", profiler)
+    generate = library_excel.generate_schedule_data
+
+    def slow_generate_schedule_data(*args, **kwargs):
+        # Long enough for the sampler to catch this frame.
+        time.sleep(0.05)
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(library_excel, "generate_schedule_data", slow_generate_schedule_data)
+    return profiler
+
+
+def generate(client, schedule, **headers):
+    return client.post("/generate-timesheet?format=json", headers=headers,
+                       json={"schedule": schedule, "date": "2026-10-18", "seed": 7})
+
+
+def saved_ids(directory):
+    files = os.listdir(directory)
+    ids = sorted({name.rsplit(".", 1)[0] for name in files})
+    assert sorted(files) == sorted(i + ext for i in ids
+                                   for ext in (".collapsed", ".json", ".pstats"))
+    return ids
+
+
+def test_only_the_newest_profiles_are_kept(client, schedule, profiler):
+    profile_ids = []
+    for _ in range(4):
+        response = generate(client, schedule, **{"X-Profile": "secret"})
+        assert response.status_code == 200
+        profile_ids.append(response.headers["X-Profile-Id"])
+    assert profile_ids == sorted(profile_ids)
+    assert saved_ids(profiler.directory) == profile_ids[-2:]
+
+
+def test_profile_files_have_the_documented_formats(client, schedule, profiler):
+    response = generate(client, schedule, **{"X-Profile": "secret"})
+    base = os.path.join(profiler.directory, response.headers["X-Profile-Id"])
+
+    stats = pstats.Stats(base + ".pstats")
+    profiled = {(os.path.basename(filename), function)
+                for filename, _, function in stats.stats}
+    assert ("library_excel.py", "generate_timesheet") in profiled
+    assert ("library_excel.py", "greedy_assign_hours") in profiled
+
+    with open(base + ".collapsed", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines
+    assert all(COLLAPSED_LINE.match(line) for line in lines), lines
+    assert any("slow_generate_schedule_data (test_request_profiler.py:" in line
+               for line in lines)
+
+    with open(base + ".json", encoding="utf-8") as f:
+        details = json.load(f)
+    assert details["id"] == response.headers["X-Profile-Id"]
+    assert (details["method"], details["path"], details["status"]) == (
+        "POST", "/generate-timesheet", 200)
+    assert details["roster_size"] == len(schedule)
+    assert "assign" in details["stage_ms"]
+    assert details["samples"] == sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+    assert details["sample_interval"] == 0.001
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Profile": "wrong"}])
+def test_requests_without_the_token_are_not_profiled(client, schedule, profiler, headers):
+    response = generate(client, schedule, **headers)
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert not os.path.exists(profiler.directory)
+
+
+def test_disabled_profiler_ignores_the_header(client, schedule, profiler):
+    profiler.enabled = False
+    response = generate(client, schedule, **{"X-Profile": "secret"})
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_second_request_is_served_unprofiled_while_one_runs(client, schedule, profiler):
+    running = profiler.start()
+    try:
+        response = generate(client, schedule, **{"X-Profile": "secret"})
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+    finally:
+        profiler.finish(running, {})
+    assert saved_ids(profiler.directory) == [running.id]
+    assert "X-Profile-Id" in generate(client, schedule, **{"X-Profile": "secret"}).headers
@@ -0,0 +1,55 @@
+import sqlite3
+import time
+
+
+def names(response):
+    return [row["name"] for row in response.get_json()]
+
+
+def test_write_from_another_worker_is_not_served_stale(client, app_module):
+    assert client.post("/staff", json={"name": "Ada", "role": "Scale 3"}).status_code == 201
+    first = client.get("/staff")
+    assert names(first) == ["Ada"]
+
+    # Another process commits a write; this worker's caches never hear of it.
+    other = sqlite3.connect(app_module.SQLITE_PATH)
+    other.execute("INSERT INTO staff (name, role) VALUES ('Bea', 'Volunteer')")
+    other.execute("UPDATE table_revisions SET revision = revision + 1, updated_at = ? "
+                  "WHERE table_name = 'staff'", (time.time(),))
+    other.commit()
+    other.close()
+    # As if REVISION_CACHE_TTL had run out.
+    app_module._revision_cache.clear()
+
+    second = client.get("/staff")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert sorted(names(second)) == ["Ada", "Bea"]
+
+
+def test_unchanged_revision_is_served_from_cache(client, app_module):
+    client.post("/staff", json={"name": "Ada", "role": "Scale 3"})
+    client.get("/staff")
+    hits = app_module.roster_cache.stats()["hits"]
+    etag = client.get("/staff").headers["ETag"]
+    assert app_module.roster_cache.stats()["hits"] == hits + 1
+    assert client.get("/staff", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_local_write_invalidates(client):
+    client.post("/staff", json={"name": "Ada", "role": "Scale 3"})
+    assert names(client.get("/staff")) == ["Ada"]
+    client.post("/staff", json={"name": "Bea", "role": "Volunteer"})
+    assert sorted(names(client.get("/staff"))) == ["Ada", "Bea"]
+
+
+def test_write_in_the_same_second_is_not_a_304(client, monkeypatch):
+    # Every read and write below lands in the same wall-clock second.
+    monkeypatch.setattr(time, "time", lambda: 1_800_000_000.25)
+    first = client.get("/profiles")
+    assert client.post("/profiles", json={"name": "Ada", "role": "Scale 3"}).status_code == 201
+    since = {"If-Modified-Since": first.headers["Last-Modified"]}
+    second = client.get("/profiles", headers=since)
+    assert second.status_code == 200
+    assert names(second) == ["Ada"]
+    assert client.get("/profiles", headers={
+        "If-Modified-Since": second.headers["Last-Modified"]}).status_code == 304
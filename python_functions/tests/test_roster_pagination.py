@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+NAMES = ["Ada", "Bea", "Cal", "Dee", "Eve"]
+
+
+@pytest.fixture
+def roster(client):
+    for name in NAMES:
+        assert client.post("/staff", json={"name": name, "role": "Scale 3"}).status_code == 201
+    return client
+
+
+def ndjson_names(response):
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line)["name"] for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize("query,headers", [
+    ({"format": "ndjson"}, {}),
+    ({}, {"Accept": "application/x-ndjson"}),
+])
+def test_ndjson_pages_match_json_pages(roster, query, headers):
+    pages, after = [], None
+    while True:
+        args = dict(query, limit=2)
+        if after:
+            args["after"] = after
+        response = roster.get("/staff", query_string=args, headers=headers)
+        pages.append(ndjson_names(response))
+        after = response.headers.get("X-Next-After")
+        if after is None:
+            break
+        assert after == pages[-1][-1]
+    assert pages == [["Ada", "Bea"], ["Cal", "Dee"], ["Eve"]]
+
+
+def test_json_pages(roster):
+    response = roster.get("/staff?limit=2&after=Bea")
+    assert [row["name"] for row in response.get_json()] == ["Cal", "Dee"]
+    assert response.headers["X-Next-After"] == "Dee"
+
+
+def test_unpaginated_ndjson_streams_every_row(roster):
+    response = roster.get("/staff?format=ndjson")
+    assert sorted(ndjson_names(response)) == NAMES
+    assert "X-Next-After" not in response.headers
+
+
+def test_ndjson_after_without_limit(roster):
+    assert ndjson_names(roster.get("/staff?format=ndjson&after=Cal")) == ["Dee", "Eve"]
+
+
+@pytest.fixture
+def profiles(client):
+    for name, role, start, end in [("Ada", "Scale 3", 12, 16), ("Bea", "Volunteer", 12, 14),
+                                   ("Cal", "Scale 3", 9, 12), ("Dee", "Scale 3", 13, 17),
+                                   ("Eve", "Scale 3", 14, 18), ("Fay", "Scale 3", 11, 15)]:
+        assert client.post("/profiles", json={
+            "name": name, "role": role, "status": "Available",
+            "start_hour": start, "end_hour": end}).status_code == 201
+    return client
+
+
+@pytest.mark.parametrize("arg", ["shift_from", "shift_to"])
+@pytest.mark.parametrize("value", ["abc", "nan", "25", "-1"])
+def test_bad_shift_window_is_rejected(profiles, arg, value):
+    response = profiles.get("/profiles", query_string={arg: value})
+    assert response.status_code == 400
+    assert arg in response.get_json()["error"]
+
+
+def test_filtered_ndjson_pages(profiles):
+    # Scale 3 on shift at some point between 12:00 and 15:00: Ada, Dee, Eve, Fay.
+    pages, after = [], None
+    while True:
+        args = {"role": "Scale 3", "shift_from": 12, "shift_to": 15,
+                "format": "ndjson", "limit": 3}
+        if after:
+            args["after"] = after
+        response = profiles.get("/profiles", query_string=args)
+        assert response.status_code == 200
+        pages.append(ndjson_names(response))
+        after = response.headers.get("X-Next-After")
+        if after is None:
+            break
+    assert pages == [["Ada", "Dee", "Eve"], ["Fay"]]
+    response = profiles.get("/profiles", query_string={
+        "role": "Scale 3", "shift_from": 12, "shift_to": 15, "after": "Dee", "format": "ndjson"})
+    assert ndjson_names(response) == ["Eve", "Fay"]
@@ -0,0 +1,69 @@
+import pytest
+
+DATE = "2026-10-18"
+
+
+def preview(client, schedule, **extra):
+    return client.post("/generate-timesheet?format=json",
+                       json=dict({"schedule": schedule, "date": DATE}, **extra))
+
+
+@pytest.mark.parametrize("seed", [-1, 2 ** 48, 2 ** 63, 2 ** 64, 1.5, "7", True])
+def test_out_of_range_seed_is_rejected(client, schedule, seed):
+    response = preview(client, schedule, seed=seed, save=True)
+    assert response.status_code == 400
+    assert "seed" in response.get_json()["error"]
+    assert client.get("/schedules").get_json() == []
+
+
+@pytest.mark.parametrize("seed", [0, 2 ** 48 - 1])
+def test_seed_bounds_are_accepted_and_stored(client, schedule, seed):
+    response = preview(client, schedule, seed=seed, save=True)
+    assert response.status_code == 200
+    assert response.get_json()["seed"] == seed
+    stored = client.get(f"/schedules/{response.headers['X-Schedule-Id']}").get_json()
+    assert stored["seed"] == seed
+
+
+def test_derived_seed_is_stable_and_in_range(client, schedule):
+    first = preview(client, schedule).get_json()["seed"]
+    assert 0 <= first < 2 ** 48
+    assert preview(client, schedule).get_json()["seed"] == first
+
+
+def test_time_limited_schedule_does_not_promise_its_seed(client, schedule, truncating_clock):
+    response = preview(client, schedule, seed=7, engine="optimal")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["truncated"] is True and body["seed"] is None
+    assert response.headers["X-Schedule-Truncated"] == "1"
+    assert "X-Schedule-Seed" not in response.headers
+
+
+def test_time_limited_schedule_is_stored_without_seed(client, schedule, truncating_clock):
+    response = client.post("/generate-timesheet", json={
+        "schedule": schedule, "date": DATE, "seed": 7, "engine": "optimal", "save": True})
+    assert response.status_code == 200
+    assert "X-Schedule-Seed" not in response.headers
+    stored_id = response.headers["X-Schedule-Id"]
+    assert client.get(f"/schedules/{stored_id}").get_json()["seed"] is None
+    csv = client.get(f"/schedules/{stored_id}?format=csv")
+    assert csv.headers["X-Schedule-Truncated"] == "1"
+    assert "X-Schedule-Seed" not in csv.headers
+
+
+def test_time_limited_batch_does_not_promise_its_seed(client, schedule, truncating_clock):
+    response = client.post("/generate-timesheet/batch", json={
+        "days": [{"date": DATE, "schedule": schedule},
+                 {"date": "2026-10-19", "schedule": schedule}],
+        "seed": 7, "engine": "optimal"})
+    assert response.status_code == 200
+    assert response.headers["X-Schedule-Truncated"] == "1"
+    assert "X-Schedule-Seed" not in response.headers
+
+
+def test_batch_within_time_limit_sends_its_seed(client, schedule):
+    response = client.post("/generate-timesheet/batch", json={
+        "days": [{"date": DATE, "schedule": schedule}], "seed": 7, "engine": "optimal"})
+    assert response.headers["X-Schedule-Seed"] == "7"
+    assert "X-Schedule-Truncated" not in response.headers
@@ -0,0 +1,58 @@
+import sqlite3
+
+from schema_migrations import LATEST_VERSION, MIGRATIONS, migrate
+
+# The schema init_db created before migrations existed, with some data in it.
+LEGACY_SCHEMA = """
+CREATE TABLE staff (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, role TEXT NOT NULL);
+CREATE TABLE profiles (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, role TEXT NOT NULL,
+                       status TEXT, status_detail TEXT, start_hour REAL, end_hour REAL,
+                       tea_slot TEXT);
+CREATE TABLE table_revisions (table_name TEXT PRIMARY KEY, revision INTEGER NOT NULL,
+                              updated_at REAL NOT NULL);
+INSERT INTO table_revisions VALUES ('staff', 7, 0), ('profiles', 3, 0);
+INSERT INTO staff (name, role) VALUES ('Ann', 'Scale 3'), ('Bob', 'Volunteer');
+INSERT INTO profiles (name, role, status) VALUES ('Ann', 'Scale 3', 'Available'),
+                                                 ('Cat', 'Volunteer', 'Available');
+"""
+
+
+def legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.commit()
+    return conn
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    conn = legacy_db(tmp_path / "legacy.db")
+    assert migrate(conn, postgres=False) == [version for version, _, _ in MIGRATIONS]
+
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_migrations")]
+    assert sorted(versions) == list(range(1, LATEST_VERSION + 1))
+    assert conn.execute("SELECT name, role FROM staff ORDER BY name").fetchall() == [
+        ("Ann", "Scale 3"), ("Bob", "Volunteer")]
+    # Existing revisions are kept; the baseline only adds missing tables.
+    assert dict(conn.execute("SELECT table_name, revision FROM table_revisions")) == {
+        "staff": 7, "profiles": 3, "timesheet_templates": 1}
+    ann_id = conn.execute("SELECT id FROM staff WHERE name = 'Ann'").fetchone()[0]
+    assert dict(conn.execute("SELECT name, staff_id FROM profiles")) == {"Ann": ann_id, "Cat": None}
+    for table in ("schedules", "schedule_staff", "schedule_assignments", "timesheet_templates"):
+        conn.execute(f"SELECT * FROM {table}")
+
+    assert migrate(conn, postgres=False) == []
+    conn.close()
+
+
+def test_app_upgrades_legacy_database_on_first_request(client, app_module):
+    legacy_db(app_module.SQLITE_PATH).close()
+    assert sorted(row["name"] for row in client.get("/profiles").get_json()) == ["Ann", "Cat"]
+
+    # A new staff row links the matching profile; deleting it unlinks again.
+    assert client.post("/staff", json={"name": "Cat", "role": "Volunteer"}).status_code == 201
+    check = sqlite3.connect(app_module.SQLITE_PATH)
+    cat_id = check.execute("SELECT id FROM staff WHERE name = 'Cat'").fetchone()[0]
+    assert check.execute("SELECT staff_id FROM profiles WHERE name = 'Cat'").fetchone() == (cat_id,)
+    assert client.delete("/staff/Cat").status_code == 200
+    assert check.execute("SELECT staff_id FROM profiles WHERE name = 'Cat'").fetchone() == (None,)
+    check.close()
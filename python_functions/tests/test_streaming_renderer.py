@@ -0,0 +1,61 @@
+import io
+import random
+
+from openpyxl import load_workbook
+
+import library_excel
+
+DATE = "2026-10-18"
+
+
+def roster(schedule):
+    extra = [
+        {"name": "Amina", "role": "Scale 3", "status": "Sick",
+         "status_detail": "Back Tuesday", "start_hour": 12, "end_hour": 16},
+        {"name": "Bola", "role": "Scale 3", "status": "Annual Leave",
+         "start_hour": 12, "end_hour": 16},
+        {"name": "Chen", "role": "Scale 3", "status": "Training",
+         "status_detail": "Induction", "start_hour": 13, "end_hour": 15},
+        {"name": "Dee", "role": "Volunteer", "status": "Available",
+         "start_hour": 12, "end_hour": 15},
+    ]
+    return schedule + extra
+
+
+def workbook(grid, staff_data, renderer):
+    _, xlsx_bytes = library_excel.render_workbook_bytes(grid, staff_data, DATE, renderer)
+    return load_workbook(io.BytesIO(xlsx_bytes))["Timesheet"]
+
+
+def style(cell):
+    font, fill, border, alignment = cell.font, cell.fill, cell.border, cell.alignment
+    return (
+        (font.name, font.sz, font.b, font.i, font.color and font.color.rgb),
+        (fill.fill_type, fill.fgColor.rgb, fill.bgColor.rgb),
+        tuple((side.style, side.color and side.color.rgb)
+              for side in (border.left, border.right, border.top, border.bottom)),
+        (alignment.horizontal, alignment.vertical, alignment.wrap_text),
+    )
+
+
+def test_streaming_renderer_matches_openpyxl(schedule):
+    staff_data = roster(schedule)
+    grid = library_excel.generate_schedule_data(staff_data, DATE, rng=random.Random(5))
+    styled = workbook(grid, staff_data, "openpyxl")
+    streamed = workbook(grid, staff_data, "streaming")
+
+    assert styled.max_row == streamed.max_row
+    assert styled.max_column == streamed.max_column
+    for row in range(1, styled.max_row + 1):
+        for column in range(1, styled.max_column + 1):
+            a, b = styled.cell(row, column), streamed.cell(row, column)
+            assert a.value == b.value, a.coordinate
+            assert style(a) == style(b), a.coordinate
+
+    assert sorted(map(str, styled.merged_cells.ranges)) == sorted(
+        map(str, streamed.merged_cells.ranges))
+    widths = {letter: dim.width for letter, dim in styled.column_dimensions.items()}
+    assert widths == {letter: dim.width for letter, dim in streamed.column_dimensions.items()}
+    # Every status the renderers treat differently is on the sheet.
+    values = {cell.value for row in styled.iter_rows() for cell in row}
+    assert {"A/L", "Volunteer", "SICK", "Induction"} <= values
@@ -0,0 +1,130 @@
+import copy
+import os
+from datetime import date
+
+import pytest
+
+import library_excel
+from timesheet_cache import DiskTimesheetBackend, MemoryTimesheetBackend, TimesheetCache
+from timesheet_templates import compile_template
+
+DATE = date(2026, 10, 18)
+
+
+def default_spec(**changes):
+    spec = copy.deepcopy(library_excel.DEFAULT_TEMPLATE.spec)
+    spec.update(changes)
+    return spec
+
+
+def key(schedule, seed=7, template=library_excel.DEFAULT_TEMPLATE, **kwargs):
+    args = dict(staff_data=schedule, date_obj=DATE, renderer="openpyxl", seed=seed,
+                engine="greedy", template=template)
+    args.update(kwargs)
+    return library_excel.timesheet_cache_key(**args)
+
+
+def test_key_is_stable_for_the_same_input(schedule):
+    assert key(schedule) == key(copy.deepcopy(schedule))
+    rebuilt = compile_template(default_spec(), library_excel.COLUMN_WIDTHS)
+    assert key(schedule, template=rebuilt) == key(schedule)
+
+
+@pytest.mark.parametrize("change", [
+    {"seed": 8},
+    {"date_obj": date(2026, 10, 19)},
+    {"renderer": "streaming"},
+    {"engine": "optimal"},
+])
+def test_key_changes_with_request_inputs(schedule, change):
+    assert key(schedule, **change) != key(schedule)
+
+
+def test_key_changes_with_the_roster(schedule):
+    changed = copy.deepcopy(schedule)
+    changed[0]["end_hour"] = 15
+    assert key(changed) != key(schedule)
+
+
+def test_key_changes_with_task_config(schedule):
+    tasks = copy.deepcopy(library_excel.TASK_CONFIG)
+    tasks["Res"]["roles"] = ["Scale 3"]
+    edited = compile_template(default_spec(tasks=tasks), library_excel.COLUMN_WIDTHS)
+    assert key(schedule, template=edited) != key(schedule)
+
+
+def test_key_changes_with_the_template(schedule):
+    for spec in (default_spec(title="Canada Water Library Saturday"),
+                 default_spec(mandatory_c_coverage=1),
+                 default_spec(id="saturday")):
+        template = compile_template(spec, library_excel.COLUMN_WIDTHS)
+        assert key(schedule, template=template) != key(schedule)
+
+
+def test_key_changes_with_break_settings(schedule, monkeypatch):
+    before = key(schedule)
+    monkeypatch.setattr(library_excel, "BREAK_PREFERENCES", {"Kyle": "13:30"})
+    assert key(schedule) != before
+
+
+@pytest.fixture(params=["memory", "disk"])
+def backend(request, tmp_path):
+    # Room for two 100-byte entries.
+    if request.param == "memory":
+        return MemoryTimesheetBackend(max_bytes=250, max_age=3600)
+    return DiskTimesheetBackend(str(tmp_path / "cache"), max_bytes=250, max_age=3600)
+
+
+def age_entries(backend, *keys):
+    """Backdates disk entries' access times so a later read is strictly newer."""
+    if isinstance(backend, DiskTimesheetBackend):
+        for i, name in enumerate(keys):
+            os.utime(backend._path(name), (1000 + i, os.stat(backend._path(name)).st_mtime))
+
+
+def test_least_recently_used_entry_is_evicted(backend):
+    cache = TimesheetCache(backend)
+    cache.set("a", b"a" * 100)
+    cache.set("b", b"b" * 100)
+    age_entries(backend, "a", "b")
+    assert cache.get("a") == b"a" * 100
+
+    cache.set("c", b"c" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 100
+    assert cache.get("c") == b"c" * 100
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, 200)
+    assert (stats["stores"], stats["evictions"]) == (3, 1)
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+
+def test_oversized_entry_is_not_stored(backend):
+    cache = TimesheetCache(backend)
+    cache.set("a", b"a" * 100)
+    cache.set("big", b"x" * 251)
+    assert cache.get("big") is None
+    assert cache.get("a") == b"a" * 100
+
+
+def test_expired_entry_is_a_miss(backend, monkeypatch):
+    cache = TimesheetCache(backend)
+    cache.set("a", b"a" * 100)
+    monkeypatch.setattr(backend, "max_age", 0)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+    assert backend.entries() == (0, 0)
+
+
+def test_repeat_request_is_served_from_the_cache(client, schedule, monkeypatch, tmp_path):
+    cache = TimesheetCache(DiskTimesheetBackend(str(tmp_path / "cache"), 1 << 20, 3600))
+    monkeypatch.setattr(library_excel, "timesheet_cache", cache)
+    payload = {"schedule": schedule, "date": "2026-10-18", "seed": 7}
+
+    first = client.post("/generate-timesheet", json=payload)
+    second = client.post("/generate-timesheet", json=payload)
+    other_seed = client.post("/generate-timesheet", json=dict(payload, seed=8))
+    assert [r.headers["X-Timesheet-Cache"] for r in (first, second, other_seed)] == [
+        "MISS", "HIT", "MISS"]
+    assert second.data == first.data
+    assert cache.stats()["entries"] == 2
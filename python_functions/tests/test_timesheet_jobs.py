@@ -0,0 +1,94 @@
+import os
+import time
+
+import pytest
+
+from timesheet_jobs import JobQueue, JobStore
+
+DATE = "2026-10-18"
+
+
+@pytest.fixture
+def make_job_queue(app_module, tmp_path, monkeypatch):
+    """Installs a fresh job queue in tmp_path as the app's and returns it."""
+    def make(workers=1, max_depth=4, ttl=60):
+        queue = JobQueue(JobStore(str(tmp_path / "jobs"), ttl), workers, max_depth)
+        monkeypatch.setattr(app_module, "job_queue", queue)
+        return queue
+    return make
+
+
+def wait_for(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/jobs/{job_id}").get_json()
+        if body["status"] in ("done", "failed"):
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def submit(client, schedule, **extra):
+    return client.post("/jobs/timesheet",
+                       json=dict({"schedule": schedule, "date": DATE, "seed": 3}, **extra))
+
+
+def test_submit_poll_and_fetch_result(client, schedule, make_job_queue):
+    make_job_queue()
+    response = submit(client, schedule)
+    assert response.status_code == 202
+    job_id = response.get_json()["id"]
+    assert response.headers["Location"].endswith(f"/jobs/{job_id}")
+    assert response.get_json()["status"] in ("queued", "running", "done")
+
+    body = wait_for(client, job_id)
+    assert body["status"] == "done" and body["seed"] == 3
+    assert body["result_url"] == f"/jobs/{job_id}/result"
+
+    result = client.get(body["result_url"])
+    assert result.status_code == 200
+    assert result.mimetype == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    assert result.data[:2] == b"PK" and len(result.data) == body["size"]
+    assert "Timesheet_Sunday, 18 October 2026.xlsx" in result.headers["Content-Disposition"]
+
+
+def test_time_limited_job_drops_its_seed(client, schedule, make_job_queue, truncating_clock):
+    make_job_queue()
+    job_id = submit(client, schedule, engine="optimal").get_json()["id"]
+    body = wait_for(client, job_id)
+    assert body["status"] == "done"
+    assert body["truncated"] is True and body["seed"] is None
+
+
+def test_full_queue_is_a_429_with_retry_after(client, schedule, make_job_queue, app_module):
+    # No workers, so the first job stays queued and fills the queue.
+    queue = make_job_queue(workers=0, max_depth=1)
+    assert submit(client, schedule).status_code == 202
+    response = submit(client, schedule)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == str(app_module.JOB_RETRY_AFTER_SECONDS)
+    assert queue.store.counts() == {"queued": 1}
+
+
+def test_expired_job_is_a_404(client, schedule, make_job_queue):
+    queue = make_job_queue()
+    job_id = submit(client, schedule).get_json()["id"]
+    wait_for(client, job_id)
+    path = queue.store.result_path(job_id)
+    assert os.path.exists(path)
+
+    queue.store.ttl = 0
+    for url in (f"/jobs/{job_id}", f"/jobs/{job_id}/result"):
+        response = client.get(url)
+        assert response.status_code == 404
+        assert response.get_json() == {"error": "Job not found or expired."}
+    assert not os.path.exists(path)
+
+
+def test_result_evicted_after_status_check_is_a_404(client, app_module, monkeypatch):
+    done = {"id": "gone", "status": "done", "error": None,
+            "mimetype": app_module.XLSX_MIMETYPE, "filename": "Timesheet.xlsx"}
+    monkeypatch.setattr(app_module.job_queue.store, "get", lambda job_id: done)
+    response = client.get("/jobs/gone/result")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "Job not found or expired."}
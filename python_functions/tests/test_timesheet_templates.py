@@ -0,0 +1,18 @@
+import library_excel
+from timesheet_templates import TemplateCache
+
+
+def test_unknown_ids_are_not_cached():
+    cache = TemplateCache(library_excel.COLUMN_WIDTHS)
+    for n in range(50):
+        assert cache.get(f"made-up-{n}", 1, lambda: None) is None
+    assert cache.stats() == {"entries": 0, "compiles": 0}
+
+
+def test_deleted_template_is_dropped():
+    cache = TemplateCache(library_excel.COLUMN_WIDTHS)
+    spec = dict(library_excel.DEFAULT_TEMPLATE.spec, id="branch")
+    assert cache.get("branch", 1, lambda: spec).id == "branch"
+    assert cache.get("branch", 1, lambda: None).id == "branch"
+    assert cache.get("branch", 2, lambda: None) is None
+    assert cache.stats() == {"entries": 0, "compiles": 1}
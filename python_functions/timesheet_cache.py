@@ -0,0 +1,201 @@
+"""Content-addressed cache of rendered timesheet workbooks.
+
+Entries are keyed by a hash of everything that decides the output (see
+library_excel.timesheet_cache_key), so a hit can be served without
+scheduling or rendering. Both backends evict least recently used entries
+once the total size passes `max_bytes`, and drop entries older than
+`max_age` seconds. The memory backend is private to one worker; the disk
+backend keeps one file per entry so every worker on the host shares it.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryTimesheetBackend:
+    """Per-process LRU of workbook bytes bounded by total size."""
+
+    def __init__(self, max_bytes, max_age):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (value or None, evicted) where evicted counts expired entries dropped."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, 0
+            created_at, value = entry
+            if created_at + self.max_age <= time.time():
+                del self._entries[key]
+                self._size -= len(value)
+                return None, 1
+            self._entries.move_to_end(key)
+            return value, 0
+
+    def set(self, key, value):
+        """Stores value and returns how many entries were evicted to make room."""
+        if len(value) > self.max_bytes:
+            return 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (time.time(), value)
+            self._size += len(value)
+            evicted = 0
+            while self._size > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._size -= len(dropped)
+                evicted += 1
+            return evicted
+
+    def entries(self):
+        with self._lock:
+            return len(self._entries), self._size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskTimesheetBackend:
+    """One file per entry under `directory`; mtime is the age, atime the recency."""
+
+    suffix = ".xlsx"
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            created_at = os.stat(path).st_mtime
+            now = time.time()
+            if created_at + self.max_age <= now:
+                os.remove(path)
+                return None, 1
+            with open(path, "rb") as f:
+                value = f.read()
+            # Record the access explicitly; many filesystems mount with noatime.
+            os.utime(path, (now, created_at))
+            return value, 0
+        except FileNotFoundError:
+            return None, 0
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            return self._evict()
+
+    def _scan(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_atime, st.st_size, entry.path))
+        return files
+
+    def _evict(self):
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return evicted
+
+    def entries(self):
+        files = self._scan()
+        return len(files), sum(size for _, size, _ in files)
+
+    def clear(self):
+        for _, _, path in self._scan():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class TimesheetCache:
+    """Looks up rendered workbooks by content hash and counts hits and misses."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.enabled = backend is not None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._lock:
+                self._counters[name] += amount
+
+    def get(self, key):
+        """Returns the cached bytes for key, or None on a miss (or when disabled)."""
+        if not self.enabled:
+            return None
+        value, evicted = self.backend.get(key)
+        self._count("evictions", evicted)
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        self._count("stores")
+        self._count("evictions", self.backend.set(key, value))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["backend"] = type(self.backend).__name__ if self.enabled else None
+        if self.enabled:
+            stats["entries"], stats["bytes"] = self.backend.entries()
+            stats["max_bytes"] = self.backend.max_bytes
+            stats["max_age"] = self.backend.max_age
+        return stats
+
+
+def timesheet_cache_from_env(default_dir):
+    """Builds the process-wide TimesheetCache from TIMESHEET_CACHE_* environment variables."""
+    backend_name = os.environ.get("TIMESHEET_CACHE_BACKEND", "memory").lower()
+    max_bytes = int(os.environ.get("TIMESHEET_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    max_age = float(os.environ.get("TIMESHEET_CACHE_MAX_AGE", 3600))
+
+    if backend_name == "off":
+        return TimesheetCache(None)
+    if backend_name == "disk":
+        directory = os.environ.get("TIMESHEET_CACHE_DIR") or os.path.join(
+            default_dir, "timesheet_cache")
+        return TimesheetCache(DiskTimesheetBackend(directory, max_bytes, max_age))
+    return TimesheetCache(MemoryTimesheetBackend(max_bytes, max_age))
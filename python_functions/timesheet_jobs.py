@@ -0,0 +1,213 @@
+"""Background timesheet jobs: a bounded queue, worker threads and a job store.
+
+POST /jobs/timesheet validates a payload, records a job and queues the
+work; a worker thread later schedules and renders it while the request has
+long returned. Job rows live in a SQLite file and results as files beside
+it, so every worker process on the host can report on and serve any job
+(a stand-in for a shared database and object store). Finished jobs and
+their results are dropped `ttl` seconds after they finish.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+
+class JobQueueFull(Exception):
+    """Raised by JobQueue.submit when `max_depth` jobs are already waiting."""
+
+
+class JobStore:
+    """Job rows in `<directory>/jobs.db`, results in `<directory>/<id>.result`."""
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _conn(self):
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    os.makedirs(self.directory, exist_ok=True)
+                    conn = self._connect()
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS jobs (
+                            id TEXT PRIMARY KEY,
+                            kind TEXT NOT NULL,
+                            status TEXT NOT NULL,
+                            seed INTEGER,
+                            created_at REAL NOT NULL,
+                            started_at REAL,
+                            finished_at REAL,
+                            filename TEXT,
+                            mimetype TEXT,
+                            size INTEGER,
+                            error TEXT,
+                            truncated INTEGER NOT NULL DEFAULT 0
+                        )
+                    ''')
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+                    if "truncated" not in columns:
+                        # A job store left by an older version of this module.
+                        conn.execute(
+                            "ALTER TABLE jobs ADD COLUMN truncated INTEGER NOT NULL DEFAULT 0")
+                    conn.execute(
+                        "CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+                    conn.commit()
+                    self._ready = True
+        return self._connect()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "jobs.db"), timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def result_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.result")
+
+    def create(self, kind, seed):
+        job_id = uuid.uuid4().hex
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO jobs (id, kind, status, seed, created_at) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, kind, seed, time.time()))
+        conn.commit()
+        return job_id
+
+    def delete(self, job_id):
+        conn = self._conn()
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        conn.commit()
+        try:
+            os.remove(self.result_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def start(self, job_id):
+        conn = self._conn()
+        conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                     (time.time(), job_id))
+        conn.commit()
+
+    def finish(self, job_id, filename, mimetype, data, truncated=False):
+        """Stores a job's result; a truncated one loses its seed, which would not give it again."""
+        # Write then rename, so a reader never sees half a result.
+        path = self.result_path(job_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        conn = self._conn()
+        conn.execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, filename = ?, mimetype = ?, "
+            "size = ?, truncated = ?, seed = CASE WHEN ? THEN NULL ELSE seed END WHERE id = ?",
+            (time.time(), filename, mimetype, len(data), int(truncated), int(truncated), job_id))
+        conn.commit()
+
+    def fail(self, job_id, error):
+        conn = self._conn()
+        conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                     (time.time(), error, job_id))
+        conn.commit()
+
+    def get(self, job_id):
+        """The job as a dict with its timings, or None if unknown or expired."""
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if job["finished_at"] is not None and job["finished_at"] + self.ttl <= time.time():
+            self.delete(job_id)
+            return None
+        job["wait_seconds"] = round(
+            (job["started_at"] or time.time()) - job["created_at"], 4)
+        job["run_seconds"] = None if job["started_at"] is None else round(
+            (job["finished_at"] or time.time()) - job["started_at"], 4)
+        job["expires_at"] = None if job["finished_at"] is None else job["finished_at"] + self.ttl
+        return job
+
+    def evict_expired(self):
+        """Drops finished jobs older than ttl and their results; returns how many."""
+        conn = self._conn()
+        expired = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?",
+            (time.time() - self.ttl,))]
+        for job_id in expired:
+            self.delete(job_id)
+        return len(expired)
+
+    def counts(self):
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+
+class JobQueue:
+    """At most `max_depth` waiting jobs, run by `workers` daemon threads."""
+
+    def __init__(self, store, workers=2, max_depth=16):
+        self.store = store
+        self.workers = workers
+        self.max_depth = max_depth
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name=f"timesheet-job-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, seed, run):
+        """Records a job and queues `run()`, which returns (filename, mimetype, bytes, truncated).
+
+        Returns the job id; raises JobQueueFull when the queue is at max_depth.
+        """
+        self.store.evict_expired()
+        job_id = self.store.create(kind, seed)
+        try:
+            self._queue.put_nowait((job_id, run))
+        except queue.Full:
+            self.store.delete(job_id)
+            raise JobQueueFull()
+        self._ensure_workers()
+        return job_id
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job_id, run = self._queue.get()
+            try:
+                self.store.start(job_id)
+                filename, mimetype, data, truncated = run()
+                self.store.finish(job_id, filename, mimetype, data, truncated)
+            except Exception as e:
+                print(f"Timesheet job {job_id} failed: {e}")
+                traceback.print_exc()
+                self.store.fail(job_id, str(e))
+            finally:
+                self._queue.task_done()
+
+
+def job_queue_from_env(default_dir):
+    """Builds the process-wide JobQueue from TIMESHEET_JOB_* environment variables."""
+    directory = os.environ.get("TIMESHEET_JOB_DIR") or os.path.join(default_dir, "timesheet_jobs")
+    ttl = float(os.environ.get("TIMESHEET_JOB_TTL", 3600))
+    workers = int(os.environ.get("TIMESHEET_JOB_WORKERS", 2))
+    max_depth = int(os.environ.get("TIMESHEET_JOB_QUEUE_DEPTH", 16))
+    return JobQueue(JobStore(directory, ttl), workers, max_depth)
@@ -0,0 +1,174 @@
+"""Branch and day-type timesheet templates.
+
+A template spec is plain JSON: the sheet title, column widths, the task
+table (TASK_CONFIG's shape), role priority and how many C desks must be
+covered. compile_template() turns it into a TimesheetTemplate once, with
+every lookup the scheduler and renderers need already worked out, so a
+request only picks one by id. Templates come from the built-in default,
+JSON files in a directory, or the timesheet_templates table.
+"""
+import hashlib
+import json
+import os
+import threading
+from types import MappingProxyType
+
+# Codes the scheduler hands out by name; every template must define them.
+REQUIRED_TASKS = ("SM", "R", "C", "C+", "Set Up", "T")
+# Never handed out as an hour's random task.
+FIXED_TASKS = frozenset(REQUIRED_TASKS)
+COLUMN_LETTERS = "ABCDEFGHIJK"
+SPEC_KEYS = {"id", "title", "column_widths", "tasks", "role_priority",
+             "mandatory_c_coverage"}
+
+
+class TimesheetTemplate:
+    """A compiled, read-only template. Build with compile_template()."""
+    __slots__ = ("id", "title", "column_widths", "task_config", "task_code_map",
+                 "display_to_task", "role_priority", "mandatory_c_coverage",
+                 "mandatory_tasks", "random_tasks", "random_tasks_by_role",
+                 "min_headcount", "fingerprint", "spec")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TimesheetTemplate is read-only.")
+
+    def __reduce__(self):
+        # Rebuilt from its spec when a render pool worker unpickles a grid.
+        return compile_template, (self.spec, dict(self.column_widths))
+
+    def __repr__(self):
+        return f"TimesheetTemplate({self.id!r})"
+
+
+def _set(template, **values):
+    for name, value in values.items():
+        object.__setattr__(template, name, value)
+
+
+def compile_template(spec, default_widths=None):
+    """Validates a template spec and precomputes its lookups; raises ValueError."""
+    if not isinstance(spec, dict):
+        raise ValueError("A template must be a JSON object.")
+    unknown = set(spec) - SPEC_KEYS
+    if unknown:
+        raise ValueError(f"Unknown template keys: {', '.join(sorted(unknown))}.")
+    template_id = spec.get("id")
+    if not isinstance(template_id, str) or not template_id:
+        raise ValueError("A template needs a non-empty string 'id'.")
+
+    tasks = spec.get("tasks")
+    if not isinstance(tasks, dict):
+        raise ValueError("'tasks' must map task codes to {roles, mandatory, full_name}.")
+    missing = [code for code in REQUIRED_TASKS if code not in tasks]
+    if missing:
+        raise ValueError(f"'tasks' must define: {', '.join(missing)}.")
+    task_config = {}
+    for code, task in tasks.items():
+        if (not isinstance(task, dict) or not isinstance(task.get("roles"), list)
+                or not isinstance(task.get("full_name"), str)):
+            raise ValueError(f"Task {code!r} needs a 'roles' list and a 'full_name'.")
+        task_config[code] = MappingProxyType({
+            "roles": tuple(task["roles"]), "mandatory": int(task.get("mandatory", 0)),
+            "full_name": task["full_name"]})
+    display_names = [task["full_name"] for task in task_config.values()]
+    if len(set(display_names)) != len(display_names):
+        raise ValueError("Every task needs its own 'full_name'.")
+
+    role_priority = spec.get("role_priority")
+    if not isinstance(role_priority, dict) or not role_priority:
+        raise ValueError("'role_priority' must map roles to sort positions.")
+    coverage = spec.get("mandatory_c_coverage", 2)
+    if not isinstance(coverage, int) or not 0 <= coverage <= 2:
+        raise ValueError("'mandatory_c_coverage' must be 0, 1 or 2.")
+
+    widths = dict(default_widths or {})
+    for letter, width in (spec.get("column_widths") or {}).items():
+        if letter not in COLUMN_LETTERS or not isinstance(width, (int, float)):
+            raise ValueError("'column_widths' keys must be columns A-K with numeric widths.")
+        widths[letter] = width
+
+    mandatory = [code for code in ("SM", "R") if task_config[code]["mandatory"] > 0]
+    mandatory += ["C", "C+"][:coverage]
+    random_tasks = tuple(code for code, task in task_config.items()
+                         if task["mandatory"] == 0 and code not in FIXED_TASKS)
+
+    template = object.__new__(TimesheetTemplate)
+    _set(template,
+         id=template_id,
+         title=str(spec.get("title", "")),
+         column_widths=MappingProxyType(widths),
+         task_config=MappingProxyType(task_config),
+         task_code_map=MappingProxyType(
+             {code: task["full_name"] for code, task in task_config.items()}),
+         display_to_task=MappingProxyType(
+             {task["full_name"]: code for code, task in task_config.items()}),
+         role_priority=MappingProxyType(dict(role_priority)),
+         mandatory_c_coverage=coverage,
+         mandatory_tasks=tuple(mandatory),
+         random_tasks=random_tasks,
+         random_tasks_by_role=MappingProxyType({
+             role: tuple(code for code in random_tasks if role in task_config[code]["roles"])
+             for role in role_priority}),
+         # A duty manager, plus a Scale 3 for SM, R and each C desk.
+         min_headcount=MappingProxyType({"Duty Manager": 1, "Scale 3": coverage + 2}),
+         fingerprint=hashlib.sha256(json.dumps(
+             spec, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest(),
+         spec=json.loads(json.dumps(spec)))
+    return template
+
+
+def load_template_dir(directory, default_widths=None):
+    """Compiles every *.json spec in `directory`; a missing directory has none."""
+    templates = {}
+    if not directory or not os.path.isdir(directory):
+        return templates
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            spec = json.load(f)
+        spec.setdefault("id", filename[:-len(".json")])
+        template = compile_template(spec, default_widths)
+        templates[template.id] = template
+    return templates
+
+
+class TemplateCache:
+    """Per-process compiled templates, recompiled only when their source revision moves."""
+
+    def __init__(self, default_widths=None):
+        self.default_widths = default_widths
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.compiles = 0
+
+    def get(self, template_id, revision, load):
+        """Returns the template for `template_id` at `revision`, or None.
+
+        `load()` returns the spec (or None when there is no such template)
+        and is only called on a miss. Unknown ids are not remembered, so
+        ids made up by clients cannot grow the cache.
+        """
+        with self._lock:
+            entry = self._entries.get(template_id)
+        if entry is not None and entry[0] == revision:
+            return entry[1]
+        spec = load()
+        if spec is None:
+            with self._lock:
+                self._entries.pop(template_id, None)
+            return None
+        template = compile_template(spec, self.default_widths)
+        with self._lock:
+            self._entries[template_id] = (revision, template)
+            self.compiles += 1
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "compiles": self.compiles}